@@ -9,22 +9,99 @@ import __main__
 
 # Import CAPy modules
 from base.fileinfo import FileInfo
-from base.datatypes import Data_Function
+from base.datatypes import Data_Function, Load, Iterate, ExtendCache
+from base.cuts import Cut
+from base.expression import Func
+from base.histogram import Hist, Hist2D
+from base.cache import ArrayCache
+from base.cutcache import CutCache
+from base.shared import SharedArrays
+from base.profiler import Profiler
+from base.store import ColumnStore
+from base.eventindex import EventIndex
 
 # Import Global session variables
 import base.CAPy_globals as CAPy_globals
 
-def Start_Session(fileList):
+def Start_Session(fileList, cacheFile=None, nWorkers=1, cacheBytes=2**30,
+                  storeDir=None, lazy=False, zoneMaps=None, prefetch=0,
+                  cutCacheDir=None, cutCacheBytes=2**30, sharedSession=None,
+                  filesPerWorker=None, namespace=None):
+    ''' Map the files in fileList and populate the namespace with data 
+        functions.
+        
+        Parameters:
+            fileList: (str) - Text file with one root file name per line.
+            cacheFile: (str) - File map cache, files unchanged since the
+                last session are not mapped again. (optional)
+            nWorkers: (int) - Number of processes used to map the files and
+                to read them in data function calls. (optional)
+            cacheBytes: (int) - Memory budget for arrays kept between data
+                function calls, 0 disables. (optional)
+            storeDir: (str) - Column store made by Build_Store, branches of
+                converted files are read from memory mapped columns. 
+                (optional)
+            lazy: (bool) - Data functions only look up their branch on first
+                use, for fast startup with many branches. (optional)
+            zoneMaps: (bool or list) - Branches to store per file min, max
+                and counts of, True for all, so lazy cuts skip files they
+                decide. (optional)
+            prefetch: (float) - Share of cacheBytes that arrays read ahead
+                on a background thread may take, 0 disables. (optional)
+            cutCacheDir: (str) - Directory where evaluated lazy cuts are kept
+                for later sessions, may be shared. (optional)
+            cutCacheBytes: (int) - Disk budget of cutCacheDir. (optional)
+            sharedSession: (str) - Processes started with the same name read
+                each array once and share it in shared memory, instead of
+                the array cache. (optional)
+            filesPerWorker: (int) - Files mapped by a worker process before
+                it is replaced, keeps the memory ROOT holds from mapping out
+                of the session process. (optional)
+            namespace: (dict) - Namespace to put the data functions in,
+                ie. the globals of an analysis module run in batch, 
+                defaults to the interactive __main__. (optional)
+    '''
     
-    f = open(fileList,'r')
-    files = f.readlines()
-    f.close()
+    fNames = _ReadFileList(fileList)
 
-    fNames = []
-    for fName in files:
-        fNames.append(fName.strip())
+    CAPy_globals._FileList = fileList
+    CAPy_globals._Lazy = lazy
+    CAPy_globals._Namespace = namespace
+    CAPy_globals._FileInfo = FileInfo(cacheFile=cacheFile,
+                                       nWorkers=nWorkers,
+                                       zoneMaps=zoneMaps,
+                                       filesPerWorker=filesPerWorker)
+    CAPy_globals.SetReadWorkers(nWorkers)
+
+    # The index, last cut and detnum of an earlier session belong to its 
+    # files, a last cut would be applied to the new events
+    CAPy_globals._EventIndex = None
+    CAPy_globals._LastCut = None
+    CAPy_globals._LastDetnum = None
+
+    # Loaded arrays are dropped whenever their branch gets new files
+    CAPy_globals._ArrayCache = ArrayCache(cacheBytes)
+    CAPy_globals._FileInfo.AddListener(CAPy_globals._ArrayCache.Invalidate)
+
+    if storeDir:
+        CAPy_globals._ColumnStore = ColumnStore(storeDir)
+    else:
+        CAPy_globals._ColumnStore = None
+
+    if cutCacheDir:
+        CAPy_globals._CutCache = CutCache(cutCacheDir, cutCacheBytes)
+    else:
+        CAPy_globals._CutCache = None
+
+    if CAPy_globals._SharedArrays is not None:
+        CAPy_globals._SharedArrays.Close()
+    if sharedSession:
+        CAPy_globals._SharedArrays = SharedArrays(sharedSession)
+    else:
+        CAPy_globals._SharedArrays = None
 
-    CAPy_globals._FileInfo = FileInfo() 
+    # Stops the prefetcher of an earlier session
+    CAPy_globals.SetPrefetch(prefetch)
 
     try:
         CAPy_globals._FileInfo.AddDataFiles(fNames)
@@ -35,7 +112,219 @@ def Start_Session(fileList):
 
     print "Successfully Loaded Data"
     
+    if namespace is None:
+        namespace = __main__.__dict__
+
     for name in CAPy_globals._FileInfo.GetDataNames():
-        __main__.__dict__[name] = Data_Function(name)
+        namespace[name] = Data_Function(name, lazy)
 
     print "Populated Namespace"
+
+
+def Refresh_Session():
+    ''' Add files appended to the Start_Session file list since it was last
+        read.
+    
+        Only the new files are mapped.  Branches first seen in them get data
+        functions in the namespace, and cached arrays of branches with new 
+        files are extended by reading just the new files.  If any new file
+        can't be added, none is and the session is unchanged.
+    '''
+    
+    if CAPy_globals._FileList is None:
+        print "ERROR in CAPy.Refresh_Session:"
+        print "No session started."
+        return None
+    
+    fileInfo = CAPy_globals._FileInfo
+    known = set(fileInfo.GetDataFiles())
+    fNames = [fName for fName in _ReadFileList(CAPy_globals._FileList)
+              if fName not in known]
+    
+    if not fNames:
+        print "No New Files"
+        return None
+    
+    oldNames = set(fileInfo.GetDataNames())
+    
+    # Keep the cached arrays, adding files invalidates them in the cache
+    items = CAPy_globals._ArrayCache.Items()
+    
+    # No background reads while the map changes, queued reads are stale
+    if CAPy_globals._Prefetcher is not None:
+        CAPy_globals._Prefetcher.Cancel()
+    
+    with CAPy_globals.Foreground():
+        
+        # FileInfo adds all files or none, so the session stays usable
+        try:
+            fileInfo.AddDataFiles(fNames)
+        except (IOError, ValueError) as e:
+            print "ERROR in CAPy.Refresh_Session:"
+            print "Unable to add the new files, session unchanged."
+            print str(e)
+            return None
+        
+        print "Added " + str(len(fNames)) + " Files"
+        
+        nExtended = ExtendCache(items)
+        del items
+    
+    # The event index no longer covers every file
+    CAPy_globals._EventIndex = None
+    
+    # The last cut selects among the old events only
+    if any(sum(fileInfo.GetFileMap(fName)['Map']['Entries'].values())
+           for fName in fNames):
+        CAPy_globals._LastCut = None
+    
+    newNames = [name for name in fileInfo.GetDataNames() 
+                if name not in oldNames]
+    namespace = CAPy_globals._Namespace
+    if namespace is None:
+        namespace = __main__.__dict__
+
+    for name in newNames:
+        namespace[name] = Data_Function(name, CAPy_globals._Lazy)
+    
+    print "Extended " + str(nExtended) + " Cached Arrays"
+    print "Added " + str(len(newNames)) + " Data Functions"
+
+
+def Share_Cut(name, cut):
+    ''' Publish a cut to the other processes of a shared session.
+    
+        Parameters:
+            name: (str) - Name other processes get the cut with.
+            cut: (Cut) - Cut to share.
+        
+        Returns: cut
+            cut: (Cut) - Same cut, held in shared memory.
+    '''
+    
+    if CAPy_globals._SharedArrays is None:
+        print "ERROR in CAPy.Share_Cut:"
+        print "Session not started with sharedSession."
+        return None
+    
+    return CAPy_globals._SharedArrays.PublishCut(name, cut)
+
+
+def Get_Shared_Cut(name):
+    ''' Return a cut published by a process of the shared session, None if 
+        there is none by that name.
+    
+        Parameters:
+            name: (str) - Name the cut was shared with.
+    '''
+    
+    if CAPy_globals._SharedArrays is None:
+        print "ERROR in CAPy.Get_Shared_Cut:"
+        print "Session not started with sharedSession."
+        return None
+    
+    return CAPy_globals._SharedArrays.AttachCut(name)
+
+
+def Start_Profile(hook=None):
+    ''' Record the time, bytes, entries, files and cache hits of every file
+        mapping and data read in the session, dropping earlier counts.
+    
+        Parameters:
+            hook: (callable) - Called with a dict of the counters of every
+                call, to forward them to other monitoring. (optional)
+    '''
+    
+    CAPy_globals._Profiler = Profiler()
+    if hook is not None:
+        CAPy_globals._Profiler.AddHook(hook)
+
+
+def Stop_Profile():
+    ''' Stop recording, the counts are dropped.'''
+    CAPy_globals._Profiler = None
+
+
+def Profile_Report(top=10, fileName=None):
+    ''' Print the session profile, top branches by time and by bytes read.
+    
+        Parameters:
+            top: (int) - Number of branches listed in each table. (optional)
+            fileName: (str) - Also write the counters of every branch to this
+                JSON file. (optional)
+    '''
+    
+    if CAPy_globals._Profiler is None:
+        print "ERROR in CAPy.Profile_Report:"
+        print "Profiling not started, use Start_Profile."
+        return None
+    
+    print CAPy_globals._Profiler.Report(top)
+    
+    if fileName is not None:
+        CAPy_globals._Profiler.Export(fileName)
+        print "Wrote " + fileName
+
+
+def _ReadFileList(fileList):
+    ''' Return the root file names in a file list, one per line.'''
+    
+    f = open(fileList,'r')
+    files = f.readlines()
+    f.close()
+
+    fNames = []
+    for fName in files:
+        fName = fName.strip()
+        if fName:
+            fNames.append(fName)
+    
+    return fNames
+
+
+def Build_Store(storeDir, names=None):
+    ''' Convert branches of the session files into a memory mapped column 
+        store and read from it for the rest of the session.
+        
+        Parameters:
+            storeDir: (str) - Directory of the column store.
+            names: (list) - Branches to convert, default all. (optional)
+    '''
+    
+    store = ColumnStore(storeDir)
+    with CAPy_globals.Foreground():
+        store.Convert(CAPy_globals._FileInfo, names)
+    CAPy_globals._ColumnStore = store
+    if CAPy_globals._Prefetcher is not None:
+        CAPy_globals._Prefetcher.SetStore(store)
+
+    print "Converted Data to " + storeDir
+
+
+def Build_Index(indexFile=None):
+    ''' Index the events of the session data files for Find_Event.
+        
+        Parameters:
+            indexFile: (str) - .npz file of the index, only rebuilt if the 
+                session files changed. (optional)
+    '''
+    
+    with CAPy_globals.Foreground():
+        CAPy_globals._EventIndex = EventIndex(CAPy_globals._FileInfo, 'Data',
+                                              indexFile)
+
+    print "Indexed " + str(len(CAPy_globals._EventIndex)) + " Events"
+
+
+def Find_Event(series, event):
+    ''' Return (file name, entry) of an event in the session data files.
+        
+        Parameters:
+            series: (int) - Series number of event.
+            event: (int) - Event number of event.
+    '''
+    
+    if CAPy_globals._EventIndex is None:
+        Build_Index()
+    
+    return CAPy_globals._EventIndex(series, event)
@@ -0,0 +1,408 @@
+# -*- coding: utf-8 -*-
+"""
+CAPy_batch.py
+
+Batch runner of CAPy analyses over a file list, for farm nodes.
+
+The file list is split into shards of consecutive files.  Each shard is run
+in its own worker process with a session of just its files: the data
+functions are put in the globals of the analysis module and its Analyze
+function is called.  The outputs of the shards are then reduced into one
+result file.
+
+    python CAPy_batch.py files.txt analysis.py --output result.pkl \\
+        --workers 8 --workDir shards
+
+An analysis module defines
+
+    Analyze(files) - Called once per shard with the shard file names, returns
+        a dict of outputs.
+    Reduce(outputs) - Reduces the list of shard output dicts, in file order,
+        into the result. (optional)
+
+Without Reduce, outputs are reduced by name: arrays and lists are
+concatenated, numbers are summed, histograms, the (counts, edges...) tuples
+of Hist and Hist2D or np.histogram, have their counts summed and dicts are
+reduced by key.
+
+Every finished shard is written to workDir with its file list and the size
+and modification time of its files, and its prints go to a log file beside
+it.  Running again with the same workDir only runs the shards that failed or
+whose files changed, so a crashed worker costs one shard.
+
+Functions:
+    Run_Batch - Run an analysis over a file list and write the result.
+    Reduce - Default reduction of shard outputs.
+
+Created on Sun Oct 18 09:12:37 2026
+
+@author: tdoughty1
+"""
+
+# Import Standard libraries
+import os
+import sys
+import imp
+import time
+import cPickle
+import argparse
+import traceback
+from multiprocessing import Process
+
+# Import Numerical libraries
+import numpy as np
+
+# Import CAPy modules
+import CAPy
+import base.CAPy_globals as CAPy_globals
+
+# Version of the shard output format, older shards are run again
+_SHARD_VERSION = 1
+
+def Run_Batch(fileList, analysis, output, workDir=None, nWorkers=1,
+              nShards=None, retries=0, cacheFile=None, cutCacheDir=None,
+              zoneMaps=None):
+    ''' Run an analysis module over the files of a file list in shards and
+        write the reduced outputs.
+
+        Parameters:
+            fileList: (str) - Text file with one root file name per line.
+            analysis: (str) - Analysis module, a .py file or a module name.
+            output: (str) - File the reduced result is pickled to.
+            workDir: (str) - Directory of shard outputs and logs, finished
+                shards found there are not run again.  Defaults to
+                output + '.shards'. (optional)
+            nWorkers: (int) - Number of shards run at once. (optional)
+            nShards: (int) - Number of shards, defaults to four per worker.
+                (optional)
+            retries: (int) - Times a failed shard is run again. (optional)
+            cacheFile: (str) - File map cache shared by the shard sessions.
+                (optional)
+            cutCacheDir: (str) - Cut cache shared by the shard sessions.
+                (optional)
+            zoneMaps: (bool or list) - Zone maps of the shard sessions.
+                (optional)
+
+        Returns: result
+            result: (object) - Reduced outputs, as written to output.
+
+        Raises:
+            ValueError: If the analysis module has no Analyze function or no
+                files are listed.
+            RuntimeError: If shards still fail after the retries.
+    '''
+
+    fNames = CAPy._ReadFileList(fileList)
+    if not fNames:
+        raise ValueError('ERROR in Run_Batch:\n' +
+                         'No files in ' + fileList + '!')
+
+    module = _LoadAnalysis(analysis)
+
+    if nWorkers < 1:
+        raise ValueError('ERROR in Run_Batch:\n' +
+                         'nWorkers must be a positive integer!')
+
+    if nShards is None:
+        nShards = 4 * nWorkers
+    shards = _Shards(fNames, nShards)
+
+    if workDir is None:
+        workDir = output + '.shards'
+    if not os.path.isdir(workDir):
+        os.makedirs(workDir)
+
+    options = {'cacheFile': cacheFile,
+               'cutCacheDir': cutCacheDir,
+               'zoneMaps': zoneMaps}
+
+    # Shards finished by an earlier run on unchanged files are kept
+    pending = [i for i, files in enumerate(shards)
+               if _LoadShard(_ShardFile(workDir, i), files) is None]
+    print 'Running ' + str(len(pending)) + ' of ' + str(len(shards)) + \
+          ' Shards'
+
+    failed = _RunShards(pending, shards, analysis, workDir, nWorkers,
+                        retries, options)
+    if failed:
+        raise RuntimeError('ERROR in Run_Batch:\n' +
+                           'Shards ' + ', '.join(str(i) for i in failed) +
+                           ' failed, see the logs in ' + workDir + '!')
+
+    outputs = [_LoadShard(_ShardFile(workDir, i), files)
+               for i, files in enumerate(shards)]
+
+    reduce = getattr(module, 'Reduce', Reduce)
+    result = reduce(outputs)
+
+    # Write to temporary file and rename so a crash never leaves
+    # a partially written result
+    tmpFile = output + '.tmp' + str(os.getpid())
+    with open(tmpFile, 'wb') as f:
+        cPickle.dump(result, f, cPickle.HIGHEST_PROTOCOL)
+    os.rename(tmpFile, output)
+
+    print 'Wrote ' + output
+
+    return result
+
+
+def Reduce(outputs):
+    ''' Reduce the output dicts of the shards by name.
+
+        Arrays and lists are concatenated in shard order, numbers are summed,
+        histograms (tuples of counts and equal edges arrays) have their
+        counts summed and dicts are reduced by key.  Names missing from some
+        shards are reduced over the shards having them.
+
+        Parameters:
+            outputs: (list) - Output dict of every shard, in file order.
+
+        Returns: result
+            result: (dict) - Reduced outputs.
+
+        Raises:
+            TypeError: If an output can't be reduced.
+    '''
+
+    return _Reduce(outputs, 'outputs')
+
+
+######### 'Hidden' Functions ###########
+def _Reduce(values, name):
+    ''' Reduce the values of one output name from every shard. '''
+
+    first = values[0]
+
+    if isinstance(first, dict):
+        keys = []
+        for value in values:
+            keys += [key for key in value if key not in keys]
+        return dict((key, _Reduce([value[key] for value in values
+                                   if key in value],
+                                  name + '[' + repr(key) + ']'))
+                    for key in keys)
+
+    if isinstance(first, np.ndarray):
+        return np.concatenate(values)
+
+    if isinstance(first, list):
+        return sum(values, [])
+
+    if isinstance(first, tuple) and first and \
+       all(isinstance(part, np.ndarray) for part in first):
+        for value in values[1:]:
+            if len(value) != len(first) or \
+               not all(np.array_equal(edges, other)
+                       for edges, other in zip(first[1:], value[1:])):
+                raise TypeError('ERROR in Reduce:\n' +
+                                'Histogram ' + name + ' has different ' +
+                                'edges in different shards!')
+        counts = sum(value[0] for value in values)
+        return (counts,) + first[1:]
+
+    if isinstance(first, (int, long, float, np.number)):
+        return sum(values)
+
+    raise TypeError('ERROR in Reduce:\n' +
+                    'Cannot reduce ' + name + ' of type ' +
+                    type(first).__name__ + ', define Reduce in the ' +
+                    'analysis module!')
+
+
+def _LoadAnalysis(analysis):
+    ''' Import an analysis module from a file or by name.
+
+        Raises:
+            ValueError: If the module has no Analyze function.
+    '''
+
+    # A module loaded before is reused by load_source, keeping functions
+    # the new file doesn't define
+    if analysis.endswith('.py'):
+        sys.modules.pop('CAPy_analysis', None)
+        module = imp.load_source('CAPy_analysis', analysis)
+    else:
+        module = __import__(analysis, fromlist=['Analyze'])
+
+    if not callable(getattr(module, 'Analyze', None)):
+        raise ValueError('ERROR in Run_Batch:\n' +
+                         analysis + ' has no Analyze function!')
+
+    return module
+
+
+def _Shards(fNames, nShards):
+    ''' Split file names into at most nShards runs of consecutive files. '''
+
+    nShards = max(min(nShards, len(fNames)), 1)
+    bounds = np.linspace(0, len(fNames), nShards + 1).round().astype(int)
+    return [fNames[start:stop] for start, stop in zip(bounds[:-1], bounds[1:])]
+
+
+def _ShardFile(workDir, i):
+    ''' Return the output file name of shard i. '''
+    return os.path.join(workDir, 'shard%04d.pkl' % i)
+
+
+def _Stamps(files):
+    ''' Return the (size, mtime) of every file, None if missing. '''
+
+    stamps = []
+    for fName in files:
+        try:
+            stat = os.stat(fName)
+        except OSError:
+            return None
+        stamps.append((stat.st_size, stat.st_mtime))
+    return stamps
+
+
+def _LoadShard(shardFile, files):
+    ''' Return the output of a finished shard, None if the shard has to be
+        run, because it's missing, unreadable or its files changed.
+    '''
+
+    try:
+        with open(shardFile, 'rb') as f:
+            shard = cPickle.load(f)
+    except Exception:
+        return None
+
+    if not isinstance(shard, dict) or \
+       shard.get('Version') != _SHARD_VERSION or \
+       shard['Files'] != files or shard['Stamps'] != _Stamps(files):
+        return None
+
+    return shard['Output']
+
+
+def _RunShards(pending, shards, analysis, workDir, nWorkers, retries,
+               options):
+    ''' Run the pending shards, nWorkers at a time, each in a new process.
+
+        A shard failed if its process exits with an error, crashes or leaves
+        no output.  Failed shards are queued again up to retries times.
+
+        Returns: failed
+            failed: (list) - Shards failed on every try.
+    '''
+
+    tries = dict((i, 0) for i in pending)
+    pending = list(pending)
+    running = {}
+    failed = []
+
+    while pending or running:
+
+        while pending and len(running) < nWorkers:
+            i = pending.pop(0)
+            tries[i] += 1
+            process = Process(target=_RunShard,
+                              args=(i, shards[i], analysis, workDir,
+                                    options),
+                              name='CAPyShard' + str(i))
+            process.start()
+            running[i] = process
+
+        for i, process in running.items():
+            process.join(0.1)
+            if process.is_alive():
+                continue
+            del running[i]
+
+            if process.exitcode == 0 and \
+               _LoadShard(_ShardFile(workDir, i), shards[i]) is not None:
+                print 'Finished Shard ' + str(i)
+            elif tries[i] <= retries:
+                print 'WARNING in Run_Batch:'
+                print 'Shard ' + str(i) + ' failed, running again.'
+                pending.append(i)
+            else:
+                print 'Shard ' + str(i) + ' failed.'
+                failed.append(i)
+
+    return sorted(failed)
+
+
+def _RunShard(i, files, analysis, workDir, options):
+    ''' Run the analysis on one shard in a worker process, writing its
+        output to workDir and its prints to a log beside it.
+    '''
+
+    shardFile = _ShardFile(workDir, i)
+
+    # Prints of CAPy, the analysis and ROOT go to the shard log
+    log = open(shardFile[:-4] + '.log', 'w')
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os.dup2(log.fileno(), 1)
+    os.dup2(log.fileno(), 2)
+
+    try:
+        start = time.time()
+
+        # The session reads the shard's file list like any other
+        fileList = shardFile[:-4] + '.txt'
+        with open(fileList, 'w') as f:
+            f.write('\n'.join(files) + '\n')
+
+        module = _LoadAnalysis(analysis)
+        CAPy.Start_Session(fileList, namespace=module.__dict__, **options)
+
+        if CAPy_globals._FileInfo is None or \
+           len(CAPy_globals._FileInfo.GetDataFiles()) != len(files):
+            raise ValueError('ERROR in Run_Batch:\n' +
+                             'Could not map the files of shard ' + str(i) +
+                             '!')
+
+        output = module.Analyze(files)
+        if not isinstance(output, dict):
+            raise TypeError('ERROR in Run_Batch:\n' +
+                            'Analyze must return a dict!')
+
+        tmpFile = shardFile + '.tmp' + str(os.getpid())
+        with open(tmpFile, 'wb') as f:
+            cPickle.dump({'Version': _SHARD_VERSION,
+                          'Files': files,
+                          'Stamps': _Stamps(files),
+                          'Output': output}, f, cPickle.HIGHEST_PROTOCOL)
+        os.rename(tmpFile, shardFile)
+
+        print 'Shard ' + str(i) + ' took %.1f s' % (time.time() - start)
+
+    except Exception:
+        traceback.print_exc()
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(1)
+
+    sys.stdout.flush()
+    sys.stderr.flush()
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Run a CAPy analysis ' +
+                                     'over a file list in parallel shards.')
+    parser.add_argument('fileList', help='text file of data file names')
+    parser.add_argument('analysis',
+                        help='analysis module, a .py file or module name')
+    parser.add_argument('--output', default='result.pkl')
+    parser.add_argument('--workDir', default=None,
+                        help='shard outputs and logs, default output.shards')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--shards', type=int, default=None)
+    parser.add_argument('--retries', type=int, default=0)
+    parser.add_argument('--cacheFile', default=None)
+    parser.add_argument('--cutCacheDir', default=None)
+    parser.add_argument('--zoneMaps', action='store_true')
+    args = parser.parse_args()
+
+    try:
+        Run_Batch(args.fileList, args.analysis, args.output, args.workDir,
+                  args.workers, args.shards, args.retries, args.cacheFile,
+                  args.cutCacheDir, args.zoneMaps or None)
+    except (ValueError, RuntimeError) as e:
+        print e
+        sys.exit(1)
@@ -12,7 +12,19 @@ Functions:
     GetDataNames: Return list of data branches in current session.
     GetCutNames: Return list of cut branches in current session.
     IsGeneral: Checks if branch name is a general value.
+    IsData: Checks if name is a data branch in current session.
+    IsCut: Checks if name is a cut branch in current session.
     GetDetnums: Return list of valid detector numbers.
+    GetCacheStats: Return the array cache counters.
+    SetCacheSize: Set the byte budget of the array cache.
+    ClearCache: Drop all arrays from the array cache.
+    SetReadWorkers: Set the number of processes reading files in parallel.
+    GetReadWorkers: Return the number of processes reading files.
+    GetReadPool: Return the session pool of read worker processes.
+    CloseReadPool: End the read worker processes.
+    SetPrefetch: Start or stop background prefetching into the array cache.
+    Foreground: Context manager pausing the prefetcher while the session
+        reads files or starts worker processes.
 
 Attributes:
     _FileInfo (FileInfo) - Structure containing list of root files and branches
@@ -22,20 +34,64 @@ Attributes:
     _LastDetnum (int) - Detector number used last time a data function was 
         called.  Allows simplification of data function call. Similar to
         CAP_last_detnum.
-    _LastCut (cut) - Detector number used last time a cut function was 
+    _LastCut (Cut) - Cut used last time a data function was 
         called. Allows simplification of data function call. Similar to 
         CAP_last_cut.
+    _ArrayCache (ArrayCache) - Session cache of loaded arrays, None if not
+        caching.
+    _ColumnStore (ColumnStore) - Memory mapped columns converted from the
+        session files, None if not using a store.
+    _EventIndex (EventIndex) - Index of events in the session data files,
+        None until built.
+    _ReadWorkers (int) - Number of processes reading files in parallel, 1
+        reads in the session process.
+    _ReadPool (tuple) - (pid, Pool) of the read workers of the session, 
+        started on first parallel read, None before.
+    _Prefetcher (Prefetcher) - Background reader of likely next arrays, None
+        if not prefetching.
+    _FileList (str) - File list the session was started from, read again by
+        Refresh_Session.
+    _Lazy (bool) - True if data functions look up their branch on first use.
+    _Namespace (dict) - Namespace the data functions are put in, None for
+        the interactive __main__.
+    _CutCache (CutCache) - Directory of evaluated cut masks shared between
+        sessions, None if not caching cuts.
+    _SharedArrays (SharedArrays) - Shared memory segments of arrays and cuts
+        used by every process of a shared session, None if not sharing.
+    _Profiler (Profiler) - Counters of mapping and reads per branch, None if
+        not profiling.
 
 Created on Tue Nov  5 14:19:11 2013
 
 @author: tdoughty1
 """
 
+# Import Standard libraries
+import os
+from contextlib import contextmanager
+from multiprocessing import Pool
+
+# Import CAPy modules
+from cuts import Cut
+from prefetch import Prefetcher
+
 ######################## Global Data Attributes ###############################
 
 _FileInfo = None
 _LastDetnum = None
 _LastCut = None
+_ArrayCache = None
+_ColumnStore = None
+_EventIndex = None
+_ReadWorkers = 1
+_ReadPool = None
+_Prefetcher = None
+_FileList = None
+_Lazy = False
+_Namespace = None
+_CutCache = None
+_SharedArrays = None
+_Profiler = None
 
 ######################## Data Access Methods ##################################
 def SetLastDetnum(detnum):
@@ -68,20 +124,21 @@ def GetLastDetnum():
 
 
 def SetLastCut(cut):
-    ''' Store the last detector number called.
+    ''' Store the last cut called.
         
         Parameters:
-            cut: (np.ndarray?) - Selection cut applied in most recent function
-                call.
+            cut: (Cut) - Selection cut applied in most recent function
+                call, None for no cut.
         
         Raises:
             TypeError: If cut is not a valid object
-        
-        #TODO: Implement cut class?
     '''    
     global _LastCut
 
-    #TODO implement type checking
+    if cut is not None and not isinstance(cut, Cut):
+        raise TypeError('ERROR in Set_LastCut:\n' +
+                        'Cut must be a Cut object!')
+
     _LastCut = cut
 
 
@@ -97,6 +154,14 @@ def GetCutNames():
     ''' Return list of cut branch names in current session.'''
     return _FileInfo.GetCutNames()
 
+def IsData(name):
+    ''' Checks if name is a data branch in current session.'''
+    return _FileInfo.IsData(name)
+
+def IsCut(name):
+    ''' Checks if name is a cut branch in current session.'''
+    return _FileInfo.IsCut(name)
+
 def IsGeneral(name):
     ''' Checks if branch name is a general data or cut value.'''
     return _FileInfo.IsGeneral(name)
@@ -104,3 +169,106 @@ def IsGeneral(name):
 def GetDetnums():
     ''' Return list of detector numbers in current session files.'''
     return _FileInfo.GetDetnums()
+
+def GetCacheStats():
+    ''' Return dict of array cache hits, misses, evictions and size.'''
+    if _ArrayCache is None:
+        return None
+    return _ArrayCache.GetStats()
+
+def SetCacheSize(maxBytes):
+    ''' Set the byte budget of the array cache.
+    
+        Parameters:
+            maxBytes: (int) - Largest total size of cached arrays in bytes.
+    '''
+    _ArrayCache.SetMaxBytes(maxBytes)
+
+def ClearCache():
+    ''' Drop all arrays from the array cache.'''
+    if _ArrayCache is not None:
+        _ArrayCache.Clear()
+
+def SetReadWorkers(nWorkers):
+    ''' Set the number of processes reading files in parallel.
+    
+        Parameters:
+            nWorkers: (int) - Number of processes, 1 reads in the session 
+                process.
+        
+        Raises:
+            ValueError: If nWorkers is not a positive integer.
+    '''
+    global _ReadWorkers
+    
+    if not isinstance(nWorkers, int) or nWorkers < 1:
+        raise ValueError('ERROR in SetReadWorkers:\n' +
+                         'nWorkers must be a positive integer!')
+    
+    # Workers of an earlier session or size are not reused
+    CloseReadPool()
+    _ReadWorkers = nWorkers
+
+def GetReadWorkers():
+    ''' Return the number of processes reading files in parallel.'''
+    return _ReadWorkers
+
+def GetReadPool():
+    ''' Return the pool of read worker processes, started on first use and 
+        kept for the session, so parallel reads don't fork every call.
+    '''
+    global _ReadPool
+    
+    # A process forked from the session starts its own pool
+    if _ReadPool is None or _ReadPool[0] != os.getpid():
+        with Foreground():
+            _ReadPool = (os.getpid(), Pool(_ReadWorkers))
+    
+    return _ReadPool[1]
+
+def CloseReadPool():
+    ''' End the read worker processes, a new pool starts on the next parallel
+        read.
+    '''
+    global _ReadPool
+    
+    if _ReadPool is not None and _ReadPool[0] == os.getpid():
+        _ReadPool[1].terminate()
+        _ReadPool[1].join()
+    _ReadPool = None
+
+def SetPrefetch(maxShare):
+    ''' Start or stop reading likely next arrays into the array cache between 
+        data function calls.
+    
+        Parameters:
+            maxShare: (float) - Share of the cache budget prefetched arrays 
+                not yet used may take, 0 stops prefetching.
+    '''
+    global _Prefetcher
+    
+    if _Prefetcher is not None:
+        _Prefetcher.Stop()
+        _Prefetcher = None
+    
+    if maxShare and _ArrayCache is not None:
+        _Prefetcher = Prefetcher(_FileInfo, _ArrayCache, _ColumnStore, 
+                                 maxShare)
+
+@contextmanager
+def Foreground(key=None):
+    ''' Pause the session prefetcher, if any, while the session reads files or
+        starts worker processes, so reads never overlap background reads and
+        no process is forked while the background thread reads.
+    
+        Parameters:
+            key: (tuple) - (name, detnum, files) about to be loaded, a 
+                prefetch of it is allowed to finish. (optional)
+    '''
+    
+    prefetcher = _Prefetcher
+    if prefetcher is None:
+        yield
+    else:
+        with prefetcher.Paused(key):
+            yield
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""
+cache.py
+
+CAPy module for the ArrayCache class.
+
+Interactive analysis calls the same data functions over and over, each call
+rereading the same branch from every file.  The ArrayCache holds the arrays
+loaded in the session, keyed by branch name, detector number and file list,
+and drops the least recently used arrays once the byte budget is used up.
+The cache is shared with the background prefetcher, so every method holds a
+lock, and arrays put by the prefetcher are counted until first used.
+
+Classes:
+    ArrayCache - Least recently used cache of loaded arrays.
+
+Created on Sat Oct 17 10:12:31 2026
+
+@author: tdoughty1
+"""
+
+# Import Standard libraries
+import threading
+from collections import OrderedDict
+
+class ArrayCache(object):
+    ''' Least recently used cache of loaded arrays with a byte budget.
+    
+        Called:
+            array = ArrayCache(key)
+            
+            Inputs:
+                key: (tuple) - (name, detnum, files) of loaded array.
+            
+            Outputs:
+                array: (np.ndarray) - Cached array or None if not cached.
+    
+        Constructed:
+            ArrayCache(maxBytes)
+            
+            Parameters:
+                maxBytes: (int) - Largest total size of cached arrays in bytes,
+                    0 disables the cache.
+
+        Methods:
+            Put: Store an array in the cache.
+            Invalidate: Drop all arrays for the given branch names.
+            Items: Return the cached (key, array) pairs.
+            Clear: Drop all arrays.
+            SetMaxBytes: Change the byte budget.
+            GetMaxBytes: Return the byte budget.
+            GetStats: Return the hit, miss and eviction counters.
+            GetPrefetchedBytes: Return the size of prefetched arrays not yet 
+                used.
+        
+        Hidden Methods:
+            _Drop: Remove one array and its size.
+            _Evict: Drop least recently used arrays until under budget.
+        
+        Attributes:
+            _arrays: (OrderedDict) - Cached arrays, least recently used first.
+            _maxBytes: (int) - Largest total size of cached arrays in bytes.
+            _nBytes: (int) - Current total size of cached arrays in bytes.
+            _hits: (int) - Number of lookups found in the cache.
+            _misses: (int) - Number of lookups not found in the cache.
+            _evictions: (int) - Number of arrays dropped to stay in budget.
+            _prefetched: (dict) - Size of prefetched arrays not yet used, 
+                keyed like _arrays.
+            _prefetchHits: (int) - Number of lookups found prefetched.
+            _lock: (RLock) - Guards the cache between the session and the 
+                prefetch thread.
+    '''
+    
+    def __init__(self, maxBytes):
+        ''' Constructs an empty array cache.
+        
+            Parameters:
+                maxBytes: (int) - Largest total size of cached arrays in bytes,
+                    0 disables the cache.
+        '''
+        
+        self._arrays = OrderedDict()
+        self._nBytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._prefetched = {}
+        self._prefetchHits = 0
+        self._lock = threading.RLock()
+        
+        self.SetMaxBytes(maxBytes)
+    
+    def __call__(self, key):
+        ''' Return cached array for key or None, marks array as most recently
+            used.
+        
+            Parameters:
+                key: (tuple) - (name, detnum, files) of loaded array.
+        '''
+        
+        with self._lock:
+            if key not in self._arrays:
+                self._misses += 1
+                return None
+            
+            self._hits += 1
+            if self._prefetched.pop(key, None) is not None:
+                self._prefetchHits += 1
+            
+            array = self._arrays.pop(key)
+            self._arrays[key] = array
+            return array
+    
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._arrays
+
+    def Put(self, key, array, prefetched=False):
+        ''' Store an array in the cache.
+        
+            The array is set read only, so a caller changing the returned array
+            can't change the cached copy.  Arrays larger than the whole budget
+            are not cached.
+            
+            Parameters:
+                key: (tuple) - (name, detnum, files) of loaded array.
+                array: (np.ndarray) - Loaded array.
+                prefetched: (bool) - True if loaded ahead of use by the 
+                    prefetcher. (optional)
+        '''
+        
+        with self._lock:
+            if array.nbytes > self._maxBytes:
+                return
+            
+            if key in self._arrays:
+                self._Drop(key)
+            
+            array.flags.writeable = False
+            self._arrays[key] = array
+            self._nBytes += array.nbytes
+            if prefetched:
+                self._prefetched[key] = array.nbytes
+            
+            self._Evict()
+
+    def Invalidate(self, names):
+        ''' Drop all arrays for the given branch names.
+        
+            Parameters:
+                names: (iterable) - Branch names whose file lists changed.
+        '''
+        
+        names = set(names)
+        with self._lock:
+            for key in self._arrays.keys():
+                if key[0] in names:
+                    self._Drop(key)
+
+    def Items(self):
+        ''' Return list of cached (key, array) pairs, least recently used 
+            first.
+        '''
+        
+        with self._lock:
+            return self._arrays.items()
+
+    def Clear(self):
+        ''' Drop all arrays. '''
+        
+        with self._lock:
+            self._arrays.clear()
+            self._prefetched.clear()
+            self._nBytes = 0
+
+    def SetMaxBytes(self, maxBytes):
+        ''' Change the byte budget, dropping arrays if needed.
+        
+            Parameters:
+                maxBytes: (int) - Largest total size of cached arrays in bytes.
+            
+            Raises:
+                ValueError: If maxBytes is negative or not an integer.
+        '''
+        
+        if not isinstance(maxBytes, (int, long)) or maxBytes < 0:
+            raise ValueError('ERROR in ArrayCache:\n' +
+                             'maxBytes must be a non-negative integer!')
+        
+        with self._lock:
+            self._maxBytes = maxBytes
+            self._Evict()
+
+    def GetMaxBytes(self):
+        ''' Return the byte budget. '''
+        return self._maxBytes
+
+    def GetPrefetchedBytes(self):
+        ''' Return the size of prefetched arrays not yet used in bytes. '''
+        
+        with self._lock:
+            return sum(self._prefetched.itervalues())
+
+    def GetStats(self):
+        ''' Return dict of cache counters and sizes. '''
+        
+        with self._lock:
+            return {'Hits': self._hits,
+                    'Misses': self._misses,
+                    'Evictions': self._evictions,
+                    'Arrays': len(self._arrays),
+                    'Bytes': self._nBytes,
+                    'MaxBytes': self._maxBytes,
+                    'PrefetchHits': self._prefetchHits,
+                    'PrefetchedBytes': sum(self._prefetched.itervalues())}
+
+    def _Drop(self, key):
+        ''' Remove one array and its size. '''
+        
+        self._nBytes -= self._arrays.pop(key).nbytes
+        self._prefetched.pop(key, None)
+
+    def _Evict(self):
+        ''' Drop least recently used arrays until under the byte budget. '''
+        
+        while self._nBytes > self._maxBytes and self._arrays:
+            self._Drop(next(iter(self._arrays)))
+            self._evictions += 1
@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""
+cutcache.py
+
+CAPy module for the CutCache class.
+
+Standard cuts evaluated over the full exposure take minutes, and are
+evaluated again in every session by every analyst.  The CutCache keeps the
+packed bits of evaluated cuts in a directory, one file per cut, named by a
+hash of the cut definition and the size and modification time of every file
+it was evaluated on.  Both lazy cut expressions and cut branches of the cut
+files are kept, the latter so the stored mask is read and packed only once.
+Files are written atomically so several processes can share one directory, 
+and the least recently used cuts are removed once the directory grows past
+its byte budget.  A truncated or corrupt cut file counts as a miss and is 
+removed.
+
+Classes:
+    CutCache - Directory of evaluated cut masks.
+
+Created on Sat Oct 17 18:02:36 2026
+
+@author: tdoughty1
+"""
+
+# Import Standard libraries
+import os
+import hashlib
+import zipfile
+
+# Import Numerical libraries
+import numpy as np
+
+# Import CAPy modules
+from cuts import _FromBits
+
+# Change when the key or file format changes, so old entries are never hit
+_CUT_CACHE_VERSION = 1
+
+class CutCache(object):
+    ''' Directory of evaluated cut masks shared between sessions.
+
+        Called:
+            cut = CutCache(key)
+
+            Inputs:
+                key: (str) - Key returned by Key.
+
+            Outputs:
+                cut: (Cut) - Cached cut or None if not cached.
+
+        Constructed:
+            CutCache(cacheDir, maxBytes=2**30)
+
+            Parameters:
+                cacheDir: (str) - Directory of the cached cuts, created if
+                    missing.
+                maxBytes: (int) - Largest total size of cached cuts in bytes.
+                    (optional)
+
+        Methods:
+            Key: Return the key of a cut definition on a set of files.
+            Put: Store an evaluated cut.
+            Clear: Remove all cached cuts.
+            GetStats: Return the hit and miss counters and size.
+
+        Hidden Methods:
+            _Path: Return the file name of a key.
+            _Entries: Return (mtime, size, path) of every cached cut.
+            _Evict: Remove least recently used cuts until under budget.
+
+        Attributes:
+            _cacheDir: (str) - Directory of the cached cuts.
+            _maxBytes: (int) - Largest total size of cached cuts in bytes.
+            _hits: (int) - Number of lookups found in the cache.
+            _misses: (int) - Number of lookups not found in the cache.
+    '''
+
+    def __init__(self, cacheDir, maxBytes=2**30):
+        ''' Constructs a cut cache on a directory.
+
+            Parameters:
+                cacheDir: (str) - Directory of the cached cuts.
+                maxBytes: (int) - Largest total size of cached cuts in bytes.
+                    (optional)
+
+            Raises:
+                ValueError: If maxBytes is negative or not an integer.
+        '''
+
+        if not isinstance(maxBytes, (int, long)) or maxBytes < 0:
+            raise ValueError('ERROR in CutCache:\n' +
+                             'maxBytes must be a non-negative integer!')
+
+        if not os.path.isdir(cacheDir):
+            os.makedirs(cacheDir)
+
+        self._cacheDir = cacheDir
+        self._maxBytes = maxBytes
+        self._hits = 0
+        self._misses = 0
+
+    def __call__(self, key):
+        ''' Return the cached cut of key or None, marks it as recently used.
+
+            Parameters:
+                key: (str) - Key returned by Key.
+        '''
+
+        path = self._Path(key)
+
+        # Another session may remove the file at any time
+        try:
+            f = open(path, 'rb')
+        except IOError:
+            self._misses += 1
+            return None
+        
+        # Truncated or corrupt files are dropped
+        try:
+            with f:
+                
+                # Checked first, NumPy leaves a broken NpzFile behind
+                if not zipfile.is_zipfile(f):
+                    raise zipfile.BadZipfile(path)
+                f.seek(0)
+                data = np.load(f)
+                bits = data['bits']
+                nEvents = int(data['nEvents'])
+        except (zipfile.BadZipfile, KeyError, ValueError, IOError, EOFError):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            self._misses += 1
+            return None
+        
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+
+        self._hits += 1
+        return _FromBits(bits, nEvents)
+
+    def Key(self, definition, stamps):
+        ''' Return the key of a cut definition evaluated on a set of files.
+
+            Parameters:
+                definition: (str) - Definition of the cut, naming the branches
+                    and detector numbers used.
+                stamps: (list) - (fName, size, mtime) of every file the cut is
+                    evaluated on, in session order.
+
+            Returns: key
+                key: (str) - Hex digest identifying the cut.
+        '''
+
+        text = repr((_CUT_CACHE_VERSION, definition, list(stamps)))
+        return hashlib.sha1(text).hexdigest()
+
+    def Put(self, key, cut):
+        ''' Store an evaluated cut, then remove old cuts if over budget.
+
+            Parameters:
+                key: (str) - Key returned by Key.
+                cut: (Cut) - Evaluated cut.
+        '''
+
+        if cut._bits.nbytes > self._maxBytes:
+            return
+
+        # Write to temporary file and rename so other sessions never read a
+        # partially written cut
+        path = self._Path(key)
+        tmpFile = path + '.tmp' + str(os.getpid())
+        with open(tmpFile, 'wb') as f:
+            np.savez(f, bits=cut._bits, nEvents=len(cut))
+        os.rename(tmpFile, path)
+
+        self._Evict()
+
+    def Clear(self):
+        ''' Remove all cached cuts. '''
+
+        for mtime, size, path in self._Entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def GetStats(self):
+        ''' Return dict of cut cache counters and sizes. '''
+
+        entries = self._Entries()
+        return {'Hits': self._hits,
+                'Misses': self._misses,
+                'Cuts': len(entries),
+                'Bytes': sum(size for mtime, size, path in entries),
+                'MaxBytes': self._maxBytes}
+
+    def _Path(self, key):
+        ''' Return the file name of a key.'''
+        return os.path.join(self._cacheDir, key + '.npz')
+
+    def _Entries(self):
+        ''' Return list of (mtime, size, path) of every cached cut.'''
+
+        entries = []
+        for fName in os.listdir(self._cacheDir):
+            if not fName.endswith('.npz'):
+                continue
+
+            path = os.path.join(self._cacheDir, fName)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        return entries
+
+    def _Evict(self):
+        ''' Remove least recently used cuts until under the byte budget.'''
+
+        entries = sorted(self._Entries())
+        nBytes = sum(size for mtime, size, path in entries)
+
+        for mtime, size, path in entries:
+            if nBytes <= self._maxBytes:
+                break
+
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            nBytes -= size
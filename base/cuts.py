@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""
+cuts.py
+
+CAPy module for the Cut class.
+
+A cut is a pass/fail flag for every event in the session.  Flags are stored 
+packed 8 events to a byte, so a cut takes 1/8 the memory of a boolean array,
+and cut algebra runs on the packed bytes.
+
+Classes:
+    Cut - Packed bitmask selecting events.
+
+Functions:
+    PackChunks - Build a cut from consecutive boolean chunks.
+
+Created on Sat Oct 17 11:48:20 2026
+
+@author: tdoughty1
+"""
+
+# Import Numerical libraries
+import numpy as np
+
+# Number of set bits in every byte value, used to count passing events
+_BITCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+class Cut(object):
+    ''' Class for a packed bitmask selecting events.
+    
+        Events are packed with np.packbits, the unused bits of the last byte
+        are always 0 so the packed bytes can be compared and counted directly.
+        
+        Constructed:
+            Cut(mask)
+            
+            Parameters:
+                mask: (np.ndarray) - Pass/fail value of each event, any 
+                    non-zero value passes.
+        
+        Operators:
+            cut1 & cut2: Events passing both cuts.
+            cut1 | cut2: Events passing either cut.
+            cut1 ^ cut2: Events passing exactly one cut.
+            ~cut: Events failing cut.
+            len(cut): Number of events.
+        
+        Methods:
+            Passed: Return number of events passing the cut.
+            GetMask: Return boolean array of the cut.
+            Apply: Return events of an array passing the cut.
+            Slice: Return the cut for a range of events.
+        
+        Attributes:
+            _bits: (np.ndarray) - Packed uint8 pass/fail flags.
+            _nEvents: (int) - Number of events in the cut.
+    '''
+    
+    def __init__(self, mask):
+        ''' Constructs a cut from a pass/fail array.
+        
+            Parameters:
+                mask: (np.ndarray) - Pass/fail value of each event.
+        
+            Raises:
+                ValueError: If mask isn't 1 dimensional.
+        '''
+        
+        mask = np.asarray(mask)
+        if mask.ndim != 1:
+            raise ValueError('ERROR in Cut:\n' +
+                             'Cut mask must be 1 dimensional!')
+        
+        self._bits = np.packbits(mask.astype(bool))
+        self._nEvents = len(mask)
+    
+    def __len__(self):
+        return self._nEvents
+    
+    def __and__(self, other):
+        return _FromBits(self._bits & self._Other(other)._bits, self._nEvents)
+    
+    def __or__(self, other):
+        return _FromBits(self._bits | self._Other(other)._bits, self._nEvents)
+    
+    def __xor__(self, other):
+        return _FromBits(self._bits ^ self._Other(other)._bits, self._nEvents)
+    
+    def __invert__(self):
+        bits = ~self._bits
+        
+        # Keep unused bits of last byte cleared
+        if self._nEvents % 8:
+            bits[-1] &= np.uint8(0xFF << (8 - self._nEvents % 8) & 0xFF)
+        
+        return _FromBits(bits, self._nEvents)
+    
+    def __eq__(self, other):
+        if not isinstance(other, Cut):
+            return NotImplemented
+        return self._nEvents == other._nEvents and \
+               np.array_equal(self._bits, other._bits)
+    
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+    
+    def __repr__(self):
+        return 'Cut(' + str(self.Passed()) + '/' + str(self._nEvents) + \
+               ' passed)'
+    
+    def Passed(self):
+        ''' Return number of events passing the cut.'''
+        return int(_BITCOUNT[self._bits].sum(dtype=np.int64))
+    
+    def GetMask(self, start=0, stop=None):
+        ''' Return boolean array of the cut.
+        
+            Parameters:
+                start: (int) - First event of range to return. (optional)
+                stop: (int) - End of range to return, only the bytes holding 
+                    the range are unpacked. (optional)
+        '''
+        
+        if stop is None or stop > self._nEvents:
+            stop = self._nEvents
+        
+        first = start // 8
+        bits = np.unpackbits(self._bits[first:(stop + 7) // 8])
+        return bits[start - 8 * first:stop - 8 * first].view(bool)
+    
+    def Slice(self, start, stop):
+        ''' Return the cut for events start to stop, ie. one file.'''
+        return Cut(self.GetMask(start, stop))
+    
+    def Apply(self, array):
+        ''' Return the events of array passing the cut.
+        
+            Parameters:
+                array: (np.ndarray) - Array with one entry per event.
+            
+            Raises:
+                ValueError: If array and cut have different numbers of events.
+        '''
+        
+        if len(array) != self._nEvents:
+            raise ValueError('ERROR in Cut.Apply:\n' +
+                             'Cut has ' + str(self._nEvents) + 
+                             ' events, array has ' + str(len(array)) + '!')
+        
+        return array[self.GetMask()]
+    
+    def _Other(self, other):
+        ''' Check other operand is a cut with matching number of events.'''
+        
+        if not isinstance(other, Cut):
+            raise TypeError('ERROR in Cut:\n' +
+                            'Cuts can only be combined with cuts!')
+        if other._nEvents != self._nEvents:
+            raise ValueError('ERROR in Cut:\n' +
+                             'Cuts have different numbers of events!')
+        return other
+
+
+def _FromBits(bits, nEvents):
+    ''' Construct a cut directly from packed bits.'''
+    
+    cut = Cut.__new__(Cut)
+    cut._bits = bits
+    cut._nEvents = nEvents
+    return cut
+
+
+def PackChunks(chunks):
+    ''' Build a cut from consecutive boolean chunks of any length.
+    
+        Chunks are packed as they arrive, the few events past the last full 
+        byte are carried into the next chunk, so the full boolean array is 
+        never held in memory.
+        
+        Parameters:
+            chunks: (iterable) - Boolean arrays of consecutive events.
+        
+        Returns: cut
+            cut: (Cut) - Cut over all events of the chunks.
+    '''
+    
+    parts = []
+    carry = np.zeros(0, dtype=bool)
+    nEvents = 0
+    
+    for chunk in chunks:
+        chunk = np.concatenate([carry, np.asarray(chunk, dtype=bool)])
+        nFull = len(chunk) - len(chunk) % 8
+        parts.append(np.packbits(chunk[:nFull]))
+        carry = chunk[nFull:]
+        nEvents += nFull
+    
+    parts.append(np.packbits(carry))
+    nEvents += len(carry)
+    
+    return _FromBits(np.concatenate(parts), nEvents)
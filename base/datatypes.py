@@ -9,28 +9,58 @@ Classes:
     Data_Access - Class for a data access object
     Cut_Access - Class for a cut access object. Subclass of Data_Access
 
+Functions:
+    Load - Load several data or cut branches, reading each tree once.
+    Iterate - Iterate over several branches in fixed size event chunks.
+
 Created on Sun Nov  3 14:57:28 2013
 
 @author: tdoughty1
 """
 
 # Import Standard Libraries
+import os
+import mmap
+import time
+import tempfile
+from collections import OrderedDict
 from warnings import warn
 
-# Import ROOT Libraries
-from root_numpy import root2array
+# Import Numerical Libraries
+import numpy as np
+
+# Import ROOT Libraries, loaded on first read
+from rootio import Read, ReadTrees, ReadEntries, ReadChunks, ClusterEntries
 
 # Import CAPy global settings
 import CAPy_globals
+from cuts import Cut
+
+# Cuts with passing entries in less than this share of the clusters are read
+# entry by entry instead of reading the whole branch.  Touched clusters are
+# read in full either way, so above about half of them the extra calls of
+# reading range by range cost more than they save
+_PUSHDOWN_COVERAGE = 0.5
+
+# Reads of fewer entries stay in the session process, handing the files to
+# the workers and mapping the output costs more than reading them
+_MIN_PARALLEL_ENTRIES = 1000000
+
+# Directories of the output files of parallel reads, in memory if there is
+# room, workers writing past the free space of a tmpfs are killed by SIGBUS
+_READ_DIRS = [path for path in ['/dev/shm', tempfile.gettempdir()] 
+              if os.path.isdir(path)]
 
 # Store functions into a dict for convenience in accessing
 class Data_Function(object):
     
-    def __init__(self, name):
+    def __init__(self, name, lazy=False):
         ''' Constructs the Data Access object used to access data.
         
             Parameters:
                 name: (str) - Name of data to read, corresponds to branch name.
+                lazy: (bool) - Only store the name, the branch is looked up in
+                    the session on first use. (optional)
 
             Raises:
                 TypeError: If expected types of arguments doesn't match given.
@@ -42,8 +72,18 @@ class Data_Function(object):
             raise TypeError('ERROR in Data_Array():\n' +
                             'Name must be a string!')
 
-        # Store name and check if its a global (only detnum = 1) value
         self.__name__ = name
+        self._FunctionType = None
+        
+        if not lazy:
+            self._Resolve()
+
+    def _Resolve(self):
+        ''' Look up the branch in the session and set the function type.'''
+        
+        name = self.__name__
+        
+        # Check if its a global (only detnum = 1) value
         self._isgeneral = CAPy_globals.IsGeneral(name)
 
         # Set Key Flag for general status
@@ -53,10 +93,10 @@ class Data_Function(object):
             key1 = 'Det'
 
         # Check if it's a cut or data
-        if name in CAPy_globals.GetDataNames():
+        if CAPy_globals.IsData(name):
             self._iscut = False
             key2 = 'Data'
-        elif name in CAPy_globals.GetCutNames():
+        elif CAPy_globals.IsCut(name):
             self._iscut = True
             key2 = 'Cut'
         else:
@@ -68,6 +108,9 @@ class Data_Function(object):
                      
     def __call__(self, *args):
     
+        if self._FunctionType is None:
+            self._Resolve()
+    
         if self._FunctionType == 'GenCut':
     	    return self._GenCut(args)
 
@@ -78,6 +121,12 @@ class Data_Function(object):
             return self._GenData(args)
         
         if self._FunctionType == 'DetData':
+            
+            # A list of detnums or 'all' loads every detector at once
+            if len(args) > 0 and (isinstance(args[0], (list, tuple)) or 
+                                  args[0] == 'all'):
+                return self._MultiDetData(args)
+            
             return self._DetData(args)
 		    		
 
@@ -90,10 +139,8 @@ class Data_Function(object):
             warn('WARNING in ' + self.__name__ + ':\n\t' + self.__name__ + 
                  ' takes no arguments. Ignoring all arguments.', UserWarning)
 
-        files, dirName, treeName = CAPy_globals._FileInfo(self.__name__, 1)
-
         # Now call data
-        return root2array(files, dirName + '/' + treeName, [self.__name__])
+        return self._LoadCut(1)
 
     def _DetCut(self, args):
         ''' Loads the data for a detector specific cut.'''
@@ -104,27 +151,47 @@ class Data_Function(object):
                  ' additional arguments.', UserWarning)
 
         # If it's not a valid detector number
-        if not self._Check_Detnum(args[0]):
+        if len(args) == 0 or not self._Check_Detnum(args[0]):
         
             # Get Last Detector number
-            detnum = CAPy_globals.GetLastDetnum
+            detnum = CAPy_globals.GetLastDetnum()
     
         # If it is a valid detector number
         else:
             detnum = args[0]
 
-        # Store Detector Number
-        CAPy_globals.SetLastDetnum(detnum)
+            # Store Detector Number
+            CAPy_globals.SetLastDetnum(detnum)
 
         # Now call data
-        if detnum:
+        if not detnum:
             warn('WARNING in ' + self.__name__ + ':\n\t' + 'No detector'
                  ' given and none stored in globals. Returning nothing',
                  UserWarning)
             return None
         else:
-            print '#TODO: Load Data for ' + self.__name__ + '(' + \
-            str(detnum) + ') here!'
+            return self._LoadCut(detnum)
+
+    def _LoadCut(self, detnum):
+        ''' Return the Cut of a cut branch, from the session cut cache if it
+            was packed in this or an earlier session on the same files.
+        '''
+        
+        cutCache = CAPy_globals._CutCache
+        if cutCache is None:
+            return Cut(self._Load(detnum)[self.__name__])
+        
+        fileInfo = CAPy_globals._FileInfo
+        files = fileInfo(self.__name__, detnum)[0]
+        key = cutCache.Key('Cut file ' + self.__name__ + '(' + str(detnum) + 
+                           ')', fileInfo.GetFileStamps(files))
+        
+        cut = cutCache(key)
+        if cut is None:
+            cut = Cut(self._Load(detnum)[self.__name__])
+            cutCache.Put(key, cut)
+        
+        return cut
 
     def _GenData(self, args):
         ''' Loads the data for a general data value. '''
@@ -135,7 +202,7 @@ class Data_Function(object):
                  ' arguments.', UserWarning)
 
         # If it's not a valid cut
-        if not self._Check_Cut(args[0]):
+        if len(args) == 0 or not self._Check_Cut(args[0]):
         
             # Get Last Cut
             cut = CAPy_globals.GetLastCut()
@@ -147,16 +214,8 @@ class Data_Function(object):
             # Store Cut
             CAPy_globals.SetLastCut(cut)
 
-        files, dirName, treeName = CAPy_globals._FileInfo(self.__name__, 1)
-            
         # Now call data
-        m = root2array(files, dirName + '/' + treeName, [self.__name__])
-            
-        # If cut, apply
-        if cut:
-            print "#TODO: Implement Cut"
-            
-        return m             
+        return self._Load(1, cut)
 
     def _DetData(self, args):
         ''' Loads the data for a detector specific value. '''
@@ -166,24 +225,31 @@ class Data_Function(object):
             warn('WARNING in ' + self.__name__ + ':\n\t' + self.__name__ + 
                  ' takes two arguments: detnum and cut. Ignoring additional' +
                  ' arguments.', UserWarning)
-            detnum = args[0]
-            cut = args[1]
+            args = args[:2]
     
-        # If there are just 2 arguments
-        elif len(args) == 2:
-            detnum = args[0]
-            cut = args[1]
-      
-        # If there is one argument
-        elif len(args) == 1:
+        # If there are 2 arguments
+        if len(args) == 2:
             if self._Check_Detnum(args[0]):
                 detnum = args[0]
                 CAPy_globals.SetLastDetnum(detnum)
+            else:
+                detnum = CAPy_globals.GetLastDetnum()
+            if self._Check_Cut(args[1]):
+                cut = args[1]
+                CAPy_globals.SetLastCut(cut)
+            else:
                 cut = CAPy_globals.GetLastCut()
-            elif self._Check_Cut(args[1]):
+      
+        # If there is one argument
+        elif len(args) == 1:
+            if isinstance(args[0], Cut):
                 cut = args[0]
                 CAPy_globals.SetLastCut(cut)
                 detnum = CAPy_globals.GetLastDetnum()
+            elif self._Check_Detnum(args[0]):
+                detnum = args[0]
+                CAPy_globals.SetLastDetnum(detnum)
+                cut = CAPy_globals.GetLastCut()
             else:
                 warn('WARNING in ' + self.__name__ + ':\n\tArgument is' +
                      ' neither a detnum nor a cut. Ignoring argument.',
@@ -201,16 +267,9 @@ class Data_Function(object):
     
         # Now call data
         if detnum:
-            files, dirName, treeName = CAPy_globals._FileInfo(self.__name__, 1)
             
             # Now call data
-            m = root2array(files, dirName + '/' + treeName, [self.__name__])
-            
-            # If cut, apply
-            if cut:
-                print "#TODO: Implement Cut"
-            
-            return m
+            return self._Load(detnum, cut)
             
         else:
             warn('WARNING in ' + self.__name__ + ':\n\t' + 'No detector' +
@@ -218,6 +277,206 @@ class Data_Function(object):
                  UserWarning)
             return None
 
+    def _MultiDetData(self, args):
+        ''' Loads a detector specific value for several detectors.
+        
+            Called as name(detnums, cut) with a list of detnums or 'all'.  The
+            last detnum is not changed.  Every file is opened once and all 
+            the requested zip trees are read from it.
+            
+            Returns: m
+                m: (np.ndarray) - 2D detector by event array, rows in the order
+                    of detnums ('all' is sorted, see GetDetnums).
+            
+            Raises:
+                ValueError: If a detnum has no data for the branch, or the 
+                    detnums are not all in the same files.
+        '''
+        
+        if len(args) > 2:
+            warn('WARNING in ' + self.__name__ + ':\n\t' + self.__name__ + 
+                 ' takes two arguments: detnums and cut. Ignoring additional' +
+                 ' arguments.', UserWarning)
+        
+        if args[0] == 'all':
+            detnums = self.GetDetnums()
+        else:
+            detnums = list(args[0])
+        
+        if len(args) > 1 and self._Check_Cut(args[1]):
+            cut = args[1]
+            CAPy_globals.SetLastCut(cut)
+        else:
+            cut = CAPy_globals.GetLastCut()
+        
+        return _LoadDetectors(self.__name__, detnums, cut)
+
+    def GetDetnums(self):
+        ''' Return sorted list of detector numbers with data for the branch.'''
+        return CAPy_globals._FileInfo.GetBranchDetnums(self.__name__)
+
+    ############# Define chunked iteration ####################################
+    def Iterate(self, detnum=None, cut=None, chunkSize=100000):
+        ''' Iterate over the branch in chunks of at most chunkSize events.
+        
+            Files are read one chunk at a time, so memory is bounded by the
+            chunk size and not by the size of the data set.  Chunks are not
+            added to the session cache.
+            
+            Parameters:
+                detnum: (int) - Detector number, defaults to last detnum.
+                    Ignored for general branches. (optional)
+                cut: (Cut) - Selection applied to each chunk. (optional)
+                chunkSize: (int) - Largest number of events read at once.
+                    (optional)
+            
+            Yields:
+                m: (np.ndarray) - Single branch record array for each chunk.
+        '''
+        
+        if self._FunctionType is None:
+            self._Resolve()
+        
+        if self._isgeneral:
+            detnum = 1
+        elif detnum is None:
+            detnum = CAPy_globals.GetLastDetnum()
+        
+        for chunk in Iterate([self.__name__], detnum, cut, chunkSize):
+            column = chunk[self.__name__]
+            yield column.view([(self.__name__, column.dtype)])
+
+    ############# Define lazy expressions #####################################
+    def Lazy(self, detnum=None):
+        ''' Return a lazy expression for the branch, nothing is read until the
+            expression is evaluated.
+            
+            Parameters:
+                detnum: (int) - Detector number, defaults to last detnum.
+                    Ignored for general branches. (optional)
+            
+            Returns: branch
+                branch: (Branch) - Lazy expression, see base.expression.
+        '''
+        
+        # Imported here since expression builds on this module
+        from expression import Branch
+        
+        if self._FunctionType is None:
+            self._Resolve()
+        
+        if self._isgeneral:
+            detnum = 1
+        elif detnum is None:
+            detnum = CAPy_globals.GetLastDetnum()
+        elif self._Check_Detnum(detnum):
+            CAPy_globals.SetLastDetnum(detnum)
+        else:
+            detnum = CAPy_globals.GetLastDetnum()
+        
+        return Branch(self.__name__, detnum)
+
+    ############# Define data loading function ###############################
+    def _Load(self, detnum, cut=None):
+        ''' Read the branch for detnum, from the session cache if it was
+            loaded before with the same file list, then from the column store
+            if all files are converted, otherwise from the ROOT files.
+            
+            If the passing events are in few clusters of entries only those
+            are read from the files, and the result is not cached.  In a shared
+            session arrays are read once by any process and published to 
+            shared memory, every process uses the shared view.  A session
+            prefetcher is paused during the load and told about it after, and
+            a session profiler gets the time and size of every step.
+        '''
+        
+        profiler = CAPy_globals._Profiler
+        counters = None
+        if profiler is not None:
+            counters = {}
+            start = time.time()
+
+        files, dirName, treeName = CAPy_globals._FileInfo(self.__name__, 
+                                                          detnum)
+
+        key = (self.__name__, detnum, tuple(files))
+        
+        if profiler is not None:
+            counters['LookupSeconds'] = time.time() - start
+        
+        # Resumed with the call, so the prefetcher queues what comes next
+        prefetcher = CAPy_globals._Prefetcher
+        if prefetcher is not None:
+            prefetcher.Pause(key)
+        try:
+            return self._Fetch(key, dirName, treeName, cut, counters)
+        finally:
+            if prefetcher is not None:
+                prefetcher.Resume(self.__name__, detnum)
+            if profiler is not None:
+                counters['Seconds'] = time.time() - start
+                profiler.Record(self.__name__, detnum, **counters)
+
+    def _Fetch(self, key, dirName, treeName, cut, counters=None):
+        ''' Load the array of key, see _Load.  Fills counters, if given, with
+            the source of the array and the read and cut counters.
+        '''
+        
+        name, detnum, files = key
+        files = list(files)
+        source = None
+        
+        cache = CAPy_globals._ArrayCache
+        m = None
+        if cache is not None:
+            m = cache(key)
+            source = 'Cache'
+
+        # Memory mapped columns are served without copying or caching
+        store = CAPy_globals._ColumnStore
+        if m is None and store is not None:
+            m = store(name, detnum, files)
+            source = 'Store'
+
+        # Shared views are mapped from memory, like stored columns
+        shared = CAPy_globals._SharedArrays
+        if m is None and shared is not None:
+            m = shared(key)
+            source = 'Shared'
+
+        if m is None:
+            if counters is not None:
+                start = time.time()
+            
+            if _IsSparse(cut, files, dirName, treeName, [name]):
+                m = _ReadPassing(files, dirName, treeName, [name], cut)
+                if counters is not None:
+                    _Count(counters, 'Passing', start, m, files)
+                return m
+            
+            m = _ReadFiles(files, dirName, treeName, [name])
+            if counters is not None:
+                _Count(counters, 'Read', start, m, files)
+            
+            # Arrays that can't be shared are cached privately
+            if shared is not None:
+                m = shared.Publish(key, m)
+            if not isinstance(m, np.memmap) and cache is not None:
+                cache.Put(key, m)
+        
+        elif counters is not None:
+            counters['Source'] = source
+
+        # If cut, apply
+        if cut is not None:
+            if counters is not None:
+                start = time.time()
+            m = cut.Apply(m)
+            if counters is not None:
+                counters['CutSeconds'] = time.time() - start
+
+        return m
+
     ############# Define useful functions for checking arguments ##############
     def _Check_Detnum(self, detnum):
         ''' Check if argument is a valid detector number. '''
@@ -235,7 +494,793 @@ class Data_Function(object):
         return True
 
     def _Check_Cut(self, cut):
-        ''' Check if argument is a valid cut. '''
+        ''' Check if argument is a valid cut, None selects all events. '''
+    
+        if cut is not None and not isinstance(cut, Cut):
+            warn('WARNING in ' + self.__name__ + ':\n\tCut should be a' +
+                 ' Cut object. Using last cut.')
+            return False
     
-        #TODO: Implement Cut testing/possibly a class
         return True
+
+
+def Load(names, detnum=1, cut=None):
+    ''' Load several data or cut branches, reading each tree only once.
+    
+        Branches are grouped by the files, directory and tree given by the
+        session FileInfo, and each group is read with a single Read call.
+        General branches are always read for detnum 1.  Arrays already in the
+        session cache or column store are not read again, and new arrays are 
+        added to the cache.  If the passing events are in few clusters of
+        entries, groups are read entry by entry instead and not cached.
+        
+        Parameters:
+            names: (list or str) - Names of data or cut branches to load.
+            detnum: (int) - Detector number for detector specific branches.
+            cut: (Cut) - Selection applied to every array. (optional)
+        
+        Returns: arrays
+            arrays: (dict) - Read only column array for each name.
+        
+        Raises:
+            TypeError: If names is not a list or str.
+            ValueError: If a name isn't in the current session.
+    '''
+    
+    if isinstance(names, str):
+        names = [names]
+    elif not isinstance(names, (list, tuple)):
+        raise TypeError('ERROR in Load:\n' +
+                        'Names should be a list of names or a single name!')
+    
+    cache = CAPy_globals._ArrayCache
+    arrays = {}
+    passed = set()
+    
+    # Profiler counters of each name, reads are shared by bytes
+    profiler = CAPy_globals._Profiler
+    counters = {}
+    
+    # Group uncached names by the files and tree they are read from
+    groups = OrderedDict()
+    for name in names:
+        
+        if name in arrays:
+            continue
+        
+        if not CAPy_globals.IsData(name) and not CAPy_globals.IsCut(name):
+            raise ValueError('ERROR in Load:\n' +
+                             name + ' not loaded into the current session!')
+        
+        if CAPy_globals.IsGeneral(name):
+            nameDetnum = 1
+        else:
+            nameDetnum = detnum
+        
+        if profiler is not None:
+            start = time.time()
+        
+        files, dirName, treeName = CAPy_globals._FileInfo(name, nameDetnum)
+        key = (name, nameDetnum, tuple(files))
+        
+        if profiler is not None:
+            counters[name] = {'LookupSeconds': time.time() - start}
+        
+        if cache is not None:
+            m = cache(key)
+            if m is not None:
+                arrays[name] = m[name]
+                if profiler is not None:
+                    counters[name]['Source'] = 'Cache'
+                continue
+        
+        store = CAPy_globals._ColumnStore
+        if store is not None:
+            m = store(name, nameDetnum, files)
+            if m is not None:
+                arrays[name] = m[name]
+                if profiler is not None:
+                    counters[name]['Source'] = 'Store'
+                continue
+        
+        group = groups.setdefault((tuple(files), dirName, treeName), [])
+        group.append((name, key))
+        
+        # Placeholder so repeated names are only read once
+        arrays[name] = None
+    
+    # Read every branch of a group in one pass
+    for (files, dirName, treeName), group in groups.iteritems():
+        
+        if profiler is not None:
+            start = time.time()
+        
+        # Only read passing entries for sparse cuts
+        branches = [name for name, key in group]
+        if _IsSparse(cut, list(files), dirName, treeName, branches):
+            m = _ReadPassing(list(files), dirName, treeName, branches, cut)
+            if profiler is not None:
+                _CountGroup(counters, 'Passing', start, m, group, files)
+            for name, key in group:
+                arrays[name] = np.ascontiguousarray(m[name])
+                passed.add(name)
+            continue
+        
+        m = _ReadFiles(list(files), dirName, treeName, branches)
+        if profiler is not None:
+            _CountGroup(counters, 'Read', start, m, group, files)
+        
+        for name, key in group:
+            
+            # Contiguous column viewed as the single branch record array
+            # returned by a data function, so both share the cache
+            column = np.ascontiguousarray(m[name])
+            record = column.view([(name, column.dtype)])
+            
+            if cache is not None:
+                cache.Put(key, record)
+            record.flags.writeable = False
+            
+            arrays[name] = record[name]
+    
+    # If cut, apply
+    if cut is not None:
+        for name in arrays:
+            if name not in passed:
+                if profiler is not None:
+                    start = time.time()
+                arrays[name] = cut.Apply(arrays[name])
+                if profiler is not None:
+                    counters[name]['CutSeconds'] = time.time() - start
+    
+    if profiler is not None:
+        for name, nameCounters in counters.iteritems():
+            nameCounters['Seconds'] = sum(nameCounters.get(counter, 0) 
+                                          for counter in ['LookupSeconds', 
+                                                          'ReadSeconds',
+                                                          'CutSeconds'])
+            if CAPy_globals.IsGeneral(name):
+                profiler.Record(name, 1, **nameCounters)
+            else:
+                profiler.Record(name, detnum, **nameCounters)
+    
+    return arrays
+
+
+def _Count(counters, source, start, m, files):
+    ''' Set the read counters of a profiler record. '''
+    
+    counters['Source'] = source
+    counters['ReadSeconds'] = time.time() - start
+    counters['Bytes'] = m.nbytes
+    counters['Entries'] = len(m)
+    counters['Files'] = len(files)
+
+
+def _CountGroup(counters, source, start, m, group, files):
+    ''' Set the read counters of every name of a group read together, the 
+        read time is shared by the bytes of each column.
+    '''
+    
+    seconds = time.time() - start
+    for name, key in group:
+        nBytes = m.dtype[name].itemsize * len(m)
+        counters[name]['Source'] = source
+        counters[name]['ReadSeconds'] = seconds * nBytes / max(m.nbytes, 1)
+        counters[name]['Bytes'] = nBytes
+        counters[name]['Entries'] = len(m)
+        counters[name]['Files'] = len(files)
+
+
+def _ReadFiles(files, dirName, treeName, branches):
+    ''' Read branches of a tree from every file into one record array.
+    
+        With more than one read worker in the session and at least 
+        _MIN_PARALLEL_ENTRIES entries, the output is sized from the FileInfo
+        entry counts and allocated once in a file shared with the workers, in
+        /dev/shm if it has room, otherwise in the temporary directory.  Each
+        file is read by a worker of the session read pool straight into its 
+        slice, so the files are read in parallel and never concatenated.  
+        Output in /dev/shm is copied to private memory, so the tmpfs is free
+        for the next read.  If no directory has room the files are read in 
+        the session process.
+        
+        Parameters:
+            files: (list) - Files to read, as returned by FileInfo.
+            dirName: (str) - Directory of tree.
+            treeName: (str) - Name of tree.
+            branches: (list) - Branch names to read.
+        
+        Returns: m
+            m: (np.ndarray) - Record array as returned by rootio.Read.
+    '''
+    
+    treePath = dirName + '/' + treeName
+    
+    fileInfo = CAPy_globals._FileInfo
+    counts = [fileInfo.GetEntries(fName, dirName, treeName) for fName in files]
+    offsets = np.r_[0, np.cumsum(counts)[:-1]]
+    nEvents = sum(counts)
+    
+    nWorkers = min(CAPy_globals.GetReadWorkers(), len(files))
+    if nWorkers < 2 or nEvents < _MIN_PARALLEL_ENTRIES:
+        with CAPy_globals.Foreground():
+            return Read(files, treePath, branches)
+    
+    # Variable length branches can't live in a flat shared buffer
+    with CAPy_globals.Foreground():
+        dtype = Read(files[0], treePath, branches, start=0, stop=0).dtype
+        if dtype.hasobject:
+            return Read(files, treePath, branches)
+    
+    nBytes = max(nEvents * dtype.itemsize, 1)
+    readDir = _ReadDir(nBytes)
+    if readDir is None:
+        with CAPy_globals.Foreground():
+            return Read(files, treePath, branches)
+    
+    # Shared file the workers write their slices to, the session keeps a 
+    # mapping of it once the name is removed
+    fd, outFile = tempfile.mkstemp(prefix='CAPyread', dir=readDir)
+    try:
+        os.ftruncate(fd, nBytes)
+        buf = mmap.mmap(fd, nBytes)
+        
+        with CAPy_globals.Foreground():
+            CAPy_globals.GetReadPool().map(
+                _ReadInto, 
+                [(fName, treePath, branches, dtype, outFile, int(offset), 
+                  count) 
+                 for fName, offset, count in zip(files, offsets, counts)],
+                chunksize=1)
+    finally:
+        os.close(fd)
+        os.remove(outFile)
+    
+    m = np.frombuffer(buf, dtype=dtype, count=nEvents)
+    if readDir == '/dev/shm':
+        m = m.copy()
+        buf.close()
+    
+    return m
+
+
+def _ReadDir(nBytes):
+    ''' Return the first directory of _READ_DIRS with nBytes free, or None.'''
+    
+    for path in _READ_DIRS:
+        stat = os.statvfs(path)
+        if stat.f_bavail * stat.f_frsize >= nBytes:
+            return path
+    
+    return None
+
+
+def _ReadInto(args):
+    ''' Read one file into its slice of the shared output, run by workers.'''
+    
+    fName, treePath, branches, dtype, outFile, offset, count = args
+    
+    m = Read(fName, treePath, branches)
+    if len(m) != count:
+        raise ValueError('ERROR in _ReadFiles:\n' + 
+                         fName + ' has ' + str(len(m)) + ' entries, ' + 
+                         'expected ' + str(count) + '!')
+    
+    if count:
+        out = np.memmap(outFile, dtype=dtype, mode='r+', shape=(count,),
+                        offset=offset * dtype.itemsize)
+        out[:] = m
+        del out
+
+
+def ExtendCache(items):
+    ''' Extend arrays cached before files were added to the session, reading
+        only the added files.
+        
+        Arrays whose files are unchanged are left alone.  Arrays whose old 
+        files are no longer the leading files of their branch are dropped.
+        
+        Parameters:
+            items: (list) - (key, array) pairs from ArrayCache.Items, taken
+                before the files were added.
+        
+        Returns: nExtended
+            nExtended: (int) - Number of arrays extended.
+    '''
+    
+    fileInfo = CAPy_globals._FileInfo
+    cache = CAPy_globals._ArrayCache
+    nExtended = 0
+    
+    for key, old in items:
+        
+        name, detnum, oldFiles = key
+        if not (fileInfo.IsData(name) or fileInfo.IsCut(name)):
+            continue
+        
+        files, dirName, treeName = fileInfo(name, detnum)
+        if tuple(files) == oldFiles or \
+           tuple(files[:len(oldFiles)]) != oldFiles:
+            continue
+        
+        new = _ReadFiles(files[len(oldFiles):], dirName, treeName, [name])
+        if new.dtype != old.dtype:
+            continue
+        
+        m = np.empty(len(old) + len(new), dtype=old.dtype)
+        m[:len(old)] = old
+        m[len(old):] = new
+        
+        cache.Put((name, detnum, tuple(files)), m)
+        nExtended += 1
+    
+    return nExtended
+
+
+def _LoadDetectors(name, detnums, cut):
+    ''' Load a branch for several detectors into a detector by event array.
+    
+        Rows in the session cache or column store are taken from there.  For 
+        the rest every file is opened once and each requested zip tree is read
+        from the open file.  Rows are cached when no cut is applied.
+    
+        Parameters:
+            name: (str) - Name of data branch.
+            detnums: (list) - Detector numbers, one row each.
+            cut: (Cut) - Selection of events. (optional)
+        
+        Returns: m
+            m: (np.ndarray) - 2D detector by event array.
+    '''
+    
+    fileInfo = CAPy_globals._FileInfo
+    cache = CAPy_globals._ArrayCache
+    store = CAPy_globals._ColumnStore
+    
+    if not detnums:
+        raise ValueError('ERROR in ' + name + ':\n' +
+                         'No detector numbers given!')
+    
+    profiler = CAPy_globals._Profiler
+    if profiler is not None:
+        start = time.time()
+    
+    # All detectors must come from the same files for events to line up
+    files = None
+    trees = []
+    for detnum in detnums:
+        detFiles, dirName, treeName = fileInfo(name, detnum)
+        if files is None:
+            files = detFiles
+        elif detFiles != files:
+            raise ValueError('ERROR in ' + name + ':\n' +
+                             'Detnum ' + str(detnum) + ' is not in the same ' +
+                             'files as detnum ' + str(detnums[0]) + '!')
+        trees.append(dirName + '/' + treeName)
+    
+    if profiler is not None:
+        lookupSeconds = time.time() - start
+    
+    # Rows already loaded
+    rows = [None] * len(detnums)
+    sources = ['Read'] * len(detnums)
+    for i, detnum in enumerate(detnums):
+        key = (name, detnum, tuple(files))
+        if cache is not None:
+            rows[i] = cache(key)
+            if rows[i] is not None:
+                sources[i] = 'Cache'
+        if rows[i] is None and store is not None:
+            rows[i] = store(name, detnum, files)
+            if rows[i] is not None:
+                sources[i] = 'Store'
+    
+    missing = [i for i in range(len(detnums)) if rows[i] is None]
+    
+    if profiler is not None:
+        readStart = time.time()
+    
+    if not missing:
+        m = np.vstack([row[name] for row in rows])
+    
+    else:
+        dirName, treeName = trees[missing[0]].split('/')
+        counts = [fileInfo.GetEntries(fName, dirName, treeName) 
+                  for fName in files]
+        m = None
+        
+        # Open each file once, read every missing zip tree from it
+        offset = 0
+        for fName, count in zip(files, counts):
+            with CAPy_globals.Foreground():
+                arrays = ReadTrees(fName, [trees[i] for i in missing], [name])
+            for i, array in zip(missing, arrays):
+                column = array[name]
+                if len(column) != count:
+                    raise ValueError('ERROR in ' + name + ':\n' +
+                                     trees[i] + ' in ' + fName + 
+                                     ' has a different number of ' +
+                                     'entries!')
+                if m is None:
+                    m = np.empty((len(detnums), sum(counts)), 
+                                 dtype=column.dtype)
+                m[i, offset:offset + count] = column
+            offset += count
+        
+        if m is None:
+            m = np.empty((len(detnums), 0))
+        
+        for i, row in enumerate(rows):
+            if row is not None:
+                m[i] = row[name]
+            elif cache is not None and cut is None:
+                
+                # Own copy, a view would keep every row alive while the 
+                # cache only charges the bytes of one
+                row = m[i].copy().view([(name, m.dtype)])
+                cache.Put((name, detnums[i], tuple(files)), row)
+    
+    if profiler is not None:
+        readSeconds = time.time() - readStart
+        cutStart = time.time()
+    
+    # If cut, apply to events
+    if cut is not None:
+        if m.shape[1] != len(cut):
+            raise ValueError('ERROR in Cut.Apply:\n' +
+                             'Cut has ' + str(len(cut)) + ' events, ' +
+                             'array has ' + str(m.shape[1]) + '!')
+        m = m[:, cut.GetMask()]
+    else:
+        m.flags.writeable = False
+    
+    # Lookup and cut time are shared by every row, reads by the rows read
+    if profiler is not None:
+        cutSeconds = time.time() - cutStart
+        nRows = float(len(detnums))
+        for i, detnum in enumerate(detnums):
+            counters = {'Source': sources[i],
+                        'LookupSeconds': lookupSeconds / nRows,
+                        'CutSeconds': cutSeconds / nRows}
+            if i in missing:
+                counters['ReadSeconds'] = readSeconds / len(missing)
+                counters['Bytes'] = m.itemsize * sum(counts)
+                counters['Entries'] = sum(counts)
+                counters['Files'] = len(files)
+            counters['Seconds'] = sum(counters.get(counter, 0) 
+                                      for counter in ['LookupSeconds', 
+                                                      'ReadSeconds',
+                                                      'CutSeconds'])
+            profiler.Record(name, detnum, **counters)
+    
+    return m
+
+
+def _IsSparse(cut, files, dirName, treeName, branches):
+    ''' Return true if reading only the entries passing cut saves reading.
+    
+        Files are read a cluster of entries at a time (see 
+        rootio.ClusterEntries), so the saving is the share of clusters without
+        a passing entry, not the share of failing entries.  The cluster size
+        of the first file is used for every file.
+    '''
+    
+    if cut is None or len(cut) == 0 or not files or \
+       cut.Passed() == len(cut):
+        return False
+    
+    fileInfo = CAPy_globals._FileInfo
+    counts = [fileInfo.GetEntries(fName, dirName, treeName) for fName in files]
+    
+    # Mismatched cuts are reported by Cut.Apply
+    if sum(counts) != len(cut):
+        return False
+    
+    with CAPy_globals.Foreground():
+        cluster = ClusterEntries(files[0], dirName + '/' + treeName, branches)
+    
+    mask = cut.GetMask()
+    touched = 0
+    total = 0
+    offset = 0
+    for count in counts:
+        index = np.flatnonzero(mask[offset:offset + count])
+        offset += count
+        
+        total += -(-count // cluster)
+        touched += len(np.unique(index // cluster))
+    
+    return touched < _PUSHDOWN_COVERAGE * total
+
+
+def _ReadPassing(files, dirName, treeName, branches, cut):
+    ''' Read only the entries passing cut.
+    
+        The cut is split between the files using the entry counts from the
+        session FileInfo.  Files with no passing events are not opened, and the
+        rest are opened once each and read in ranges of the clusters holding
+        passing entries, see rootio.ReadEntries.
+        
+        Parameters:
+            files: (list) - Files to read, as returned by FileInfo.
+            dirName: (str) - Directory of tree.
+            treeName: (str) - Name of tree.
+            branches: (list) - Branch names to read.
+            cut: (Cut) - Selection of entries over all files.
+        
+        Returns: m
+            m: (np.ndarray) - Record array of passing entries, as returned by
+                rootio.Read.
+        
+        Raises:
+            ValueError: If the cut doesn't match the number of entries.
+    '''
+    
+    fileInfo = CAPy_globals._FileInfo
+    counts = [fileInfo.GetEntries(fName, dirName, treeName) for fName in files]
+    
+    if sum(counts) != len(cut):
+        raise ValueError('ERROR in Cut.Apply:\n' +
+                         'Cut has ' + str(len(cut)) + ' events, data has ' +
+                         str(sum(counts)) + '!')
+    
+    treePath = dirName + '/' + treeName
+    parts = []
+    offset = 0
+    for fName, nEntries in zip(files, counts):
+        
+        index = np.flatnonzero(cut.GetMask(offset, offset + nEntries))
+        offset += nEntries
+        
+        if len(index) == 0:
+            continue
+        
+        with CAPy_globals.Foreground():
+            parts.append(ReadEntries(fName, treePath, branches, index))
+    
+    # Empty read keeps the record dtype when nothing passes
+    if not parts:
+        with CAPy_globals.Foreground():
+            return Read(files[0], treePath, branches, start=0, stop=0)
+    
+    return np.concatenate(parts)
+
+
+def Iterate(names, detnum=1, cut=None, chunkSize=100000):
+    ''' Iterate over several branches in chunks of at most chunkSize events.
+    
+        Each file is read chunk by chunk with every tree kept open between
+        chunks, or sliced from the column store if the file was converted.  The cut is
+        applied to each chunk, so only passing events are ever kept and peak
+        memory is bounded by the chunk size.  A session profiler gets the 
+        summed time and size of the reads of each branch once the iteration
+        ends.
+        
+        Parameters:
+            names: (list or str) - Names of data or cut branches to load.
+            detnum: (int) - Detector number for detector specific branches.
+            cut: (Cut) - Selection applied to each chunk. (optional)
+            chunkSize: (int) - Largest number of events read at once.
+                (optional)
+        
+        Yields:
+            chunk: (dict) - Column array of each name for the chunk.
+        
+        Raises:
+            ValueError: If the branches are not in the same files, or the cut 
+                doesn't match the number of events.
+    '''
+    
+    if isinstance(names, str):
+        names = [names]
+    
+    entries = []
+    for name in OrderedDict.fromkeys(names):
+        if CAPy_globals.IsGeneral(name):
+            entries.append((name, 1))
+        else:
+            entries.append((name, detnum))
+    
+    for chunk in _IterEntries(entries, cut, chunkSize):
+        yield dict((name, column) for (name, nameDetnum), column 
+                   in chunk.iteritems())
+
+
+def _IterEntries(entries, cut, chunkSize, files=None, counters=None):
+    ''' Iterate over (name, detnum) entries in chunks of at most chunkSize 
+        events, see Iterate.
+        
+        Parameters:
+            files: (list) - Only read these files, in this order.  The cut then
+                covers the events of these files only. (optional)
+            counters: (dict) - Filled with the profiler counters of each 
+                (name, detnum) instead of recording them, for callers that
+                record elsewhere like worker processes. (optional)
+    
+        Yields:
+            chunk: (dict) - Column array of each (name, detnum) for the chunk.
+    '''
+    
+    if not isinstance(chunkSize, int) or chunkSize < 1:
+        raise ValueError('ERROR in Iterate:\n' +
+                         'chunkSize must be a positive integer!')
+    
+    profiler = CAPy_globals._Profiler
+    record = counters is None and profiler is not None
+    if record:
+        counters = {}
+    
+    allFiles, groups = _GroupEntries(entries, counters)
+    
+    if files is None:
+        files = allFiles
+    elif not set(files).issubset(allFiles):
+        raise ValueError('ERROR in Iterate:\n' +
+                         entries[0][0] + ' is not in all requested files!')
+    
+    try:
+        for chunk in _IterGroups(files, groups, CAPy_globals._ColumnStore, 
+                                 cut, chunkSize, counters):
+            yield chunk
+    
+    # Recorded when the iteration ends, stops early or fails
+    finally:
+        if record:
+            for (name, detnum), entryCounters in counters.iteritems():
+                entryCounters['Seconds'] = sum(
+                    entryCounters.get(counter, 0) 
+                    for counter in ['LookupSeconds', 'ReadSeconds', 
+                                    'CutSeconds'])
+                profiler.Record(name, detnum, **entryCounters)
+
+
+def _GroupEntries(entries, counters=None):
+    ''' Group (name, detnum) entries by tree, all branches must come from the
+        same files for events to line up.
+        
+        Returns: (files, groups)
+            files: (list) - Files of the entries.
+            groups: (OrderedDict) - Entries keyed by (dirName, treeName).
+        
+        Raises:
+            ValueError: If the entries are not in the same files.
+    '''
+    
+    allFiles = None
+    groups = OrderedDict()
+    for name, detnum in entries:
+        
+        if counters is not None:
+            start = time.time()
+        
+        entryFiles, dirName, treeName = CAPy_globals._FileInfo(name, detnum)
+        
+        if counters is not None:
+            _AddCounts(counters, (name, detnum), 
+                       LookupSeconds=time.time() - start)
+        
+        if allFiles is None:
+            allFiles = entryFiles
+        elif allFiles != entryFiles:
+            raise ValueError('ERROR in Iterate:\n' +
+                             name + ' is not in the same files as ' + 
+                             entries[0][0] + '!')
+        
+        groups.setdefault((dirName, treeName), []).append((name, detnum))
+    
+    return (allFiles, groups)
+
+
+def _IterGroups(files, groups, store, cut, chunkSize, counters=None):
+    ''' Yield the chunks of tree groups from _GroupEntries over files, with
+        the cut applied.  Needs no session state, so worker processes can 
+        run it on groups found by the session.
+    '''
+    
+    offset = 0
+    for fName in files:
+        
+        for chunk in _FileChunks(fName, groups, store, chunkSize, counters):
+            
+            nEvents = len(chunk.itervalues().next())
+            
+            # If cut, apply to events of this chunk only
+            if cut is not None:
+                if counters is not None:
+                    start = time.time()
+                if offset + nEvents > len(cut):
+                    raise ValueError('ERROR in Iterate:\n' +
+                                     'Cut has fewer events than the data!')
+                mask = cut.GetMask(offset, offset + nEvents)
+                for entry in chunk:
+                    chunk[entry] = chunk[entry][mask]
+                if counters is not None:
+                    seconds = (time.time() - start) / len(chunk)
+                    for entry in chunk:
+                        _AddCounts(counters, entry, CutSeconds=seconds)
+            
+            offset += nEvents
+            yield chunk
+    
+    if cut is not None and offset != len(cut):
+        raise ValueError('ERROR in Iterate:\n' +
+                         'Cut has more events than the data!')
+
+
+def _AddCounts(counters, entry, **values):
+    ''' Add values to the profiler counters of entry, Source is replaced. '''
+    
+    entryCounters = counters.setdefault(entry, {})
+    for counter, value in values.iteritems():
+        if counter == 'Source':
+            entryCounters[counter] = value
+        else:
+            entryCounters[counter] = entryCounters.get(counter, 0) + value
+
+
+def _FileChunks(fName, groups, store, chunkSize, counters=None):
+    ''' Yield dicts of column chunks for every tree group of a single file,
+        adding the read counters of each (name, detnum) to counters if given.
+    '''
+    
+    entries = [entry for group in groups.itervalues() for entry in group]
+    
+    # Converted files are sliced from the memory mapped columns
+    if store is not None and \
+       all(store.Has(name, detnum, [fName]) for name, detnum in entries):
+        
+        columns = {}
+        for name, detnum in entries:
+            columns[(name, detnum)] = store(name, detnum, [fName])[name]
+            if counters is not None:
+                _AddCounts(counters, (name, detnum), Source='Store',
+                           Bytes=columns[(name, detnum)].nbytes, 
+                           Entries=len(columns[(name, detnum)]), Files=1)
+        
+        nEntries = len(columns[entries[0]])
+        for start in xrange(0, nEntries, chunkSize):
+            yield dict((entry, column[start:start + chunkSize]) 
+                       for entry, column in columns.iteritems())
+        return
+    
+    # Otherwise read each tree a chunk at a time until the file runs out,
+    # every tree stays open between its chunks
+    if counters is not None:
+        for entry in entries:
+            _AddCounts(counters, entry, Source='Read', Files=1)
+    
+    readers = [(group, ReadChunks(fName, dirName + '/' + treeName,
+                                  [name for name, detnum in group], 
+                                  chunkSize))
+               for (dirName, treeName), group in groups.iteritems()]
+    
+    try:
+        while True:
+            chunk = {}
+            for group, reader in readers:
+                if counters is not None:
+                    readStart = time.time()
+                with CAPy_globals.Foreground():
+                    m = next(reader, None)
+                if m is None:
+                    return
+                if counters is not None:
+                    
+                    # Read time is shared by the bytes of each column
+                    seconds = time.time() - readStart
+                    for name, detnum in group:
+                        nBytes = m.dtype[name].itemsize * len(m)
+                        _AddCounts(counters, (name, detnum), Bytes=nBytes,
+                                   Entries=len(m), 
+                                   ReadSeconds=seconds * nBytes / 
+                                               max(m.nbytes, 1))
+                for name, detnum in group:
+                    chunk[(name, detnum)] = np.ascontiguousarray(m[name])
+            
+            yield chunk
+    
+    # Close the trees of a file left early
+    finally:
+        for group, reader in readers:
+            reader.close()
@@ -0,0 +1,323 @@
+# -*- coding: utf-8 -*-
+"""
+eventindex.py
+
+CAPy module for the EventIndex class.
+
+FileInfo knows which files hold SeriesNumber and EventNumber, but not where a
+given event is.  The EventIndex reads both branches once, sorts the events, 
+and maps every (series, event) to its file and entry, so single events are 
+found with a binary search and data and cut file sets can be lined up with a
+vectorized search of one sorted index in the other.  Positions are counted 
+over every indexed file, or over the files a branch is loaded from for 
+branches missing from some files.  The index is saved next to the session 
+and rebuilt only when the file set changes.
+
+Classes:
+    EventIndex - Sorted (series, event) to (file, entry) index.
+
+Created on Sat Oct 17 14:08:52 2026
+
+@author: tdoughty1
+"""
+
+# Import Standard libraries
+import os
+
+# Import Numerical libraries
+import numpy as np
+
+# Import file readers, ROOT is loaded on first read
+from rootio import Read
+
+# Sort key of the index, compared series first then event
+_KEY_DTYPE = np.dtype([('Series', np.int64), ('Event', np.int64)])
+
+class EventIndex(object):
+    ''' Sorted index from (SeriesNumber, EventNumber) to (file, entry).
+    
+        Called:
+            fName, entry = EventIndex(series, event)
+            
+            Inputs:
+                series: (int) - Series number of event.
+                event: (int) - Event number of event.
+            
+            Outputs:
+                fName: (str) - File holding the event, None if not found.
+                entry: (int) - Entry of the event in fName.
+        
+        Constructed:
+            EventIndex(fileInfo, fType, indexFile)
+            
+            Parameters:
+                fileInfo: (FileInfo) - Session file information.
+                fType: (str) - Index 'Data' or 'Cut' files. (optional)
+                indexFile: (str) - .npz file to load the index from and save
+                    it to. (optional)
+        
+        Methods:
+            Position: Return the position of an event in the session arrays.
+            LookupMany: Vectorized lookup of many events.
+            Join: Match the events of two indices.
+            GetFiles: Return the indexed files.
+            Save: Write the index to a .npz file.
+        
+        Hidden Methods:
+            _Build: Read series and event numbers of every file and sort.
+            _Load: Read a saved index if it matches the file set.
+            _Find: Return the sorted rows of keys, -1 if not found.
+            _FileOffsets: Return the first position of each file in arrays
+                loaded from some of the files.
+        
+        Attributes:
+            _files: (list) - Indexed files in session order.
+            _stats: (np.ndarray) - (size, mtime) of each indexed file.
+            _offsets: (np.ndarray) - Position of the first event of each file
+                in the session arrays.
+            _keys: (np.ndarray) - Sorted (Series, Event) records.
+            _file: (np.ndarray) - File number of each sorted key.
+            _entry: (np.ndarray) - Entry in file of each sorted key.
+    '''
+    
+    def __init__(self, fileInfo, fType='Data', indexFile=None):
+        ''' Constructs the index from the session files or indexFile.
+        
+            Raises:
+                ValueError: If fType is neither 'Data' nor 'Cut'.
+        '''
+        
+        if fType == 'Data':
+            self._files = fileInfo.GetDataFiles()
+        elif fType == 'Cut':
+            self._files = fileInfo.GetCutFiles()
+        else:
+            raise ValueError('ERROR in EventIndex:\n' + 
+                             'Unknown file type ' + fType + '!\n' + 
+                             "Should be 'Cut' or 'Data'!")
+        
+        self._stats = np.array([(fileInfo.GetFileMap(fName)['Size'],
+                                 fileInfo.GetFileMap(fName)['MTime'])
+                                for fName in self._files], dtype=np.float64)
+        self._stats.shape = (len(self._files), 2)
+        
+        if indexFile is None or not self._Load(indexFile):
+            self._Build(fileInfo)
+            if indexFile is not None:
+                self.Save(indexFile)
+    
+    def __call__(self, series, event):
+        ''' Return (file name, entry) of an event, (None, None) if not found.'''
+        
+        row = self._Find(np.array([(series, event)], dtype=_KEY_DTYPE))[0]
+        if row < 0:
+            return (None, None)
+        
+        return (self._files[self._file[row]], int(self._entry[row]))
+    
+    def __len__(self):
+        return len(self._keys)
+    
+    def Position(self, series, event, files=None):
+        ''' Return the position of an event in arrays loaded from files, or
+            None if not found, see LookupMany.
+        '''
+        
+        positions = self.LookupMany([series], [event], files)
+        if positions[0] < 0:
+            return None
+        
+        return int(positions[0])
+    
+    def LookupMany(self, series, events, files=None):
+        ''' Vectorized lookup of many events.
+        
+            Parameters:
+                series: (np.ndarray) - Series number of each event.
+                events: (np.ndarray) - Event number of each event.
+                files: (list) - Files the arrays are loaded from, as returned
+                    by FileInfo for the branch, default every indexed file.
+                    Events of other files are not found. (optional)
+            
+            Returns: positions
+                positions: (np.ndarray) - Position of each event in arrays 
+                    loaded from files, -1 if not found.
+        '''
+        
+        keys = np.empty(len(events), dtype=_KEY_DTYPE)
+        keys['Series'] = series
+        keys['Event'] = events
+        
+        rows = self._Find(keys)
+        offsets = self._FileOffsets(files)
+        
+        positions = np.full(len(rows), -1, dtype=np.int64)
+        found = np.flatnonzero(rows >= 0)
+        fileOffsets = offsets[self._file[rows[found]]]
+        inFiles = fileOffsets >= 0
+        positions[found[inFiles]] = fileOffsets[inFiles] + \
+                                    self._entry[rows[found[inFiles]]]
+        
+        return positions
+    
+    def Join(self, other, files=None, otherFiles=None):
+        ''' Match the events of this index with another, for example data 
+            files with cut files.
+            
+            Every key of this index is looked up in the sorted keys of other
+            with one vectorized binary search (np.searchsorted), no per event
+            Python loop.  Events are returned in the sorted key order of 
+            this index.
+            
+            Parameters:
+                other: (EventIndex) - Index to join with.
+                files: (list) - Files the arrays of this index are loaded
+                    from, default every indexed file. (optional)
+                otherFiles: (list) - Files the arrays of other are loaded 
+                    from, default every file indexed by other. (optional)
+            
+            Returns: (positions, otherPositions)
+                positions: (np.ndarray) - Position in arrays of this index of
+                    every event found in both.
+                otherPositions: (np.ndarray) - Position in arrays of other of 
+                    the same events.
+        '''
+        
+        rows = other._Find(self._keys)
+        found = np.flatnonzero(rows >= 0)
+        otherRows = rows[found]
+        
+        fileOffsets = self._FileOffsets(files)[self._file[found]]
+        otherOffsets = other._FileOffsets(otherFiles)[other._file[otherRows]]
+        inFiles = (fileOffsets >= 0) & (otherOffsets >= 0)
+        
+        positions = fileOffsets[inFiles] + self._entry[found[inFiles]]
+        otherPositions = otherOffsets[inFiles] + \
+                         other._entry[otherRows[inFiles]]
+        
+        return (positions, otherPositions)
+    
+    def GetFiles(self):
+        ''' Return list of indexed files in session order.'''
+        return list(self._files)
+    
+    def Save(self, indexFile):
+        ''' Write the index to a .npz file.
+        
+            Parameters:
+                indexFile: (str) - Name of .npz file.
+        '''
+        
+        # Write to temporary file and rename so readers never see a partial 
+        # index, np.savez adds .npz to names without it
+        tmpFile = indexFile + '.tmp' + str(os.getpid()) + '.npz'
+        np.savez(tmpFile, files=np.array(self._files), stats=self._stats,
+                 offsets=self._offsets, keys=self._keys, fileNums=self._file,
+                 entry=self._entry)
+        os.rename(tmpFile, indexFile)
+    
+    def _Build(self, fileInfo):
+        ''' Read series and event numbers of every file and sort them.'''
+        
+        keys = []
+        files = []
+        entries = []
+        counts = []
+        
+        for i, fName in enumerate(self._files):
+            
+            branches = fileInfo.GetFileMap(fName)['Map']['Branches']
+            if 'SeriesNumber' not in branches or 'EventNumber' not in branches:
+                raise ValueError('ERROR in EventIndex:\n' +
+                                 fName + ' has no SeriesNumber/EventNumber!')
+            
+            fileKeys = None
+            for name, field in [('SeriesNumber', 'Series'),
+                                ('EventNumber', 'Event')]:
+                dirName, treeName = branches[name][1]
+                m = Read(fName, dirName + '/' + treeName, [name])
+                if fileKeys is None:
+                    fileKeys = np.empty(len(m), dtype=_KEY_DTYPE)
+                fileKeys[field] = m[name]
+            
+            keys.append(fileKeys)
+            files.append(np.full(len(fileKeys), i, dtype=np.int32))
+            entries.append(np.arange(len(fileKeys), dtype=np.int64))
+            counts.append(len(fileKeys))
+        
+        if keys:
+            keys = np.concatenate(keys)
+            files = np.concatenate(files)
+            entries = np.concatenate(entries)
+        else:
+            keys = np.empty(0, dtype=_KEY_DTYPE)
+            files = np.empty(0, dtype=np.int32)
+            entries = np.empty(0, dtype=np.int64)
+        
+        order = np.argsort(keys, kind='mergesort', order=['Series', 'Event'])
+        
+        self._keys = keys[order]
+        self._file = files[order]
+        self._entry = entries[order]
+        self._offsets = np.r_[0, np.cumsum(counts)[:-1]].astype(np.int64)
+    
+    def _Load(self, indexFile):
+        ''' Read a saved index, return false if it doesn't match the files.'''
+        
+        if not os.path.isfile(indexFile):
+            return False
+        
+        saved = np.load(indexFile)
+        try:
+            if saved['files'].tolist() != self._files or \
+               not np.array_equal(saved['stats'], self._stats):
+                return False
+            
+            self._offsets = saved['offsets']
+            self._keys = saved['keys']
+            self._file = saved['fileNums']
+            self._entry = saved['entry']
+        finally:
+            saved.close()
+        
+        return True
+    
+    def _FileOffsets(self, files):
+        ''' Return the position of the first event of each indexed file in 
+            arrays loaded from files, -1 for indexed files not in files.
+        
+            Parameters:
+                files: (list) - Files the arrays are loaded from, in load 
+                    order, None for every indexed file.
+            
+            Raises:
+                ValueError: If a file isn't indexed.
+        '''
+        
+        if files is None:
+            return self._offsets
+        
+        counts = np.diff(np.r_[self._offsets, len(self._keys)])
+        fileNums = dict((fName, i) for i, fName in enumerate(self._files))
+        
+        offsets = np.full(len(self._files), -1, dtype=np.int64)
+        offset = 0
+        for fName in files:
+            if fName not in fileNums:
+                raise ValueError('ERROR in EventIndex:\n' +
+                                 fName + ' is not indexed!')
+            offsets[fileNums[fName]] = offset
+            offset += counts[fileNums[fName]]
+        
+        return offsets
+    
+    def _Find(self, keys):
+        ''' Return the sorted row of each key, -1 if not in the index.'''
+        
+        rows = np.searchsorted(self._keys, keys)
+        inRange = rows < len(self._keys)
+        found = np.zeros(len(keys), dtype=bool)
+        found[inRange] = self._keys[rows[inRange]] == keys[inRange]
+        
+        rows[~found] = -1
+        return rows
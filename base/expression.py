@@ -0,0 +1,564 @@
+# -*- coding: utf-8 -*-
+"""
+expression.py
+
+CAPy module for lazy expressions of data branches.
+
+Derived quantities like PTNFchisq(1104)/PRecoilT(1104) built from loaded 
+arrays create a full size temporary for every step.  Lazy expressions record
+the arithmetic instead, then Evaluate reads each branch once, chunk by chunk,
+and evaluates the whole expression on each chunk.  Memory is set by the chunk
+size and I/O by the branches used, not by the number of steps.  Comparisons 
+evaluate to a Cut.  With zone maps, range comparisons against constants skip
+files whose min and max already decide the comparison, and evaluated cuts 
+are kept in the session CutCache for later sessions and published to the 
+processes of a shared session.
+
+    >>> ratio = PTNFchisq.Lazy(1104) / PRecoilT.Lazy(1104)
+    >>> cut = (ratio < 2.5).Evaluate()
+    >>> values = ratio.Evaluate(cut)
+
+Classes:
+    Expr - Base class of lazy expressions, holds the operators.
+    Branch - Data or cut branch for one detector number.
+    Const - Constant value.
+    Op - Function applied to other expressions.
+
+Functions:
+    Func - Apply a NumPy function to expressions lazily.
+
+Created on Sat Oct 17 13:25:07 2026
+
+@author: tdoughty1
+"""
+
+# Import Standard libraries
+import time
+import operator
+from collections import OrderedDict
+
+# Import Numerical libraries
+import numpy as np
+
+# Import CAPy modules
+import CAPy_globals
+from cuts import PackChunks
+from datatypes import _IterEntries
+
+class Expr(object):
+    ''' Base class of lazy expressions.
+    
+        Arithmetic (+, -, *, /, **, unary -, abs) and comparisons on 
+        expressions and numbers return new expressions.  &, | and ^ combine
+        boolean expressions, ~ negates them.
+        
+        Methods:
+            Evaluate: Read the branches and evaluate the expression.
+            IsBool: Return true if the expression evaluates to a Cut.
+            GetBranches: Return the (name, detnum) of every branch used.
+        
+        Hidden Methods:
+            _Eval: Evaluate on one chunk, implemented by subclasses.
+            _Decide: Decide a boolean expression for a whole file from its 
+                zone map.
+            _Definition: Return a string defining the expression, None if it
+                uses Python functions.
+            _Leaves: Add the (name, detnum) of branches to an OrderedDict.
+    '''
+    
+    _isbool = False
+    
+    # Arithmetic
+    def __add__(self, other):
+        return Op(operator.add, self, other)
+    
+    def __radd__(self, other):
+        return Op(operator.add, other, self)
+    
+    def __sub__(self, other):
+        return Op(operator.sub, self, other)
+    
+    def __rsub__(self, other):
+        return Op(operator.sub, other, self)
+    
+    def __mul__(self, other):
+        return Op(operator.mul, self, other)
+    
+    def __rmul__(self, other):
+        return Op(operator.mul, other, self)
+    
+    def __div__(self, other):
+        return Op(np.true_divide, self, other)
+    
+    def __rdiv__(self, other):
+        return Op(np.true_divide, other, self)
+    
+    __truediv__ = __div__
+    __rtruediv__ = __rdiv__
+    
+    def __pow__(self, other):
+        return Op(operator.pow, self, other)
+    
+    def __rpow__(self, other):
+        return Op(operator.pow, other, self)
+    
+    def __neg__(self):
+        return Op(operator.neg, self)
+    
+    def __abs__(self):
+        return Op(np.abs, self)
+    
+    # Comparisons evaluate to cuts
+    def __lt__(self, other):
+        return Op(operator.lt, self, other, isbool=True)
+    
+    def __le__(self, other):
+        return Op(operator.le, self, other, isbool=True)
+    
+    def __gt__(self, other):
+        return Op(operator.gt, self, other, isbool=True)
+    
+    def __ge__(self, other):
+        return Op(operator.ge, self, other, isbool=True)
+    
+    def __eq__(self, other):
+        return Op(operator.eq, self, other, isbool=True)
+    
+    def __ne__(self, other):
+        return Op(operator.ne, self, other, isbool=True)
+    
+    __hash__ = object.__hash__
+    
+    # Logic on boolean expressions
+    def __and__(self, other):
+        return Op(np.logical_and, self, other, isbool=True)
+    
+    def __or__(self, other):
+        return Op(np.logical_or, self, other, isbool=True)
+    
+    def __xor__(self, other):
+        return Op(np.logical_xor, self, other, isbool=True)
+    
+    def __invert__(self):
+        return Op(np.logical_not, self, isbool=True)
+    
+    def __nonzero__(self):
+        raise TypeError('ERROR in Expr:\n' +
+                        'Lazy expressions have no truth value, use ' +
+                        'Evaluate()!')
+    
+    def IsBool(self):
+        ''' Return true if the expression evaluates to a Cut.'''
+        return self._isbool
+    
+    def GetBranches(self):
+        ''' Return list of (name, detnum) of every branch used.'''
+        leaves = OrderedDict()
+        self._Leaves(leaves)
+        return leaves.keys()
+    
+    def Evaluate(self, cut=None, chunkSize=100000):
+        ''' Read the branches and evaluate the expression chunk by chunk.
+        
+            Every branch is read once, and only chunkSize events of each are
+            held in memory.  All branches must be in the same files.  Files 
+            a boolean expression passes or fails entirely, according to the
+            zone maps, are not read.  Boolean expressions found in the 
+            session cut cache, or published by another process of a shared
+            session, are not evaluated at all.  A session profiler gets the
+            reads of each branch and the evaluation, with where a cut came 
+            from.
+            
+            Parameters:
+                cut: (Cut) - Selection of events, for a boolean expression the
+                    result is and'ed with the cut. (optional)
+                chunkSize: (int) - Largest number of events read at once.
+                    (optional)
+            
+            Returns: result
+                result: (Cut or np.ndarray) - Cut for boolean expressions, 
+                    otherwise the value of each passing event.
+            
+            Raises:
+                ValueError: If the expression uses no branches.
+        '''
+        
+        entries = self.GetBranches()
+        if not entries:
+            raise ValueError('ERROR in Expr.Evaluate:\n' +
+                             'Expression uses no data branches!')
+        
+        profiler = CAPy_globals._Profiler
+        if profiler is None:
+            return self._Evaluate(entries, cut, chunkSize)
+        
+        start = time.time()
+        counters = {}
+        try:
+            result = self._Evaluate(entries, cut, chunkSize, counters)
+            counters['Entries'] = len(result)
+            return result
+        finally:
+            counters['Seconds'] = time.time() - start
+            if self._isbool:
+                profiler.Record('Evaluate Cut', None, **counters)
+            else:
+                profiler.Record('Evaluate', None, **counters)
+    
+    def _Evaluate(self, entries, cut, chunkSize, counters=None):
+        ''' Evaluate the expression, see Evaluate.  Fills counters, if given,
+            with the source of a cut and the time spent applying the cut.
+        '''
+        
+        # Boolean expressions are evaluated for every event to line up with 
+        # other cuts
+        if self._isbool:
+            result = self._CachedCut(entries, chunkSize, counters)
+            if cut is not None:
+                if counters is not None:
+                    start = time.time()
+                result = result & cut
+                if counters is not None:
+                    counters['CutSeconds'] = time.time() - start
+            return result
+        
+        if counters is not None:
+            counters['Source'] = 'Read'
+        
+        # Number of results is known up front, fill one preallocated array
+        if cut is not None:
+            nEvents = cut.Passed()
+        else:
+            fileInfo = CAPy_globals._FileInfo
+            files, dirName, treeName = fileInfo(*entries[0])
+            nEvents = sum(fileInfo.GetEntries(fName, dirName, treeName) 
+                          for fName in files)
+        
+        result = None
+        offset = 0
+        for chunk in _IterEntries(entries, cut, chunkSize):
+            values = np.asarray(self._Eval(chunk))
+            if result is None:
+                result = np.empty(nEvents, dtype=values.dtype)
+            result[offset:offset + len(values)] = values
+            offset += len(values)
+        
+        if result is None:
+            result = np.empty(0)
+        
+        return result
+    
+    def _CachedCut(self, entries, chunkSize, counters=None):
+        ''' Evaluate a boolean expression on every event, through the shared
+            session cuts and the session cut cache.  Sets the Source of 
+            counters, if given, to where the cut came from.
+        '''
+        
+        if counters is not None:
+            counters['Source'] = 'Read'
+        
+        cutCache = CAPy_globals._CutCache
+        shared = CAPy_globals._SharedArrays
+        definition = self._Definition()
+        if definition is None or (cutCache is None and shared is None):
+            return PackChunks(self._BoolChunks(entries, chunkSize))
+        
+        fileInfo = CAPy_globals._FileInfo
+        files = fileInfo(*entries[0])[0]
+        stamps = fileInfo.GetFileStamps(files)
+        
+        if shared is not None:
+            sharedName = repr((definition, stamps))
+            result = shared.AttachCut(sharedName)
+            if result is not None:
+                if counters is not None:
+                    counters['Source'] = 'Shared'
+                return result
+        
+        result = None
+        if cutCache is not None:
+            key = cutCache.Key(definition, stamps)
+            result = cutCache(key)
+            if result is not None and counters is not None:
+                counters['Source'] = 'CutCache'
+        
+        if result is None:
+            result = PackChunks(self._BoolChunks(entries, chunkSize))
+            if cutCache is not None:
+                cutCache.Put(key, result)
+        
+        if shared is not None:
+            result = shared.PublishCut(sharedName, result)
+        
+        return result
+    
+    def _BoolChunks(self, entries, chunkSize):
+        ''' Yield boolean chunks of every event, files decided by the zone 
+            maps are filled without reading.
+        '''
+        
+        fileInfo = CAPy_globals._FileInfo
+        files, dirName, treeName = fileInfo(*entries[0])
+        decisions = [self._Decide(fileInfo, fName) for fName in files]
+        
+        # Without any decided file read everything in one pass
+        if all(decision is None for decision in decisions):
+            for chunk in _IterEntries(entries, None, chunkSize):
+                yield self._Eval(chunk)
+            return
+        
+        for fName, decision in zip(files, decisions):
+            
+            if decision is None:
+                for chunk in _IterEntries(entries, None, chunkSize, [fName]):
+                    yield self._Eval(chunk)
+                continue
+            
+            nEvents = fileInfo.GetEntries(fName, dirName, treeName)
+            for start in xrange(0, nEvents, chunkSize):
+                yield np.full(min(chunkSize, nEvents - start), decision, 
+                              dtype=bool)
+    
+    def _Eval(self, chunk):
+        raise NotImplementedError
+    
+    def _Decide(self, fileInfo, fName):
+        return None
+    
+    def _Definition(self):
+        return None
+    
+    def _Leaves(self, leaves):
+        pass
+
+
+class Branch(Expr):
+    ''' Lazy expression for a data or cut branch and detector number.
+    
+        Constructed:
+            Branch(name, detnum)
+            
+            Parameters:
+                name: (str) - Name of data or cut branch.
+                detnum: (int) - Detector number (1 = general).
+    '''
+    
+    def __init__(self, name, detnum):
+        self._name = name
+        self._detnum = detnum
+    
+    def __repr__(self):
+        return self._name + '(' + str(self._detnum) + ')'
+    
+    def _Eval(self, chunk):
+        return chunk[(self._name, self._detnum)]
+    
+    def _Definition(self):
+        return repr(self)
+    
+    def _Leaves(self, leaves):
+        leaves[(self._name, self._detnum)] = None
+
+
+class Const(Expr):
+    ''' Lazy expression for a constant.
+    
+        Constructed:
+            Const(value)
+            
+            Parameters:
+                value: (number) - Constant value.
+    '''
+    
+    def __init__(self, value):
+        self._value = value
+    
+    def __repr__(self):
+        return repr(self._value)
+    
+    def _Eval(self, chunk):
+        return self._value
+    
+    def _Definition(self):
+        return repr(self._value)
+
+
+class Op(Expr):
+    ''' Lazy expression applying a function to other expressions.
+    
+        Constructed:
+            Op(func, *args, isbool=False)
+            
+            Parameters:
+                func: (callable) - Elementwise function of the arguments.
+                args: (Expr or number) - Arguments, numbers are wrapped in
+                    Const.
+                isbool: (bool) - True if func returns a boolean array.
+    '''
+    
+    def __init__(self, func, *args, **kwargs):
+        self._func = func
+        self._args = [arg if isinstance(arg, Expr) else Const(arg) 
+                      for arg in args]
+        self._isbool = kwargs.get('isbool', False)
+    
+    def __repr__(self):
+        name = getattr(self._func, '__name__', repr(self._func))
+        return name + '(' + ', '.join(repr(arg) for arg in self._args) + ')'
+    
+    def _Eval(self, chunk):
+        return self._func(*[arg._Eval(chunk) for arg in self._args])
+    
+    def _Decide(self, fileInfo, fName):
+        ''' Return True if every event of the file passes, False if none do,
+            None if the file has to be read.
+        '''
+        
+        if self._func in _LOGIC:
+            decisions = [arg._Decide(fileInfo, fName) for arg in self._args]
+            return _LOGIC[self._func](decisions)
+        
+        if self._func not in _FLIPPED or len(self._args) != 2:
+            return None
+        
+        # Only comparisons of a branch with a constant can be decided
+        left, right = self._args
+        func = self._func
+        if isinstance(left, Const) and isinstance(right, Branch):
+            left, right = right, left
+            func = _FLIPPED[func]
+        if not isinstance(left, Branch) or not isinstance(right, Const):
+            return None
+        
+        zone = fileInfo.GetZone(fName, left._name, left._detnum)
+        if zone is None:
+            return None
+        
+        return _Compare(func, zone, right._value)
+    
+    def _Definition(self):
+        ''' Return module and name of the function applied to the argument 
+            definitions.  Python functions can change between sessions under 
+            the same name, so expressions using them have no definition.
+        '''
+        
+        if hasattr(self._func, 'func_code') or \
+           not hasattr(self._func, '__name__'):
+            return None
+        
+        args = [arg._Definition() for arg in self._args]
+        if None in args:
+            return None
+        
+        module = getattr(self._func, '__module__', None) or 'numpy'
+        return module + '.' + self._func.__name__ + '(' + ', '.join(args) + ')'
+    
+    def _Leaves(self, leaves):
+        for arg in self._args:
+            arg._Leaves(leaves)
+
+
+def _And(decisions):
+    if False in decisions:
+        return False
+    if None in decisions:
+        return None
+    return True
+
+
+def _Or(decisions):
+    if True in decisions:
+        return True
+    if None in decisions:
+        return None
+    return False
+
+
+def _Xor(decisions):
+    if None in decisions:
+        return None
+    return decisions[0] != decisions[1]
+
+
+def _Not(decisions):
+    if decisions[0] is None:
+        return None
+    return not decisions[0]
+
+
+# Combination of the file decisions of the arguments of logic operators
+_LOGIC = {np.logical_and: _And, np.logical_or: _Or, np.logical_xor: _Xor,
+          np.logical_not: _Not}
+
+# Comparison with the arguments swapped, for constants on the left
+_FLIPPED = {operator.lt: operator.gt, operator.le: operator.ge,
+            operator.gt: operator.lt, operator.ge: operator.le,
+            operator.eq: operator.eq}
+
+
+def _Compare(func, zone, value):
+    ''' Decide branch func value for a whole file from its zone.
+    
+        Parameters:
+            func: (callable) - Comparison from _FLIPPED.
+            zone: (tuple) - (entries, min, max, NaN count, -inf count, 
+                +inf count) of the branch.
+            value: (number) - Constant compared to.
+        
+        Returns: decision
+            decision: (bool) - True if every event passes, False if none do,
+                None if undecided.
+    '''
+    
+    nEvents, low, high, nNaN, nNegInf, nPosInf = zone
+    
+    # Decide the finite range and each kind of non-finite value separately,
+    # comparisons with NaN are always false
+    decisions = set()
+    if nNaN:
+        decisions.add(False)
+    if nNegInf:
+        decisions.add(bool(func(-np.inf, value)))
+    if nPosInf:
+        decisions.add(bool(func(np.inf, value)))
+    if nEvents > nNaN + nNegInf + nPosInf:
+        decisions.add(_CompareRange(func, low, high, value))
+    
+    if not decisions:
+        return False
+    if len(decisions) == 1:
+        return decisions.pop()
+    return None
+
+
+def _CompareRange(func, low, high, value):
+    ''' Decide branch func value for finite values between low and high. '''
+    
+    if func is operator.eq:
+        if value < low or value > high:
+            return False
+        if low == high == value:
+            return True
+        return None
+    
+    # Passes everywhere if the end least likely to pass does
+    if func in (operator.lt, operator.le):
+        worst, best = high, low
+    else:
+        worst, best = low, high
+    
+    if not func(best, value):
+        return False
+    if func(worst, value):
+        return True
+    return None
+
+
+def Func(func, *args):
+    ''' Apply a NumPy function to expressions lazily, ie. Func(np.sqrt, x).
+    
+        Parameters:
+            func: (callable) - Elementwise function of the arguments.
+            args: (Expr or number) - Arguments of func.
+    '''
+    return Op(func, *args)
@@ -20,10 +20,23 @@ Based on root_GetDir from cdmstools
 """
 
 # Import Standard libraries
-from os.path import isfile
+import os
+import time
+import cPickle
+from multiprocessing import Pool
+from os.path import isfile, exists
 
-# Import ROOT libraries
-import rootpy.io as rpi
+# Import Numerical libraries
+import numpy as np
+
+# Import file readers, ROOT is loaded on first file scan
+from rootio import Scan, Read
+
+# Import CAPy modules
+import CAPy_globals
+
+# Version of the on-disk map cache format, bump when the per file map changes
+_CACHE_VERSION = 3
 
 class FileInfo(object):
     ''' Class for a root file mapping information.
@@ -49,44 +62,95 @@ class FileInfo(object):
                 treeNameList: (list) - Names of root trees to load data from.
 
         Constructed:
-            FileInfo(dataFileList, cutFileList)
+            FileInfo(dataFileList, cutFileList, cacheFile, nWorkers, zoneMaps,
+                     filesPerWorker)
             
             Parameters:
                 dataFileList: (list) - All data files to be studied in this 
                     session.
                 cutFileList: (list) - All cut files to be studied in this 
                     session.
+                cacheFile: (str) - File used to store the file map between
+                    sessions. (optional)
+                nWorkers: (int) - Number of processes used to map files.
+                    (optional)
+                zoneMaps: (bool or list) - Branches to keep per file 
+                    statistics of while mapping, True for all. (optional)
+                filesPerWorker: (int) - Files scanned by a mapping process 
+                    before it is replaced. (optional)
 
         Methods:
             AddDataFiles: Add one or more data files to current session.
             AddCutFiles: Add one or more cut files to current session.
             GetDataNames: Return list of data names in current session.
             GetCutNames: Return list of cut names in current session.
+            IsData: Checks if a name is a data branch in current session.
+            IsCut: Checks if a name is a cut branch in current session.
+            GetDataFiles: Return list of data files in current session.
+            GetCutFiles: Return list of cut files in current session.
+            GetFileMap: Return the map of a single file.
+            GetFileStamps: Return the size and modification time of files.
+            GetEntries: Return the number of entries of a tree in a file.
+            GetBranchDetnums: Return the detector numbers of a branch.
+            GetZone: Return the per file statistics of a branch.
             IsGeneral: Checks if the branch is general (true) or detector
                 specific (false).
+            LoadCache: Read file maps stored by a previous session.
+            SaveCache: Write file maps of current session to disk.
+            AddListener: Register a function called when files are added.
 
 
         Hidden Methods:
             _AddFiles: Called by AddDataFiles and AddCutFiles, checks files
                 existence, then add file to appropriate file list and calls
-                _MapFile.
-            _MapFile: Called by _AddFiles, loads root file and gets map of
-                directory and tree names for use in loading data.
+                _MapFiles.
+            _MapFiles: Called by _AddFiles, gets map of each file from the 
+                cache or from _ScanFile, in a pool of nWorkers processes, and
+                merges them into the session in input order.
+            _MergeMap: Called by _MapFiles, adds the map of a single file into
+                the data or cut info dict.
+            _InternLayout: Called by _MergeMap, returns the id of a file 
+                layout, adding new layouts to the data or cut info dict.
+            _GetFiles: Return list of file names of a file bitset.
 
         Attributes:
             _dataList: (list) - All the datafiles included in the current 
                 session.
-            _dataInfo (dict) - dict of the lists corresponding to every data 
-                branch found in any datafile and the detector numbers which 
-                correspond to that RQ. Multilevel dict keyed first by data
-                name, then by detector number. 
+            _dataInfo (dict) - Every data branch found in any datafile and 
+                the detector numbers which correspond to that RQ. Multilevel 
+                dict keyed first by data name, then by detector number, of 
+                [treeId, layoutBits] lists.
             _cutList: (list) - All the cutfiles in the current session.
-            _cutInfo: (dict) - Contains lists corresponding to every 
-                available cut and corresponding detectors.  Multilevel dict
-                keyed first by cut name, then by detector number. 
+            _cutInfo: (dict) - Every available cut and corresponding 
+                detectors, same layout as _dataInfo.
+            _files: (list) - File table, file ids index into it.
+            _trees: (list) - Table of (dirName, treeName), treeIds index into
+                it.
+            _treeIds: (dict) - Tree id of each (dirName, treeName).
+            _layouts: (list) - Distinct file layouts (branch/detnum to tree
+                maps) with the bitset of file ids having that layout.  Bit i
+                of layoutBits is set if layout i has the branch/detnum.
+            _layoutIds: (dict) - Layout id keyed by file type and layout.
+            _fileSets: (dict) - File name lists of file bitsets already
+                decoded, cleared when files are added.
+            _fileMaps: (dict) - Map of every file in the session keyed by file
+                name, stored with the file size and modification time.
+            _mapCache: (dict) - File maps read from the cache file, used in
+                place of scanning a file if size and mtime still match.
+            _cacheFile: (str) - Cache file name, None if not caching.
+            _unsaved: (bool) - True if files were scanned since the cache 
+                file was last written.
+            _nWorkers: (int) - Number of processes used to map files.
+            _zoneMaps: (bool or set) - Branches to keep per file statistics 
+                of, True for all, None for none.
+            _filesPerWorker: (int) - Files scanned by a mapping process before
+                it is replaced, None to keep processes for the whole map.
+            _listeners: (list) - Functions called with the names of changed
+                branches whenever files are added.
     '''
 
-    def __init__(self, dataList=None, cutList=None):
+    def __init__(self, dataList=None, cutList=None, cacheFile=None,
+                 nWorkers=1, zoneMaps=None, filesPerWorker=None):
         ''' Constructs a file information object from a datalist and/or cutlist.
             
             Parameters:
@@ -94,6 +158,19 @@ class FileInfo(object):
                     to CAPy session.
                 cutList: (list or str) - Filenames of cut files to be added to 
                     Capy session. (optional)
+                cacheFile: (str) - File to load the file maps from and save 
+                    them back to after adding files. (optional)
+                nWorkers: (int) - Number of processes used to map files, 1
+                    maps files in the session process. (optional)
+                zoneMaps: (bool or list) - Branches to store the entry count,
+                    min, max and NaN count of for every file, True for all.
+                    Each file is read in full to get them. (optional)
+                filesPerWorker: (int) - Files scanned by a mapping process 
+                    before it is replaced by a fresh one.  ROOT keeps memory 
+                    from every file opened, so with this set files are always
+                    scanned in worker processes, even for nWorkers 1, and 
+                    the session process stays the same size however many 
+                    files are mapped. (optional)
         '''
             
         # RQ structure is a list of files and 
@@ -109,6 +186,48 @@ class FileInfo(object):
         # A set of all detector numbers in the data
         self._detnums = set()
         
+        # Interned file, tree and layout tables.  Files sharing a layout
+        # share one branch map, and the files of a branch/detnum are the 
+        # union of the file bitsets of the layouts it appears in
+        self._files = []
+        self._trees = []
+        self._treeIds = {}
+        self._layouts = []
+        self._layoutIds = {}
+        self._fileSets = {}
+        
+        # Per file maps for the session and any maps read from the cache
+        self._fileMaps = {}
+        self._mapCache = {}
+        self._cacheFile = cacheFile
+        self._unsaved = False
+        
+        # Number of processes used to map files
+        if not isinstance(nWorkers, int) or nWorkers < 1:
+            raise ValueError('ERROR in FileInfo:\n' +
+                             'nWorkers must be a positive integer!')
+        self._nWorkers = nWorkers
+        
+        # Number of files a mapping process scans before it is replaced
+        if filesPerWorker is not None and \
+           (not isinstance(filesPerWorker, int) or filesPerWorker < 1):
+            raise ValueError('ERROR in FileInfo:\n' +
+                             'filesPerWorker must be a positive integer!')
+        self._filesPerWorker = filesPerWorker
+        
+        # Branches to gather per file statistics of
+        if zoneMaps is True or not zoneMaps:
+            self._zoneMaps = zoneMaps or None
+        else:
+            self._zoneMaps = set(zoneMaps)
+        
+        # Functions to call when the file list of a branch changes
+        self._listeners = []
+        
+        # If cache file is given, load previous maps before mapping files
+        if cacheFile:
+            self.LoadCache(cacheFile)
+        
         # If datalist is given, map files and add into structures
         if dataList:
             self.AddDataFiles(dataList)
@@ -140,8 +259,8 @@ class FileInfo(object):
             setDetInfo = self._dataInfo[dataName]
 
         # Otherwise it should be a cut
-        elif dataName in self._cutList:
-            setDetInfo = self._cutList[dataName]
+        elif dataName in self._cutInfo:
+            setDetInfo = self._cutInfo[dataName]
         
         # This means its neither a cut or data
         else:
@@ -155,9 +274,19 @@ class FileInfo(object):
                              ' has no data for + ' + dataName + '!')
             return None
         else:
-            filePath = setDetInfo[detnum]['File']
-            dirName = setDetInfo[detnum]['Dir']
-            treeName = setDetInfo[detnum]['Tree']
+            treeId, layoutBits = setDetInfo[detnum]
+            
+            # Union of the files of every layout with this branch/detnum
+            fileBits = 0
+            layoutId = 0
+            while layoutBits:
+                if layoutBits & 1:
+                    fileBits |= self._layouts[layoutId]['Files']
+                layoutBits >>= 1
+                layoutId += 1
+            
+            filePath = self._GetFiles(fileBits)
+            dirName, treeName = self._trees[treeId]
             return (filePath, dirName, treeName)
 
     ######### 'Public' Methods ###########
@@ -181,6 +310,20 @@ class FileInfo(object):
 
         self._AddFiles(cutNames, 'Cut')
     
+    def GetFileStamps(self, files):
+        ''' Return the size and modification time of session files as mapped,
+            to key results evaluated on them like cached cut masks.
+        
+            Parameters:
+                files: (list) - Names of data or cut files.
+            
+            Returns: stamps
+                stamps: (list) - (fName, size, mtime) of each file.
+        '''
+        
+        return [(fName, self._fileMaps[fName]['Size'], 
+                 self._fileMaps[fName]['MTime']) for fName in files]
+    
     def GetDataNames(self):
         ''' Return list of data names in current session.'''
         return self._dataInfo.keys()
@@ -189,6 +332,77 @@ class FileInfo(object):
         ''' Return list of cut names in current session.'''
         return self._cutInfo.keys()
 
+    def IsData(self, name):
+        ''' Return true if name is a data branch in current session.'''
+        return name in self._dataInfo
+    
+    def IsCut(self, name):
+        ''' Return true if name is a cut branch in current session.'''
+        return name in self._cutInfo
+    
+    def GetDataFiles(self):
+        ''' Return list of data files in current session.'''
+        return list(self._dataList)
+    
+    def GetCutFiles(self):
+        ''' Return list of cut files in current session.'''
+        return list(self._cutList)
+    
+    def GetFileMap(self, fName):
+        ''' Return the map of a single file in the current session.
+        
+            Parameters:
+                fName: (str) - Name of data or cut file.
+            
+            Returns: fileMap
+                fileMap: (dict) - 'Type', 'Size' and 'MTime' of the file and
+                    'Map' as returned by _ScanFile.
+        '''
+        return self._fileMaps[fName]
+
+    def GetEntries(self, fName, dirName, treeName):
+        ''' Return the number of entries of a tree in a session file.
+        
+            Parameters:
+                fName: (str) - Name of data or cut file.
+                dirName: (str) - Directory of tree.
+                treeName: (str) - Name of tree.
+        '''
+        return self._fileMaps[fName]['Map']['Entries'][(dirName, treeName)]
+
+    def GetBranchDetnums(self, name):
+        ''' Return sorted list of detector numbers with data for a branch.
+        
+            Parameters:
+                name: (str) - Name of data or cut branch.
+        '''
+        
+        if name in self._dataInfo:
+            return sorted(self._dataInfo[name])
+        elif name in self._cutInfo:
+            return sorted(self._cutInfo[name])
+        else:
+            raise ValueError('ERROR in FileInfo:\n' +
+                             name + ' is not in data or cut files!')
+
+    def GetZone(self, fName, name, detnum):
+        ''' Return the statistics of a branch in one file, gathered if the 
+            branch was in zoneMaps.
+        
+            Parameters:
+                fName: (str) - Name of data or cut file.
+                name: (str) - Name of branch.
+                detnum: (int) - Detector number (1 = general).
+            
+            Returns: zone
+                zone: (tuple) - (entries, min, max, NaN count, -inf count, 
+                    +inf count), min and max are of the finite values in the
+                    branch's own type, NaN if there are none.  None if no 
+                    statistics were gathered.
+        '''
+        return self._fileMaps[fName]['Map'].get('Zones', {}).get((name, 
+                                                                  detnum))
+
     def IsGeneral(self, name):
         ''' Return true if it's a general value, otherwise false.
         
@@ -204,9 +418,9 @@ class FileInfo(object):
                             'Input branch name must be a string!')
         
         # Check its a valid name
-        if name in self.GetDataNames():  # Data Branch name
+        if name in self._dataInfo:  # Data Branch name
             tempDict = self._dataInfo[name]
-        elif name in self.GetCutNames():  # Cut Branch name
+        elif name in self._cutInfo:  # Cut Branch name
             tempDict = self._cutInfo[name]
         else:  # Not in any file
             print "WARNING in FileInfo.IsGeneral:"
@@ -224,13 +438,86 @@ class FileInfo(object):
         ''' Return list of detector numbers in current session files.'''
         return self._detnums
 
+    def AddListener(self, listener):
+        ''' Register a function called whenever files are added.
+        
+            Parameters:
+                listener: (callable) - Called with the set of branch names 
+                    whose file lists changed, ie. listener(names).
+        '''
+        
+        self._listeners.append(listener)
+
+    def LoadCache(self, cacheFile):
+        ''' Read the file maps stored by a previous session.
+        
+            Files are only taken from the cache when they are added to the 
+            session and their size and modification time haven't changed.
+            A missing, unreadable or out of date cache is ignored.
+        
+            Parameters:
+                cacheFile: (str) - Name of the cache file.
+        '''
+        
+        if not isfile(cacheFile):
+            return
+        
+        try:
+            with open(cacheFile, 'rb') as f:
+                cache = cPickle.load(f)
+        except Exception:
+            print "WARNING in FileInfo.LoadCache:"
+            print "Unable to read " + cacheFile + ", ignoring cache!"
+            return
+
+        if not isinstance(cache, dict) or \
+           cache.get('Version') != _CACHE_VERSION:
+            print "WARNING in FileInfo.LoadCache:"
+            print "Cache " + cacheFile + " is out of date, ignoring cache!"
+            return
+        
+        self._mapCache.update(cache['Files'])
+
+    def SaveCache(self, cacheFile=None):
+        ''' Write the file maps of the current session to disk.
+        
+            Maps read from an earlier cache but not used in this session are
+            kept, so sessions on different file lists can share one cache.
+        
+            Parameters:
+                cacheFile: (str) - Name of the cache file, defaults to the
+                    file given when constructed.
+
+            Raises:
+                ValueError: If no cache file is given or stored.
+        '''
+        
+        if cacheFile is None:
+            cacheFile = self._cacheFile
+        
+        if cacheFile is None:
+            raise ValueError('ERROR in FileInfo.SaveCache:\n' +
+                             'No cache file given!')
+        
+        files = dict(self._mapCache)
+        files.update(self._fileMaps)
+        
+        # Write to temporary file and rename so a crash never leaves
+        # a partially written cache
+        tmpFile = cacheFile + '.tmp' + str(os.getpid())
+        with open(tmpFile, 'wb') as f:
+            cPickle.dump({'Version': _CACHE_VERSION, 'Files': files}, f,
+                         cPickle.HIGHEST_PROTOCOL)
+        os.rename(tmpFile, cacheFile)
+        self._unsaved = False
+
     ######### 'Hidden' Methods ###########
     def _AddFiles(self, fNames, fType):
         ''' Add root files to the current session.
         
             Checks that every file is a valid root file, stores filename in the
-            appropriate file list, then passes the file name and file info dict
-            to _MapFile.
+            appropriate file list, then passes the new file names to 
+            _MapFiles.
         
             Called by both AddDataFiles and AddCutFiles with appropriate flag.
             
@@ -244,6 +531,8 @@ class FileInfo(object):
                 TypeError: If fNames is not a list or str.
                 ValueError: If fType is neither 'Data' nor 'Cut'.
                 IOError: If a file in fNames doesn't exist.
+                ValueError: If a file puts a branch in a different directory
+                    or tree than the session files, no file is added then.
         '''
 
         # if fNames is single name, put into into a list
@@ -267,115 +556,446 @@ class FileInfo(object):
                              "Should be 'cut' or 'data'!")
         
         # Loop through all files in input list
+        known = set(setList)
+        newFiles = []
         for fName in fNames:
             
             # Check if file exists in current list
-            if fName in self._dataList:
+            if fName in known:
                 continue
             
             # Check if file exists
-            if not isfile(fName):
+            if not exists(fName):
                 raise IOError('ERROR in FileInfo.Add' + fType + 'Files:\n' +
                               'File ' + fName + " doesn't exist!")
                 continue
             
-            # Add good file to list
-            setList.append(fName)
+            newFiles.append(fName)
+            known.add(fName)
+
+        # Map good files, nothing is added if any of them can't be merged
+        self._MapFiles(newFiles, fType)
 
-            # Map good file
-            self._MapFile(fName, fType)
+        # Add good files to list
+        setList.extend(newFiles)
 
-    def _MapFile(self, fName, fType):
+        # Tell listeners which branches have new files
+        changed = set()
+        for fName in newFiles:
+            changed.update(self._fileMaps[fName]['Map']['Branches'])
+        if changed:
+            for listener in self._listeners:
+                listener(changed)
+
+        # Store maps for next session, unless they all came from the cache
+        if self._cacheFile and self._unsaved:
+            self.SaveCache()
+
+    def _MapFiles(self, fNames, fType):
         ''' Get branch names for each file and store corresponding file, 
             directory, and tree names, as well as the appropriate detector 
             number(s).
         
+            The map is taken from the cache if the file size and modification
+            time match the cached values, otherwise the file is scanned.  With
+            more than one worker, or a limit of files per worker, the files 
+            are scanned in a process pool whose processes are replaced after
+            filesPerWorker files, releasing what ROOT held.  The maps are
+            always merged in the order of fNames, so the session map 
+            is the same for any number of workers.  A session profiler gets
+            the mapping time and the number of files scanned.
+        
             Parameters:
-                fName: (str) - Name of file to map.
+                fNames: (list) - Names of files to map.
+                fType: (str) - File type of fNames: 'Cut' or 'Data'
+
+            Raises:
+                ValueError: If a file puts a branch in a different directory
+                    or tree than earlier files, before any file is merged.
+        '''
+        
+        start = time.time()
+        
+        fileMaps = {}
+        stats = {}
+        scanFiles = []
+        for fName in fNames:
+            stat = os.stat(fName)
+            stats[fName] = stat
+        
+            # Use cached map if file is unchanged and has the zone maps
+            cached = self._mapCache.get(fName)
+            if cached and cached['Type'] == fType and \
+               cached['Size'] == stat.st_size and \
+               cached['MTime'] == stat.st_mtime and \
+               _HasZones(cached['Map'], self._zoneMaps):
+                fileMaps[fName] = cached['Map']
+            else:
+                scanFiles.append(fName)
+        
+        # Scan remaining files, in worker processes if requested
+        nWorkers = min(self._nWorkers, len(scanFiles))
+        with CAPy_globals.Foreground():
+            if nWorkers > 1 or (self._filesPerWorker and scanFiles):
+                pool = Pool(nWorkers, maxtasksperchild=self._filesPerWorker)
+                try:
+                    scanMaps = pool.map(_ScanFileArgs, 
+                                        [(fName, fType, self._zoneMaps) 
+                                         for fName in scanFiles],
+                                        chunksize=1)
+                finally:
+                    pool.terminate()
+                    pool.join()
+            else:
+                scanMaps = [_ScanFile(fName, fType, self._zoneMaps) 
+                            for fName in scanFiles]
+        
+        fileMaps.update(zip(scanFiles, scanMaps))
+        scanSeconds = time.time() - start
+        
+        # Check all files before the session map changes
+        self._CheckLayouts(fNames, fType, fileMaps)
+        
+        # Merge in input order
+        for fName in fNames:
+            self._fileMaps[fName] = {'Type': fType,
+                                     'Size': stats[fName].st_size,
+                                     'MTime': stats[fName].st_mtime,
+                                     'Map': fileMaps[fName]}
+        
+            self._MergeMap(fName, fType, fileMaps[fName])
+        
+        if scanFiles:
+            self._unsaved = True
+        
+        profiler = CAPy_globals._Profiler
+        if profiler is not None:
+            profiler.Record('Map ' + fType, None, 
+                            Seconds=time.time() - start,
+                            ReadSeconds=scanSeconds, 
+                            Files=len(scanFiles))
+
+    def _MergeMap(self, fName, fType, fileMap):
+        ''' Add the map of a single file into the data or cut info dict.
+        
+            The file gets the next file id and its bit is set in the bitset
+            of its layout.  The branch map of the file is replaced by the 
+            shared map of the layout.
+        
+            Parameters:
+                fName: (str) - Name of mapped file.
                 fType: (str) - File type of fName: 'Cut' or 'Data'
+                fileMap: (dict) - Map of file returned by _ScanFile.
+
+            Raises:
+                ValueError: If directory or tree name doesn't match the one
+                    from previous files.
         '''
         
-        # Temporary for debugging
-        # TODO: switch to a verbose flag
-        print fName
+        layoutId = self._InternLayout(fType, fileMap['Branches'])
+        layout = self._layouts[layoutId]
+        
+        fileMap['Branches'] = layout['Branches']
+        
+        # Add file to table and to layout
+        layout['Files'] |= 1 << len(self._files)
+        self._files.append(fName)
+        self._fileSets.clear()
+        
+        # Add detnums to list
+        self._detnums.update(fileMap['Detnums'])
+
+    def _CheckLayouts(self, fNames, fType, fileMaps):
+        ''' Check every branch of the maps of fNames is in the same directory
+            and tree as in the session and in the files before it.
+        
+            Parameters:
+                fNames: (list) - Names of files to be merged, in order.
+                fType: (str) - File type of fNames: 'Cut' or 'Data'
+                fileMaps: (dict) - Map of each file keyed by file name.
 
-        # List of directories in files that we don't use
+            Raises:
+                ValueError: If directory or tree name doesn't match the one
+                    from previous files.
+        '''
+        
         if fType == 'Data':
-            skipDirs = ['calibInfoDir', 'infoDir', 'detectorConfigDir' ]
             fileInfo = self._dataInfo
         elif fType == 'Cut':
-            skipDirs = ['cutInfoDir']
             fileInfo = self._cutInfo
-    
-        # Dict of branches copied between files and the directory to ignore
-        doubleBranches = {'SeriesNumber', 'EventNumber', 'DetType', 'Empty'}
-    
-        # Open root file
-        with rpi.root_open(fName, 'r') as rootFile:
-    
-            # Loop through Directories
-            for keyDir in rootFile.GetListOfKeys():
-                rootDir = keyDir.ReadObj()
-                dirName = rootDir.GetName()
         
-                # Ignore directory if it's not an RQ directory
-                if dirName in skipDirs:
-                    continue
+        # Expected tree of branch/detnums first seen in fNames
+        expected = {}
+        seen = set()
+        for fName in fNames:
+            branches = fileMaps[fName]['Branches']
+            
+            # Files sharing a layout only need one check
+            key = _LayoutKey(fType, branches)
+            if key in self._layoutIds or key in seen:
+                continue
+            seen.add(key)
+            
+            for branchName, detMap in branches.iteritems():
+                for detnum, tree in detMap.iteritems():
+                    
+                    expTree = expected.get((branchName, detnum))
+                    if expTree is None:
+                        entry = fileInfo.get(branchName, {}).get(detnum)
+                        if entry is None:
+                            expTree = tree
+                        else:
+                            expTree = self._trees[entry[0]]
+                        expected[(branchName, detnum)] = expTree
+                    
+                    _CheckTree(fName, tree, expTree)
+
+    def _InternLayout(self, fType, branches):
+        ''' Return the layout id of a branch map, adding new layouts to the
+            data or cut info dict.
         
-                # Loop through the trees in directory
-                for keyTree in rootDir.GetListOfKeys():
-                    tree = keyTree.ReadObj()
-                    treeName = tree.GetName()
+            Parameters:
+                fType: (str) - File type of the map: 'Cut' or 'Data'
+                branches: (dict) - 'Branches' of a map from _ScanFile.
+
+            Raises:
+                ValueError: If directory or tree name doesn't match the one
+                    from previous files.
+        '''
+        
+        key = _LayoutKey(fType, branches)
+        
+        if key in self._layoutIds:
+            return self._layoutIds[key]
+        
+        if fType == 'Data':
+            fileInfo = self._dataInfo
+        elif fType == 'Cut':
+            fileInfo = self._cutInfo
+        
+        # Check every branch before changing anything, so a bad layout 
+        # leaves no bits behind for the next layout id
+        for branchName, detMap in branches.iteritems():
+            for detnum, tree in detMap.iteritems():
+                entry = fileInfo.get(branchName, {}).get(detnum)
+                if entry is not None:
+                    _CheckTree(None, tree, self._trees[entry[0]])
+        
+        layoutId = len(self._layouts)
+        
+        for branchName, detMap in branches.iteritems():
             
-                    # Get detector number if it's a ziptree
-                    if 'zip' in treeName.lower():
-                        detnum = 1100 + int(treeName.split('zip')[1])
-                    # Otherwise it's a general quantity (detnum = 1)
-                    else:
-                        detnum = 1
-
-                    # Add detnum to list
-                    self._detnums.add(detnum)
-
-                    # Loop through branches on tree
-                    for branch in tree.GetListOfBranches():
+            # Check if branch is in dict, if not create empty dict
+            if branchName not in fileInfo:
+                fileInfo[branchName] = {}
+            
+            for detnum, tree in detMap.iteritems():
                 
-                        branchName = branch.GetName()
-                        branch.Clear()
+                if tree not in self._treeIds:
+                    self._treeIds[tree] = len(self._trees)
+                    self._trees.append(tree)
+                treeId = self._treeIds[tree]
                 
-                        # If branch is one of the ones in two different files,
-                        # choose data from calib file.
-                        if branchName in doubleBranches:
-                            if 'calib' not in treeName:
-                                continue
+                # Check if Detnum in dict, if not create entry
+                if detnum not in fileInfo[branchName]:
+                    fileInfo[branchName][detnum] = [treeId, 0]
                 
-                        # Check if branch is in dict, if not create empty dict
-                        if branchName not in fileInfo:
-                            fileInfo[branchName] = {}        
+                # Store layout for each combo
+                fileInfo[branchName][detnum][1] |= 1 << layoutId
+        
+        self._layouts.append({'Branches': branches, 'Files': 0})
+        self._layoutIds[key] = layoutId
+        
+        return layoutId
+
+    def _GetFiles(self, fileBits):
+        ''' Return list of file names, in session order, of a file bitset.'''
+        
+        if fileBits not in self._fileSets:
+            self._fileSets[fileBits] = [self._files[i] for i, bit 
+                                        in enumerate(reversed(bin(fileBits)))
+                                        if bit == '1']
+        
+        return list(self._fileSets[fileBits])
+
+
+def _LayoutKey(fType, branches):
+    ''' Return the hashable key of a file type and branch map.'''
     
-                        # Check if Detnum in dict, if not create empty lists
-                        if detnum not in fileInfo[branchName]:
-                            fileInfo[branchName][detnum] = {'File': [],
-                                                            'Dir': dirName,
-                                                            'Tree': treeName}
-                
-                        # Store Filename for each combo
-                        fileInfo[branchName][detnum]['File'].append(fName)
-                        
-                        # Check if treeName and dirName are the same
-                        if fileInfo[branchName][detnum]['Dir'] != dirName:
-                            raise ValueError('ERROR in _MapFile:\n' +
-                                             'Directory ' + dirName + ' does ' +
-                                             'not match the expected name: ' +
-                                             fileInfo[branchName][detnum]['Dir'])
-                        if fileInfo[branchName][detnum]['Tree'] != treeName:
-                            raise ValueError('ERROR in _MapFile:\n' +
-                                             'Directory ' + treeName + ' does ' +
-                                             'not match the expected name: ' +
-                                             fileInfo[branchName][detnum]['Tree'])
+    return (fType, tuple(sorted((branchName, tuple(sorted(detMap.items())))
+                                for branchName, detMap 
+                                in branches.iteritems())))
+
+
+def _CheckTree(fName, tree, expected):
+    ''' Check the (dirName, treeName) of a branch is the expected one.
+    
+        Raises:
+            ValueError: If directory or tree name doesn't match.
+    '''
+    
+    dirName, treeName = tree
+    expDir, expTree = expected
+    where = '' if fName is None else 'In ' + fName + ': '
+    if expDir != dirName:
+        raise ValueError('ERROR in _MapFile:\n' + where +
+                         'Directory ' + dirName + ' does ' +
+                         'not match the expected name: ' + expDir)
+    if expTree != treeName:
+        raise ValueError('ERROR in _MapFile:\n' + where +
+                         'Tree ' + treeName + ' does ' +
+                         'not match the expected name: ' + expTree)
+
+
+def _HasZones(fileMap, zoneMaps):
+    ''' Return true if a file map has statistics for all zoneMaps branches.'''
+    
+    if zoneMaps is None:
+        return True
+    
+    zoneNames = fileMap.get('ZoneNames')
+    if zoneNames is True:
+        return True
+    if zoneNames is None or zoneMaps is True:
+        return False
+    
+    return zoneMaps.issubset(zoneNames)
+
+
+def _ScanFileArgs(args):
+    ''' Calls _ScanFile with an argument tuple, used by Pool.map. '''
+    return _ScanFile(*args)
+
+
+def _ScanFile(fName, fType, zoneMaps=None):
+    ''' List the trees of a file through its reader backend and get the 
+        directory and tree name of each branch.
+    
+        Parameters:
+            fName: (str) - Name of file to map.
+            fType: (str) - File type of fName: 'Cut' or 'Data'
+            zoneMaps: (bool or set) - Branches to gather statistics of, True 
+                for all. (optional)
+        
+        Returns: fileMap
+            fileMap: (dict) - 'Detnums' is the list of detector numbers in 
+                the file, 'Branches' is a dict keyed by branch name, then by 
+                detector number, of (dirName, treeName) tuples, 'Entries' is
+                the number of entries of each (dirName, treeName).  With 
+                zoneMaps, 'Zones' holds (entries, min, max, NaN count, -inf 
+                count, +inf count) keyed by (branchName, detnum) and 
+                'ZoneNames' the zoneMaps used.
+    '''
+        
+    # Temporary for debugging
+    # TODO: switch to a verbose flag
+    print fName
+
+    # List of directories in files that we don't use
+    if fType == 'Data':
+        skipDirs = ['calibInfoDir', 'infoDir', 'detectorConfigDir' ]
+    elif fType == 'Cut':
+        skipDirs = ['cutInfoDir']
+    
+    # Dict of branches copied between files and the directory to ignore
+    doubleBranches = {'SeriesNumber', 'EventNumber', 'DetType', 'Empty'}
+    
+    detnums = set()
+    branches = {}
+    entries = {}
+    zones = {}
+    
+    # Loop through the trees of the file, listed by its reader backend
+    for dirName, treeName, nEntries, treeBranches in Scan(fName, skipDirs):
+        
+        dirName = intern(dirName)
+        treeName = intern(treeName)
+    
+        # Get detector number if it's a ziptree
+        if 'zip' in treeName.lower():
+            detnum = 1100 + int(treeName.split('zip')[1])
+        # Otherwise it's a general quantity (detnum = 1)
+        else:
+            detnum = 1
+
+        # Add detnum to list
+        detnums.add(detnum)
+        
+        # Store number of entries for splitting cuts between files
+        entries[(dirName, treeName)] = nEntries
+
+        # Loop through branches on tree
+        zoneBranches = []
+        for branchName in treeBranches:
+        
+            branchName = intern(branchName)
+        
+            # If branch is one of the ones in two different files,
+            # choose data from calib file.
+            if branchName in doubleBranches:
+                if 'calib' not in treeName:
+                    continue
+        
+            # Check if branch is in dict, if not create empty dict
+            if branchName not in branches:
+                branches[branchName] = {}
+            
+            # Check branch isn't in a second tree for same detnum
+            if detnum in branches[branchName] and \
+               branches[branchName][detnum] != (dirName, treeName):
+                raise ValueError('ERROR in _MapFile:\n' +
+                                 'Directory ' + dirName + '/' + 
+                                 treeName + ' does not match the ' + 
+                                 'expected name: ' + 
+                                 '/'.join(branches[branchName][detnum]))
             
-                    # Clear Tree #FIXME - still have memory leak
-                    tree.Delete()
+            branches[branchName][detnum] = (dirName, treeName)
             
-                # Clear Directory #FIXME - still have memory leak
-                rootDir.Delete()
+            if zoneMaps is True or \
+               (zoneMaps and branchName in zoneMaps):
+                zoneBranches.append(branchName)
+        
+        # Gather statistics of the requested branches
+        if zoneBranches:
+            m = Read(fName, dirName + '/' + treeName, zoneBranches)
+            for branchName in zoneBranches:
+                zone = _Zone(m[branchName])
+                if zone is not None:
+                    zones[(branchName, detnum)] = zone
+            del m
+
+    fileMap = {'Detnums': sorted(detnums), 'Branches': branches,
+               'Entries': entries}
+    
+    if zoneMaps:
+        fileMap['Zones'] = zones
+        fileMap['ZoneNames'] = zoneMaps
+    
+    return fileMap
+
+
+def _Zone(column):
+    ''' Return (entries, min, max, NaN count, -inf count, +inf count) of a 
+        column, None for variable length branches.  min and max are of the 
+        finite values, kept as Python numbers of the column's type so large 
+        integers stay exact.
+    '''
+    
+    if column.dtype.hasobject:
+        return None
+    
+    if column.dtype.kind == 'f':
+        nNaN = int(np.isnan(column).sum())
+        nNegInf = int((column == -np.inf).sum())
+        nPosInf = int((column == np.inf).sum())
+        finite = column[np.isfinite(column)]
+    else:
+        nNaN = nNegInf = nPosInf = 0
+        finite = column
+    
+    if len(finite) == 0:
+        return (len(column), float('nan'), float('nan'), nNaN, nNegInf, 
+                nPosInf)
+    
+    return (len(column), finite.min().item(), finite.max().item(), nNaN, 
+            nNegInf, nPosInf)
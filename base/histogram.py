@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+"""
+histogram.py
+
+CAPy module for streaming histograms of data branches.
+
+Most loaded RQs are only histogrammed, yet the full array has to be loaded 
+first.  Hist and Hist2D fill the histogram chunk by chunk instead, with every
+file filled by a worker process and the partial histograms summed, so full 
+exposure spectra never need more memory than a chunk per worker.
+
+    >>> counts, edges = Hist(PRecoilT, 1104, cut, 200, (0, 200))
+    >>> counts, xedges, yedges = Hist2D(PRecoilT, PTNFchisq, 1104, cut, 
+    ...                                 (100, 100), [(0, 200), (0, 5)])
+
+Data functions and lazy expressions can both be histogrammed.
+
+Functions:
+    Hist - Histogram one data function or expression.
+    Hist2D - Histogram two data functions or expressions against each other.
+
+Created on Sat Oct 17 16:04:13 2026
+
+@author: tdoughty1
+"""
+
+# Import Standard libraries
+import time
+import cPickle
+
+# Import Numerical libraries
+import numpy as np
+
+# Import CAPy modules
+import CAPy_globals
+from datatypes import Data_Function, _IterEntries, _GroupEntries, \
+    _IterGroups, _AddCounts
+from expression import Expr
+
+def Hist(data, detnum=None, cut=None, bins=100, range=None, chunkSize=100000,
+         nWorkers=None):
+    ''' Histogram a data function or expression without loading it.
+    
+        Parameters:
+            data: (Data_Function or Expr) - Values to histogram.
+            detnum: (int) - Detector number for a data function, defaults to
+                last detnum. (optional)
+            cut: (Cut) - Selection of events. (optional)
+            bins: (int or np.ndarray) - Number of bins or bin edges.
+                (optional)
+            range: (tuple) - (min, max) for a number of bins, found with an 
+                extra pass over the data if not given. (optional)
+            chunkSize: (int) - Largest number of events read at once.
+                (optional)
+            nWorkers: (int) - Files are filled by the session read workers 
+                if more than 1, 1 fills them in the session process. 
+                Defaults to the session read workers. (optional)
+        
+        Returns: (counts, edges)
+            counts: (np.ndarray) - Number of events in each bin.
+            edges: (np.ndarray) - Bin edges, as np.histogram.
+    '''
+    
+    expr = _ToExpr(data, detnum)
+    edges = _Edges(expr, bins, range, cut, chunkSize)
+    
+    counts = _Fill([expr], [edges], cut, chunkSize, nWorkers)
+    
+    return (counts, edges)
+
+
+def Hist2D(dataX, dataY, detnum=None, cut=None, bins=100, range=None,
+           chunkSize=100000, nWorkers=None):
+    ''' Histogram two data functions or expressions against each other 
+        without loading them.
+    
+        Parameters:
+            dataX: (Data_Function or Expr) - Values along the first axis.
+            dataY: (Data_Function or Expr) - Values along the second axis.
+            detnum: (int) - Detector number for data functions, defaults to
+                last detnum. (optional)
+            cut: (Cut) - Selection of events. (optional)
+            bins: (int, np.ndarray or pair) - Bins of both axes or (binsX, 
+                binsY). (optional)
+            range: (pair) - ((minX, maxX), (minY, maxY)), found with an extra
+                pass over the data if not given. (optional)
+            chunkSize: (int) - Largest number of events read at once.
+                (optional)
+            nWorkers: (int) - Files are filled by the session read workers 
+                if more than 1, 1 fills them in the session process. 
+                Defaults to the session read workers. (optional)
+        
+        Returns: (counts, xedges, yedges)
+            counts: (np.ndarray) - 2D number of events in each bin.
+            xedges: (np.ndarray) - Bin edges of first axis.
+            yedges: (np.ndarray) - Bin edges of second axis.
+    '''
+    
+    exprX = _ToExpr(dataX, detnum)
+    exprY = _ToExpr(dataY, detnum)
+    
+    if isinstance(bins, (int, np.ndarray)):
+        bins = (bins, bins)
+    if range is None:
+        range = (None, None)
+    
+    xedges = _Edges(exprX, bins[0], range[0], cut, chunkSize)
+    yedges = _Edges(exprY, bins[1], range[1], cut, chunkSize)
+    
+    counts = _Fill([exprX, exprY], [xedges, yedges], cut, chunkSize, nWorkers)
+    
+    return (counts, xedges, yedges)
+
+
+def _ToExpr(data, detnum):
+    ''' Return lazy expression of a data function or expression.'''
+    
+    if isinstance(data, Data_Function):
+        return data.Lazy(detnum)
+    
+    if not isinstance(data, Expr) or data.IsBool():
+        raise TypeError('ERROR in Hist:\n' +
+                        'Data must be a data function or a numeric ' +
+                        'expression!')
+    return data
+
+
+def _Edges(expr, bins, range, cut, chunkSize):
+    ''' Return bin edges, finding the range in a pass over the data if
+        needed.
+    '''
+    
+    if not np.isscalar(bins):
+        return np.asarray(bins, dtype=np.float64)
+    
+    if range is None:
+        low = np.inf
+        high = -np.inf
+        for chunk in _IterEntries(expr.GetBranches(), cut, chunkSize):
+            values = np.asarray(expr._Eval(chunk), dtype=np.float64)
+            values = values[np.isfinite(values)]
+            if len(values):
+                low = min(low, values.min())
+                high = max(high, values.max())
+        if low > high:
+            low, high = (0., 1.)
+        range = (low, high)
+    
+    # Same edges as np.histogram for an empty or single valued range
+    return np.histogram([], bins, range)[1]
+
+
+def _Fill(exprs, edges, cut, chunkSize, nWorkers):
+    ''' Fill a 1D or 2D histogram file by file, by the session read workers 
+        if more than one, and sum the partial histograms.  Each file is sent
+        to the workers as a job holding the expressions and the trees to 
+        read, expressions of Python functions that can't be sent are filled
+        in the session process.  A session profiler gets the reads of each
+        branch, counted by the workers, and the fill itself.
+    '''
+    
+    profiler = CAPy_globals._Profiler
+    counters = {}
+    if profiler is not None:
+        start = time.time()
+    
+    entries = []
+    for expr in exprs:
+        for entry in expr.GetBranches():
+            if entry not in entries:
+                entries.append(entry)
+    
+    # Trees are found once here, workers may hold an older session
+    files, groups = _GroupEntries(entries, 
+                                  counters if profiler is not None else None)
+    
+    # Split cut between files
+    fileInfo = CAPy_globals._FileInfo
+    dirName, treeName = groups.keys()[0]
+    fileCuts = [None] * len(files)
+    if cut is not None:
+        counts = [fileInfo.GetEntries(fName, dirName, treeName) 
+                  for fName in files]
+        if sum(counts) != len(cut):
+            raise ValueError('ERROR in Hist:\n' +
+                             'Cut has ' + str(len(cut)) + ' events, data ' +
+                             'has ' + str(sum(counts)) + '!')
+        offsets = np.r_[0, np.cumsum(counts)]
+        fileCuts = [cut.Slice(offsets[i], offsets[i + 1]) 
+                    for i in xrange(len(files))]
+    
+    if nWorkers is None:
+        nWorkers = CAPy_globals.GetReadWorkers()
+    nWorkers = min(nWorkers, len(files))
+    
+    jobs = [(exprs, edges, groups, fName, fileCut, CAPy_globals._ColumnStore,
+             chunkSize, profiler is not None) 
+            for fName, fileCut in zip(files, fileCuts)]
+    
+    if nWorkers > 1 and _CanSend(exprs):
+        with CAPy_globals.Foreground():
+            partials = CAPy_globals.GetReadPool().map(_FillFile, jobs, 
+                                                      chunksize=1)
+    else:
+        partials = [_FillFile(job) for job in jobs]
+    
+    shape = tuple(len(edge) - 1 for edge in edges)
+    total = np.zeros(shape, dtype=np.int64)
+    for partial, fileCounters in partials:
+        total += partial
+        if fileCounters is not None:
+            for entry, entryCounters in fileCounters.iteritems():
+                _AddCounts(counters, entry, **entryCounters)
+    
+    if profiler is not None:
+        for (name, detnum), entryCounters in counters.iteritems():
+            entryCounters['Seconds'] = sum(
+                entryCounters.get(counter, 0) 
+                for counter in ['LookupSeconds', 'ReadSeconds', 
+                                'CutSeconds'])
+            profiler.Record(name, detnum, **entryCounters)
+        
+        profiler.Record('Fill ' + ('Hist' if len(exprs) == 1 else 'Hist2D'),
+                        None, Seconds=time.time() - start, 
+                        Entries=int(total.sum()), Files=len(files))
+    
+    return total
+
+
+def _CanSend(exprs):
+    ''' Return true if the expressions can be sent to worker processes.'''
+    
+    try:
+        cPickle.dumps(exprs, cPickle.HIGHEST_PROTOCOL)
+    except (cPickle.PicklingError, TypeError, AttributeError):
+        return False
+    return True
+
+
+def _FillFile(job):
+    ''' Fill the histogram of one file chunk by chunk, run by workers.
+        Returns the counts and the profiler counters of the reads, None if
+        not profiling.
+    '''
+    
+    exprs, edges, groups, fName, fileCut, store, chunkSize, profile = job
+    
+    shape = tuple(len(edge) - 1 for edge in edges)
+    counts = np.zeros(shape, dtype=np.int64)
+    
+    # Counted here and recorded by the session process
+    counters = None
+    if profile:
+        counters = {}
+    
+    for chunk in _IterGroups([fName], groups, store, fileCut, chunkSize, 
+                             counters):
+        values = [expr._Eval(chunk) for expr in exprs]
+        if len(exprs) == 1:
+            counts += np.histogram(values[0], edges[0])[0].astype(np.int64)
+        else:
+            counts += np.histogram2d(values[0], values[1], 
+                                     edges)[0].astype(np.int64)
+    
+    return (counts, counters)
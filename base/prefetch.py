@@ -0,0 +1,331 @@
+# -*- coding: utf-8 -*-
+"""
+prefetch.py
+
+CAPy module for the Prefetcher class.
+
+Interactive sessions follow predictable patterns: the same branch for the
+next detector, or other branches of the same zip tree after one of them was
+loaded.  The Prefetcher keeps the recent data function calls and, between
+calls, reads the likely next arrays on a background thread into the session
+array cache.  Reads stop whenever the session itself reads files or starts
+worker processes, and prefetched arrays not yet used may only take a share of
+the cache budget.
+
+Classes:
+    Prefetcher - Background reader of likely next arrays.
+
+Created on Sat Oct 17 16:41:52 2026
+
+@author: tdoughty1
+"""
+
+# Import Standard libraries
+import os
+import threading
+from contextlib import contextmanager
+from collections import OrderedDict
+from warnings import warn
+
+# Import Numerical libraries
+import numpy as np
+
+# Import file readers, ROOT is loaded on first read
+from rootio import Read
+
+# Number of recent branch names used to guess sibling branches
+_HISTORY = 8
+
+# Largest number of arrays queued after one call
+_MAX_PENDING = 8
+
+class Prefetcher(object):
+    ''' Background reader of the arrays likely loaded next.
+
+        After each data function call the prefetcher queues the same branch
+        for the next detector number, and the recently used branches of the
+        same tree for the current and next detector number.  Queued arrays are
+        read file by file on a daemon thread and put in the array cache.
+
+        Constructed:
+            Prefetcher(fileInfo, cache, store=None, maxShare=0.25)
+
+            Parameters:
+                fileInfo: (FileInfo) - Session file information.
+                cache: (ArrayCache) - Session array cache to fill.
+                store: (ColumnStore) - Session column store, stored arrays
+                    are not prefetched. (optional)
+                maxShare: (float) - Share of the cache budget prefetched
+                    arrays not yet used may take. (optional)
+
+        Methods:
+            Pause: Stop background reads before the session reads.
+            Resume: End a pause, recording a call and queuing its likely 
+                successors.
+            Paused: Context manager pausing background reads.
+            Cancel: Drop queued reads and stop the current one.
+            Stop: Cancel and end the background thread.
+            SetStore: Change the column store.
+
+        Hidden Methods:
+            _Predict: Return the keys likely loaded after a call.
+            _Run: Background thread loop.
+            _Read: Read one queued array, None if cancelled.
+
+        Attributes:
+            _fileInfo: (FileInfo) - Session file information.
+            _cache: (ArrayCache) - Session array cache.
+            _store: (ColumnStore) - Session column store or None.
+            _maxShare: (float) - Share of the cache budget for prefetching.
+            _history: (OrderedDict) - Recently called branch names, most
+                recent last.
+            _pending: (list) - Queued (key, dirName, treeName) reads.
+            _current: (tuple) - Key of the array being read, or None.
+            _pauses: (int) - Number of pauses not yet resumed, reads only
+                run at 0.
+            _cancel: (bool) - True if the current read should stop.
+            _stopped: (bool) - True once the thread should end.
+            _cond: (Condition) - Guards the state above.
+            _thread: (Thread) - Background reader, started on first Resume.
+            _pid: (int) - Process of the thread, pauses in forked worker 
+                processes are ignored.
+    '''
+
+    def __init__(self, fileInfo, cache, store=None, maxShare=0.25):
+        ''' Constructs an idle prefetcher.
+
+            Parameters:
+                fileInfo: (FileInfo) - Session file information.
+                cache: (ArrayCache) - Session array cache to fill.
+                store: (ColumnStore) - Session column store. (optional)
+                maxShare: (float) - Share of the cache budget prefetched
+                    arrays not yet used may take. (optional)
+
+            Raises:
+                ValueError: If maxShare is not between 0 and 1.
+        '''
+
+        if not 0 < maxShare <= 1:
+            raise ValueError('ERROR in Prefetcher:\n' +
+                             'maxShare must be in (0, 1]!')
+
+        self._fileInfo = fileInfo
+        self._cache = cache
+        self._store = store
+        self._maxShare = maxShare
+
+        self._history = OrderedDict()
+        self._pending = []
+        self._current = None
+        self._pauses = 0
+        self._cancel = False
+        self._stopped = False
+        self._cond = threading.Condition()
+        self._thread = None
+        self._pid = os.getpid()
+
+    def Pause(self, key=None):
+        ''' Stop background reads until Resume, so the session has the files
+            to itself and never forks while the thread reads.
+
+            A read of key itself is allowed to finish, any other read is
+            cancelled between files.  Pauses nest, reads start again once 
+            every pause is resumed.
+
+            Parameters:
+                key: (tuple) - (name, detnum, files) the session is about to
+                    load. (optional)
+        '''
+
+        if os.getpid() != self._pid:
+            return
+
+        with self._cond:
+            self._pauses += 1
+            if self._current is not None and self._current != key:
+                self._cancel = True
+            while self._current is not None:
+                self._cond.wait()
+
+    def Resume(self, name=None, detnum=None):
+        ''' End a pause.  After a data function call, record it and queue the
+            arrays likely loaded next, replacing the previous queue.
+
+            Parameters:
+                name: (str) - Name of branch just loaded. (optional)
+                detnum: (int) - Detector number just loaded. (optional)
+        '''
+
+        if os.getpid() != self._pid:
+            return
+
+        pending = None
+        if name is not None:
+            self._history.pop(name, None)
+            self._history[name] = None
+            while len(self._history) > _HISTORY:
+                self._history.popitem(last=False)
+
+            pending = self._Predict(name, detnum)
+
+        with self._cond:
+            self._pauses = max(self._pauses - 1, 0)
+            if self._stopped:
+                return
+
+            if pending is not None:
+                self._pending = pending
+            if self._pauses or not self._pending:
+                return
+
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._Run,
+                                                name='CAPyPrefetch')
+                self._thread.daemon = True
+                self._thread.start()
+
+            self._cond.notify_all()
+
+    @contextmanager
+    def Paused(self, key=None):
+        ''' Context manager pausing background reads, see Pause.
+
+            Parameters:
+                key: (tuple) - (name, detnum, files) the session is about to
+                    load. (optional)
+        '''
+
+        self.Pause(key)
+        try:
+            yield
+        finally:
+            self.Resume()
+
+    def Cancel(self):
+        ''' Drop queued reads and stop the current one between files. '''
+
+        with self._cond:
+            self._pending = []
+            if self._current is not None:
+                self._cancel = True
+
+    def Stop(self):
+        ''' Cancel all reads and end the background thread. '''
+
+        with self._cond:
+            self._stopped = True
+            self._pending = []
+            self._cancel = True
+            self._cond.notify_all()
+
+        if self._thread is not None:
+            self._thread.join()
+
+    def SetStore(self, store):
+        ''' Change the column store, stored arrays are not prefetched.
+
+            Parameters:
+                store: (ColumnStore) - Session column store or None.
+        '''
+        self._store = store
+
+    def _Predict(self, name, detnum):
+        ''' Return queued reads for the arrays likely loaded after name/detnum.
+
+            Candidates are name for the next detector number, then recently
+            used names in the same tree for this and the next detector number.
+            Arrays already cached or stored are left out.
+        '''
+
+        fileInfo = self._fileInfo
+
+        detnums = [detnum]
+        branchDetnums = fileInfo.GetBranchDetnums(name)
+        later = [d for d in branchDetnums if d > detnum]
+        if later:
+            detnums.append(later[0])
+
+        recent = [other for other in reversed(self._history)
+                  if other != name]
+
+        pending = []
+        for d in detnums:
+            files, dirName, treeName = fileInfo(name, d)
+
+            for other in [name] + recent:
+                if d not in fileInfo.GetBranchDetnums(other):
+                    continue
+
+                # Siblings must come from the same tree and files
+                location = fileInfo(other, d)
+                if location != (files, dirName, treeName):
+                    continue
+
+                key = (other, d, tuple(files))
+                if (other, d) == (name, detnum) or key in self._cache:
+                    continue
+                if self._store is not None and \
+                   self._store.Has(other, d, files):
+                    continue
+
+                pending.append((key, dirName, treeName))
+                if len(pending) == _MAX_PENDING:
+                    return pending
+
+        return pending
+
+    def _Run(self):
+        ''' Read queued arrays into the cache until stopped. '''
+
+        while True:
+
+            with self._cond:
+                while not self._stopped and \
+                      (self._pauses or not self._pending):
+                    self._cond.wait()
+
+                if self._stopped:
+                    return
+
+                # Unused prefetched arrays already take their share
+                budget = self._maxShare * self._cache.GetMaxBytes()
+                if self._cache.GetPrefetchedBytes() >= budget:
+                    self._pending = []
+                    continue
+
+                key, dirName, treeName = self._pending.pop(0)
+                self._current = key
+                self._cancel = False
+
+            try:
+                m = self._Read(key, dirName, treeName)
+            except Exception as e:
+                warn('WARNING in Prefetcher:\n\tCould not read ' + key[0] +
+                     '(' + str(key[1]) + '): ' + str(e))
+                m = None
+
+            with self._cond:
+                if m is not None and not self._cancel and \
+                   self._cache.GetPrefetchedBytes() + m.nbytes <= budget:
+                    self._cache.Put(key, m, prefetched=True)
+
+                self._current = None
+                self._cancel = False
+                self._cond.notify_all()
+
+    def _Read(self, key, dirName, treeName):
+        ''' Read one array file by file, None if cancelled in between. '''
+
+        name, detnum, files = key
+        treePath = dirName + '/' + treeName
+
+        parts = []
+        for fName in files:
+            if self._cancel:
+                return None
+            parts.append(Read(fName, treePath, [name]))
+
+        if self._cancel or not parts:
+            return None
+
+        return np.concatenate(parts)
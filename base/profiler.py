@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+profiler.py
+
+CAPy module for the Profiler class.
+
+When a data function call is slow it's not clear if the time goes to the
+FileInfo lookup, reading the files or applying the cut.  With a session
+profiler the mapping, read, iteration, histogram and lazy expression paths 
+record, for every call, the wall time of each step, bytes and entries read, 
+files touched and where the array came from (cache, store, shared memory, 
+the cut cache or the files).  Records are summed per branch and detector 
+number for a report, and passed to hooks for forwarding to other monitoring.
+
+Classes:
+    Profiler - Per branch counters of mapping and reads.
+
+Created on Sat Oct 17 22:14:26 2026
+
+@author: tdoughty1
+"""
+
+# Import Standard libraries
+import json
+import time
+
+# Counters summed over the calls of a branch, in report order
+_COUNTERS = ['Seconds', 'LookupSeconds', 'ReadSeconds', 'CutSeconds',
+             'Bytes', 'Entries', 'Files']
+
+# Sources of arrays that didn't read any file
+_HIT_SOURCES = ['Cache', 'Store', 'Shared', 'CutCache']
+
+class Profiler(object):
+    ''' Per branch and detector number counters of mapping and reads.
+
+        Constructed:
+            Profiler()
+
+        Methods:
+            Record: Add the counters of one call.
+            AddHook: Register a function called with every record.
+            RemoveHook: Unregister a hook.
+            GetStats: Return the summed counters of every branch.
+            Report: Return a text report of the top branches.
+            Export: Write the summed counters as JSON.
+            Reset: Drop all counters.
+
+        Attributes:
+            _stats: (dict) - Summed counters keyed by (name, detnum).
+            _hooks: (list) - Functions called with every record.
+            _start: (float) - Time counting started.
+    '''
+
+    def __init__(self):
+        ''' Constructs a profiler with no counts.'''
+
+        self._hooks = []
+        self.Reset()
+
+    def Record(self, name, detnum, **counters):
+        ''' Add the counters of one call.
+
+            Parameters:
+                name: (str) - Branch name, or the step for mapping.
+                detnum: (int) - Detector number, None for mapping.
+                counters: (number) - Any of Seconds, LookupSeconds,
+                    ReadSeconds, CutSeconds, Bytes, Entries and Files, plus
+                    Source (str), where the array came from.
+        '''
+
+        stat = self._stats.get((name, detnum))
+        if stat is None:
+            stat = dict((counter, 0) for counter in _COUNTERS)
+            stat['Calls'] = 0
+            stat['Sources'] = {}
+            self._stats[(name, detnum)] = stat
+
+        stat['Calls'] += 1
+        for counter, value in counters.iteritems():
+            if counter == 'Source':
+                stat['Sources'][value] = stat['Sources'].get(value, 0) + 1
+            else:
+                stat[counter] = stat.get(counter, 0) + value
+
+        if self._hooks:
+            record = dict(counters)
+            record['Name'] = name
+            record['Detnum'] = detnum
+            record['Time'] = time.time()
+            for hook in self._hooks:
+                hook(record)
+
+    def AddHook(self, hook):
+        ''' Register a function called with the dict of every record.
+
+            Parameters:
+                hook: (callable) - Called with Name, Detnum, Time and the
+                    counters of each call.
+        '''
+        self._hooks.append(hook)
+
+    def RemoveHook(self, hook):
+        ''' Unregister a hook added with AddHook.'''
+        self._hooks.remove(hook)
+
+    def GetStats(self):
+        ''' Return list of summed counters of every branch and detector
+            number, each a dict with Name, Detnum, Calls, Hits, Sources and
+            the counters.
+        '''
+
+        stats = []
+        for (name, detnum), stat in self._stats.iteritems():
+            stat = dict(stat)
+            stat['Sources'] = dict(stat['Sources'])
+            stat['Name'] = name
+            stat['Detnum'] = detnum
+            stat['Hits'] = sum(stat['Sources'].get(source, 0)
+                               for source in _HIT_SOURCES)
+            stats.append(stat)
+
+        return stats
+
+    def Report(self, top=10):
+        ''' Return a text report of the totals and of the top branches by
+            time and by bytes read.
+
+            Parameters:
+                top: (int) - Number of branches in each table. (optional)
+        '''
+
+        stats = self.GetStats()
+
+        lines = ['CAPy profile over %.1f s, %d calls, %.3f s, %.1f MB read' %
+                 (time.time() - self._start,
+                  sum(stat['Calls'] for stat in stats),
+                  sum(stat['Seconds'] for stat in stats),
+                  sum(stat['Bytes'] for stat in stats) / 1e6)]
+
+        header = '%-24s %7s %6s %9s %8s %8s %8s %9s %10s %5s' % \
+                 ('Branch', 'Detnum', 'Calls', 'Seconds', 'Lookup', 'Read',
+                  'Cut', 'MB', 'Entries', 'Hits')
+
+        for title, counter in [('Top by time', 'Seconds'),
+                               ('Top by bytes', 'Bytes')]:
+            lines += ['', title, header]
+            for stat in sorted(stats, key=lambda stat: -stat[counter])[:top]:
+                lines.append('%-24s %7s %6d %9.4f %8.4f %8.4f %8.4f %9.2f '
+                             '%10d %5d' %
+                             (stat['Name'][:24], stat['Detnum'],
+                              stat['Calls'], stat['Seconds'],
+                              stat['LookupSeconds'], stat['ReadSeconds'],
+                              stat['CutSeconds'], stat['Bytes'] / 1e6,
+                              stat['Entries'], stat['Hits']))
+
+        return '\n'.join(lines)
+
+    def Export(self, fName):
+        ''' Write the summed counters of every branch to a JSON file.
+
+            Parameters:
+                fName: (str) - Name of output file.
+        '''
+
+        with open(fName, 'w') as f:
+            json.dump({'Start': self._start,
+                       'End': time.time(),
+                       'Stats': self.GetStats()}, f, indent=1, sort_keys=True)
+
+    def Reset(self):
+        ''' Drop all counters, hooks are kept.'''
+
+        self._stats = {}
+        self._start = time.time()
@@ -0,0 +1,576 @@
+# -*- coding: utf-8 -*-
+"""
+rootio.py
+
+CAPy module for the file reader backends.
+
+FileInfo and the data functions never open files themselves, they list the
+trees of a file and read columns through a reader backend.  Each file is
+handled by the first registered reader accepting it:
+
+    RootReader - ROOT files through root_numpy and rootpy.  Importing them
+        loads the whole ROOT stack, so the imports are deferred until a file
+        is actually mapped or read.
+    NumpyReader - NumPy files, a directory holding dirName/treeName/branch.npy
+        for the same directories and zip trees as the ROOT files.  Columns are
+        memory mapped, so the whole pipeline runs, and can be profiled,
+        without ROOT.
+
+Other readers subclass Reader and are added with RegisterReader.
+
+Classes:
+    Reader - Interface of reader backends.
+    RootReader - Reader of ROOT files.
+    NumpyReader - Reader of NumPy files.
+
+Functions:
+    RegisterReader - Add a reader backend, tried before the others.
+    GetReader - Return the reader backend of a file.
+    Scan - List the trees of a file with their entries and branches.
+    Read - Read branches of a tree from one or more files.
+    ReadEntries - Read chosen entries of a tree from one file.
+    ReadChunks - Read a tree of one file a range of entries at a time.
+    ClusterEntries - Return the number of entries a file reads together.
+    ReadTrees - Read a branch from several trees of one file.
+    WriteNumpyFile - Write a NumPy file from arrays.
+    ConvertFile - Write a NumPy file with the contents of any readable file.
+
+Created on Sat Oct 17 15:31:40 2026
+
+@author: tdoughty1
+"""
+
+# Import Standard libraries
+import os
+import mmap
+
+# Import Numerical libraries
+import numpy as np
+
+# Share of a file's clusters above which reading the chosen entries range by
+# range costs more than reading the whole tree once: every touched cluster is
+# read and decompressed in full either way, and each range adds a call
+_FULL_READ_COVERAGE = 0.5
+
+class Reader(object):
+    ''' Interface of reader backends.
+
+        Methods:
+            Accepts: Return true if the reader handles a file.
+            Scan: List the trees of a file with their entries and branches.
+            Read: Read branches of a tree in one file, optionally a range of
+                entries.
+            ReadFiles: Read branches of a tree from several files.
+            ReadTrees: Read a branch from several trees of one file.
+            ReadEntries: Read chosen entries of a tree in one file.
+            ReadChunks: Read branches of a tree in one file a range of 
+                entries at a time.
+            ClusterEntries: Return the number of entries read together.
+    '''
+
+    def Accepts(self, fName):
+        ''' Return true if the reader handles fName.'''
+        raise NotImplementedError
+
+    def Scan(self, fName, skipDirs=()):
+        ''' List the trees of a file, reading only names and entry counts,
+            never column data.
+
+            Parameters:
+                fName: (str) - Name of file.
+                skipDirs: (iterable) - Directories not to list. (optional)
+
+            Returns: trees
+                trees: (list) - (dirName, treeName, nEntries, branchNames) of
+                    every tree, in file order.
+        '''
+        raise NotImplementedError
+
+    def Read(self, fName, treePath, branches, start=None, stop=None):
+        ''' Read branches of a tree in one file.
+
+            Parameters:
+                fName: (str) - Name of file.
+                treePath: (str) - dirName/treeName of tree.
+                branches: (list) - Branch names to read.
+                start: (int) - First entry to read. (optional)
+                stop: (int) - Entry to stop reading at. (optional)
+
+            Returns: m
+                m: (np.ndarray) - Record array with a field per branch.
+        '''
+        raise NotImplementedError
+
+    def ReadFiles(self, files, treePath, branches):
+        ''' Read branches of a tree from several files into one record array.
+        '''
+        return np.concatenate([self.Read(fName, treePath, branches)
+                               for fName in files])
+
+    def ReadTrees(self, fName, treePaths, branches):
+        ''' Read the same branches from several trees of one file.
+
+            Returns: arrays
+                arrays: (list) - Record array of each tree in treePaths.
+        '''
+        return [self.Read(fName, treePath, branches)
+                for treePath in treePaths]
+
+    def ReadEntries(self, fName, treePath, branches, index):
+        ''' Read chosen entries of a tree in one file.
+
+            Entries in the same cluster are read in one range, see
+            ClusterEntries.  If most clusters are touched the whole tree is
+            read once instead.
+
+            Parameters:
+                fName: (str) - Name of file.
+                treePath: (str) - dirName/treeName of tree.
+                branches: (list) - Branch names to read.
+                index: (np.ndarray) - Sorted entry numbers to read.
+
+            Returns: m
+                m: (np.ndarray) - Record array of the entries in index.
+        '''
+
+        cluster = self.ClusterEntries(fName, treePath, branches)
+        return _ReadRanges(lambda start, stop:
+                           self.Read(fName, treePath, branches, start, stop),
+                           index, cluster)
+
+    def ReadChunks(self, fName, treePath, branches, chunkSize):
+        ''' Read branches of a tree in one file chunkSize entries at a time.
+            Readers keep the file open between chunks where they can.
+
+            Parameters:
+                fName: (str) - Name of file.
+                treePath: (str) - dirName/treeName of tree.
+                branches: (list) - Branch names to read.
+                chunkSize: (int) - Entries per chunk.
+
+            Yields: m
+                m: (np.ndarray) - Record array of the next chunkSize 
+                    entries, shorter for the last chunk.  Empty chunks are
+                    never yielded.
+        '''
+        return _IterRanges(lambda start, stop:
+                           self.Read(fName, treePath, branches, start, stop),
+                           chunkSize)
+
+    def ClusterEntries(self, fName, treePath, branches):
+        ''' Return the number of entries of a tree read and decompressed
+            together, reading one entry costs as much as reading them all.
+            Ranges of ReadEntries are merged over gaps shorter than this.
+        '''
+        return 1
+
+
+class RootReader(Reader):
+    ''' Reader of ROOT files, root_numpy and rootpy are imported on first use.
+    '''
+
+    def __init__(self):
+        ''' Constructs a reader with no cluster sizes known.'''
+
+        # Entries per cluster keyed by file, mtime, tree and branches
+        self._clusters = {}
+
+    def Accepts(self, fName):
+        return not os.path.isdir(fName)
+
+    def Scan(self, fName, skipDirs=()):
+        from rootpy.io import root_open
+
+        trees = []
+        with root_open(fName, 'r') as rootFile:
+
+            # Loop through Directories, skipped ones are never read
+            for keyDir in rootFile.GetListOfKeys():
+                dirName = keyDir.GetName()
+                if dirName in skipDirs or \
+                   not keyDir.GetClassName().startswith('TDirectory'):
+                    continue
+
+                rootDir = keyDir.ReadObj()
+
+                # Loop through the trees in directory, only the tree header
+                # with the branch list is read, not the baskets
+                for keyTree in rootDir.GetListOfKeys():
+                    if keyTree.GetClassName() not in ('TTree', 'TNtuple'):
+                        continue
+
+                    tree = keyTree.ReadObj()
+                    branches = [branch.GetName()
+                                for branch in tree.GetListOfBranches()]
+                    trees.append((dirName, keyTree.GetName(),
+                                  tree.GetEntries(), branches))
+
+                    # ROOT keeps part of every tree read, scans in recycled
+                    # worker processes (see FileInfo) return it to the OS
+                    tree.Delete()
+
+                rootDir.Delete()
+
+        return trees
+
+    def Read(self, fName, treePath, branches, start=None, stop=None):
+        from root_numpy import root2array
+        return root2array(fName, treePath, branches, start=start, stop=stop)
+
+    def ReadFiles(self, files, treePath, branches):
+        from root_numpy import root2array
+        return root2array(files, treePath, branches)
+
+    def ReadTrees(self, fName, treePaths, branches):
+        from rootpy.io import root_open
+        from root_numpy import tree2array
+
+        # Open the file once for all trees
+        with root_open(fName, 'r') as rootFile:
+            return [tree2array(rootFile.Get(treePath), branches)
+                    for treePath in treePaths]
+
+    def ReadEntries(self, fName, treePath, branches, index):
+        from rootpy.io import root_open
+        from root_numpy import tree2array
+
+        # Open the file once, every range is read from the open tree
+        with root_open(fName, 'r') as rootFile:
+            tree = rootFile.Get(treePath)
+            cluster = _TreeCluster(tree, branches)
+            self._clusters[(fName, os.path.getmtime(fName), treePath,
+                            tuple(branches))] = cluster
+
+            return _ReadRanges(lambda start, stop:
+                               tree2array(tree, branches, start=start,
+                                          stop=stop),
+                               index, cluster)
+
+    def ReadChunks(self, fName, treePath, branches, chunkSize):
+        from rootpy.io import root_open
+        from root_numpy import tree2array
+
+        # Open the file once, every chunk is read from the open tree
+        with root_open(fName, 'r') as rootFile:
+            tree = rootFile.Get(treePath)
+            for m in _IterRanges(lambda start, stop:
+                                 tree2array(tree, branches, start=start,
+                                            stop=stop),
+                                 chunkSize):
+                yield m
+
+    def ClusterEntries(self, fName, treePath, branches):
+        from rootpy.io import root_open
+
+        key = (fName, os.path.getmtime(fName), treePath, tuple(branches))
+        if key not in self._clusters:
+            with root_open(fName, 'r') as rootFile:
+                self._clusters[key] = _TreeCluster(rootFile.Get(treePath),
+                                                   branches)
+        return self._clusters[key]
+
+
+class NumpyReader(Reader):
+    ''' Reader of NumPy files, directories of dirName/treeName/branch.npy
+        made by WriteNumpyFile or ConvertFile.
+    '''
+
+    def Accepts(self, fName):
+        return os.path.isdir(fName)
+
+    def Scan(self, fName, skipDirs=()):
+
+        trees = []
+        for dirName in sorted(os.listdir(fName)):
+            if dirName in skipDirs:
+                continue
+
+            dirPath = os.path.join(fName, dirName)
+            for treeName in sorted(os.listdir(dirPath)):
+
+                treePath = os.path.join(dirPath, treeName)
+                branches = sorted(branch[:-4] for branch
+                                  in os.listdir(treePath)
+                                  if branch.endswith('.npy'))
+
+                # Entries from the first column's header
+                nEntries = 0
+                if branches:
+                    nEntries = _Entries(treePath, branches[0])
+
+                trees.append((dirName, treeName, nEntries, branches))
+
+        return trees
+
+    def Read(self, fName, treePath, branches, start=None, stop=None):
+
+        treePath = os.path.join(fName, treePath)
+        return _Records(branches, [_Column(treePath, branch)[start:stop]
+                                   for branch in branches])
+
+    def ReadChunks(self, fName, treePath, branches, chunkSize):
+
+        # Map the columns once and slice every chunk from them
+        treePath = os.path.join(fName, treePath)
+        columns = [_Column(treePath, branch) for branch in branches]
+        return _IterRanges(lambda start, stop:
+                           _Records(branches, [column[start:stop]
+                                               for column in columns]),
+                           chunkSize)
+
+    def ReadEntries(self, fName, treePath, branches, index):
+
+        # Memory mapped columns only read the pages of the entries
+        treePath = os.path.join(fName, treePath)
+        columns = [_Column(treePath, branch) for branch in branches]
+
+        m = np.empty(len(index),
+                     dtype=[(branch, column.dtype)
+                            for branch, column in zip(branches, columns)])
+        for branch, column in zip(branches, columns):
+            m[branch] = column[index]
+
+        return m
+
+    def ClusterEntries(self, fName, treePath, branches):
+
+        # Entries of the narrowest column sharing a page
+        treePath = os.path.join(fName, treePath)
+        sizes = [_Column(treePath, branch).dtype.itemsize
+                 for branch in branches]
+        return max(mmap.PAGESIZE // max(min(sizes), 1), 1)
+
+
+def _ReadRanges(read, index, cluster):
+    ''' Read chosen entries with read(start, stop), one range per run of
+        clusters touched, or in one read if most clusters are touched.
+    '''
+
+    if len(index) == 0:
+        return read(0, 0)
+
+    # Whole clusters are read either way
+    nClusters = index[-1] // cluster + 1
+    touched = len(np.unique(index // cluster))
+    if touched >= _FULL_READ_COVERAGE * nClusters:
+        return read(0, int(index[-1]) + 1)[index]
+
+    parts = []
+    for start, stop in _Ranges(index, cluster):
+        parts.append(read(start, stop)[index[(index >= start) &
+                                             (index < stop)] - start])
+
+    return np.concatenate(parts)
+
+
+def _IterRanges(read, chunkSize):
+    ''' Yield read(start, stop) for successive ranges of chunkSize entries 
+        until a range comes back short.
+    '''
+
+    start = 0
+    while True:
+        m = read(start, start + chunkSize)
+        if len(m) > 0:
+            yield m
+        if len(m) < chunkSize:
+            return
+        start += chunkSize
+
+
+def _Ranges(index, gap):
+    ''' Split sorted entry numbers into (start, stop) ranges, starting a new
+        range wherever two entries are more than gap apart.
+    '''
+
+    breaks = np.flatnonzero(np.diff(index) > gap)
+    starts = index[np.r_[0, breaks + 1]]
+    stops = index[np.r_[breaks, len(index) - 1]] + 1
+
+    return zip(starts.tolist(), stops.tolist())
+
+
+def _TreeCluster(tree, branches):
+    ''' Return the entries per cluster of a ROOT tree, from its auto flush
+        setting or else from the basket size of the branches.
+    '''
+
+    nEntries = tree.GetEntries()
+    autoFlush = tree.GetAutoFlush()
+    if autoFlush > 0:
+        return int(autoFlush)
+
+    sizes = []
+    for name in branches:
+        branch = tree.GetBranch(name)
+        totBytes = branch.GetTotBytes()
+        if totBytes > 0:
+            sizes.append(int(branch.GetBasketSize() * nEntries / totBytes))
+
+    if not sizes:
+        return max(int(nEntries), 1)
+    return max(min(sizes), 1)
+
+
+def _Entries(treePath, branch):
+    ''' Return the length of a column of a NumPy file from its header.'''
+
+    with open(os.path.join(treePath, branch + '.npy'), 'rb') as f:
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape = np.lib.format.read_array_header_1_0(f)[0]
+        else:
+            shape = np.lib.format.read_array_header_2_0(f)[0]
+
+    return shape[0]
+
+
+def _Records(branches, columns):
+    ''' Return a record array with a field per branch from its columns.'''
+
+    m = np.empty(len(columns[0]),
+                 dtype=[(branch, column.dtype)
+                        for branch, column in zip(branches, columns)])
+    for branch, column in zip(branches, columns):
+        m[branch] = column
+
+    return m
+
+
+def _Column(treePath, branch):
+    ''' Memory map a column of a NumPy file, loading columns of objects.'''
+
+    fName = os.path.join(treePath, branch + '.npy')
+    try:
+        return np.load(fName, mmap_mode='r')
+    except ValueError:
+        return np.load(fName, allow_pickle=True)
+
+
+# Registered readers, the first accepting a file reads it
+_READERS = [NumpyReader(), RootReader()]
+
+def RegisterReader(reader):
+    ''' Add a reader backend, tried before the registered ones.
+
+        Parameters:
+            reader: (Reader) - Reader backend.
+
+        Raises:
+            TypeError: If reader is not a Reader.
+    '''
+
+    if not isinstance(reader, Reader):
+        raise TypeError('ERROR in RegisterReader:\n' +
+                        'reader must be a Reader!')
+
+    _READERS.insert(0, reader)
+
+def GetReader(fName):
+    ''' Return the reader backend of a file.
+
+        Raises:
+            ValueError: If no reader accepts the file.
+    '''
+
+    for reader in _READERS:
+        if reader.Accepts(fName):
+            return reader
+
+    raise ValueError('ERROR in GetReader:\n' +
+                     'No reader for ' + fName + '!')
+
+def Scan(fName, skipDirs=()):
+    ''' List the trees of a file, see Reader.Scan.'''
+    return GetReader(fName).Scan(fName, skipDirs)
+
+def Read(files, treePath, branches, start=None, stop=None):
+    ''' Read branches of a tree into one record array.
+
+        Parameters:
+            files: (str or list) - File or files to read, in order.
+            treePath: (str) - dirName/treeName of tree.
+            branches: (list) - Branch names to read.
+            start: (int) - First entry to read, single file only. (optional)
+            stop: (int) - Entry to stop reading at, single file only.
+                (optional)
+
+        Returns: m
+            m: (np.ndarray) - Record array with a field per branch.
+    '''
+
+    if isinstance(files, str):
+        return GetReader(files).Read(files, treePath, branches, start, stop)
+
+    if start is not None or stop is not None:
+        raise ValueError('ERROR in Read:\n' +
+                         'Entry ranges need a single file!')
+
+    readers = [GetReader(fName) for fName in files]
+    if all(reader is readers[0] for reader in readers):
+        return readers[0].ReadFiles(files, treePath, branches)
+
+    return np.concatenate([reader.Read(fName, treePath, branches)
+                           for reader, fName in zip(readers, files)])
+
+def ReadEntries(fName, treePath, branches, index):
+    ''' Read chosen entries of a tree in one file, see Reader.ReadEntries.'''
+    return GetReader(fName).ReadEntries(fName, treePath, branches, index)
+
+def ReadChunks(fName, treePath, branches, chunkSize):
+    ''' Read a tree of one file chunkSize entries at a time, see 
+        Reader.ReadChunks.
+    '''
+    return GetReader(fName).ReadChunks(fName, treePath, branches, chunkSize)
+
+def ClusterEntries(fName, treePath, branches):
+    ''' Return the number of entries of a tree read together, see
+        Reader.ClusterEntries.
+    '''
+    return GetReader(fName).ClusterEntries(fName, treePath, branches)
+
+def ReadTrees(fName, treePaths, branches):
+    ''' Read the same branches from several trees of one file, see
+        Reader.ReadTrees.
+    '''
+    return GetReader(fName).ReadTrees(fName, treePaths, branches)
+
+def WriteNumpyFile(fName, layout):
+    ''' Write a NumPy file read by NumpyReader.
+
+        Parameters:
+            fName: (str) - Directory of the file, created.
+            layout: (dict) - Column arrays keyed by directory, tree and
+                branch name, ie. layout['rqDir']['zip1']['PRecoilT'].
+    '''
+
+    for dirName, trees in layout.iteritems():
+        for treeName, columns in trees.iteritems():
+
+            treePath = os.path.join(fName, dirName, treeName)
+            if not os.path.isdir(treePath):
+                os.makedirs(treePath)
+
+            for branch, column in columns.iteritems():
+                np.save(os.path.join(treePath, branch + '.npy'),
+                        np.asarray(column))
+
+def ConvertFile(fName, outName):
+    ''' Write a NumPy file with every tree of a file any reader accepts, ie.
+        to run on a copy of ROOT files without ROOT.
+
+        Parameters:
+            fName: (str) - File to convert.
+            outName: (str) - Directory of the NumPy file, created.
+    '''
+
+    layout = {}
+    for dirName, treeName, nEntries, branches in Scan(fName):
+        if not branches:
+            continue
+
+        m = Read(fName, dirName + '/' + treeName, branches)
+        layout.setdefault(dirName, {})[treeName] = \
+            dict((branch, m[branch]) for branch in branches)
+
+    WriteNumpyFile(outName, layout)
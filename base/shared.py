@@ -0,0 +1,366 @@
+# -*- coding: utf-8 -*-
+"""
+shared.py
+
+CAPy module for the SharedArrays class.
+
+Worker processes running over the same session (parameter scans, bootstrap)
+each read the same branches and keep a private copy, so memory grows with the
+number of workers.  SharedArrays publishes loaded arrays and cuts as named
+segments in shared memory, files in /dev/shm, and every process of the
+session maps the same pages read only.  Each process attached to a segment
+holds a reference file next to it, and the last process to release a segment
+removes it, references of processes that died are ignored.  Likewise every 
+process of the session holds a session reference, and the last one to close
+removes what is left of the session and its directory.
+
+Classes:
+    SharedArrays - Named shared memory segments of one session.
+
+Created on Sat Oct 17 19:27:44 2026
+
+@author: tdoughty1
+"""
+
+# Import Standard libraries
+import os
+import errno
+import atexit
+import hashlib
+import tempfile
+
+# Import Numerical libraries
+import numpy as np
+
+# Import CAPy modules
+from cuts import _FromBits
+
+# Directory of shared memory segments, a tmpfs on Linux
+if os.path.isdir('/dev/shm'):
+    _SHM_DIR = '/dev/shm'
+else:
+    _SHM_DIR = tempfile.gettempdir()
+
+class SharedArrays(object):
+    ''' Named shared memory segments of arrays and cuts for one session.
+
+        Called:
+            array = SharedArrays(key)
+
+            Inputs:
+                key: (tuple) - (name, detnum, files) of loaded array.
+
+            Outputs:
+                array: (np.memmap) - Read only view of the published array, or
+                    None if not published.
+
+        Constructed:
+            SharedArrays(session, shmDir=None)
+
+            Parameters:
+                session: (str) - Name of the session, processes using the same
+                    name share segments.
+                shmDir: (str) - Directory of the segments, default /dev/shm.
+                    (optional)
+
+        Methods:
+            Publish: Write an array to a segment and return a view of it.
+            PublishCut: Write a cut to a segment and return a view of it.
+            AttachCut: Return a view of a published cut.
+            Release: Drop this process' reference to a segment.
+            Close: Release every segment used by this process.
+
+        Hidden Methods:
+            _Segment: Return the file name of the segment of a key.
+            _Attach: Reference and map a segment.
+            _Write: Write a segment atomically.
+            _LiveRefs: Return the reference files of live processes.
+            _RemoveSession: Remove the session directory if unused.
+
+        Attributes:
+            _dir: (str) - Directory of the session segments.
+            _session: (str) - Session reference path, each process holds 
+                the file _session.<pid>.
+            _views: (dict) - (view, inode) mapped by this process, keyed by 
+                segment.
+            _pid: (int) - Process the views belong to, forked children start
+                with no references.
+    '''
+
+    def __init__(self, session, shmDir=None):
+        ''' Constructs the segment directory of a session.
+
+            Parameters:
+                session: (str) - Name of the session.
+                shmDir: (str) - Directory of the segments. (optional)
+        '''
+
+        if shmDir is None:
+            shmDir = _SHM_DIR
+
+        self._dir = os.path.join(shmDir, 'CAPy-' + session)
+        self._session = os.path.join(self._dir, 'session')
+
+        # The last process of the session may remove the directory between
+        # creating it and referencing the session
+        while True:
+            try:
+                os.makedirs(self._dir)
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+            try:
+                open(self._session + '.' + str(os.getpid()), 'w').close()
+                break
+            except IOError as e:
+                if e.errno != errno.ENOENT:
+                    raise
+
+        self._views = {}
+        self._pid = os.getpid()
+
+        atexit.register(self.Close)
+
+    def __call__(self, key):
+        ''' Return a read only view of a published array or None.
+
+            Parameters:
+                key: (tuple) - (name, detnum, files) of loaded array.
+        '''
+        return self._Attach(self._Segment(key))
+
+    def Publish(self, key, array):
+        ''' Write an array to its segment, unless already published, and
+            return the shared view to use instead of the private array.
+
+            Parameters:
+                key: (tuple) - (name, detnum, files) of loaded array.
+                array: (np.ndarray) - Loaded array.
+
+            Returns: view
+                view: (np.memmap) - Read only view of the segment, or array
+                    itself if it can't be shared.
+        '''
+
+        # Empty arrays can't be mapped, nor variable length branches held
+        # as objects
+        if array.size == 0 or array.dtype.hasobject:
+            return array
+        
+        segment = self._Segment(key)
+        view = self._Attach(segment)
+        if view is None:
+            self._Write(segment, array)
+            view = self._Attach(segment)
+
+        # Released by every other process between writing and mapping
+        if view is None:
+            return array
+
+        return view
+
+    def PublishCut(self, name, cut):
+        ''' Write a cut to its segment and return a cut viewing it.
+
+            Parameters:
+                name: (str) - Name other processes use to attach the cut.
+                cut: (Cut) - Cut to share.
+
+            Returns: cut
+                cut: (Cut) - Cut whose bits are in shared memory, or cut 
+                    itself if the segment was removed before it was mapped.
+        '''
+
+        segment = self._Segment(('Cut', name))
+
+        # Number of events is stored in the first 8 bytes
+        raw = np.empty(8 + len(cut._bits), dtype=np.uint8)
+        raw[:8] = np.array([len(cut)], dtype='<i8').view(np.uint8)
+        raw[8:] = cut._bits
+
+        self.Release(segment)
+        self._Write(segment, raw)
+
+        shared = self.AttachCut(name)
+        if shared is None:
+            return cut
+
+        return shared
+
+    def AttachCut(self, name):
+        ''' Return a cut published by any process of the session, or None.
+
+            Parameters:
+                name: (str) - Name the cut was published under.
+        '''
+
+        raw = self._Attach(self._Segment(('Cut', name)))
+        if raw is None:
+            return None
+
+        nEvents = int(raw[:8].view('<i8')[0])
+        return _FromBits(raw[8:], nEvents)
+
+    def Release(self, segment):
+        ''' Drop this process' reference to a segment, removing the segment if
+            no live process references it.
+
+            Parameters:
+                segment: (str) - Segment file name.
+        '''
+
+        self._views.pop(segment, None)
+
+        try:
+            os.remove(segment + '.' + str(os.getpid()))
+        except OSError:
+            pass
+
+        if not self._LiveRefs(segment):
+            try:
+                os.remove(segment)
+            except OSError:
+                pass
+
+    def Close(self):
+        ''' Release every segment used by this process, and remove the session
+            directory if no live process uses the session.
+        '''
+
+        if os.getpid() != self._pid:
+            return
+
+        for segment in self._views.keys():
+            self.Release(segment)
+
+        try:
+            os.remove(self._session + '.' + str(os.getpid()))
+        except OSError:
+            pass
+
+        if not self._LiveRefs(self._session):
+            self._RemoveSession()
+
+    def _Segment(self, key):
+        ''' Return the file name of the segment of a key.'''
+
+        name = hashlib.sha1(repr(key)).hexdigest()
+        return os.path.join(self._dir, name + '.npy')
+
+    def _Attach(self, segment):
+        ''' Reference and map a segment, None if it doesn't exist.'''
+
+        # Children forked from the session inherit views, not references
+        if os.getpid() != self._pid:
+            self._views = {}
+            self._pid = os.getpid()
+
+        # Reuse the view unless the segment was published again since
+        if segment in self._views:
+            view, inode = self._views[segment]
+            try:
+                if os.stat(segment).st_ino == inode:
+                    return view
+            except OSError:
+                pass
+
+        # Reference first, so the segment can't be removed once mapped
+        refFile = segment + '.' + str(os.getpid())
+        open(refFile, 'w').close()
+
+        try:
+            inode = os.stat(segment).st_ino
+            view = np.load(segment, mmap_mode='r')
+        except (IOError, OSError, ValueError):
+            os.remove(refFile)
+            self._views.pop(segment, None)
+            return None
+
+        self._views[segment] = (view, inode)
+        return view
+
+    def _Write(self, segment, array):
+        ''' Write a segment through a temporary file and rename, so no process
+            maps a partial segment.
+        '''
+
+        tmpFile = segment + '.tmp' + str(os.getpid())
+        with open(tmpFile, 'wb') as f:
+            np.save(f, array)
+        os.rename(tmpFile, segment)
+
+    def _RemoveSession(self):
+        ''' Remove the segments left by processes that died without closing,
+            then the session directory.  A process joining the session 
+            meanwhile keeps the directory, as it is no longer empty.
+        '''
+
+        try:
+            fNames = os.listdir(self._dir)
+        except OSError:
+            return
+
+        for fName in fNames:
+            if fName.endswith('.npy'):
+                segment = os.path.join(self._dir, fName)
+                if not self._LiveRefs(segment):
+                    try:
+                        os.remove(segment)
+                    except OSError:
+                        pass
+
+            # Partial segments of writers that died
+            elif '.npy.tmp' in fName:
+                pid = fName.rsplit('.tmp', 1)[1]
+                if pid.isdigit() and not _IsAlive(int(pid)):
+                    try:
+                        os.remove(os.path.join(self._dir, fName))
+                    except OSError:
+                        pass
+
+        try:
+            os.rmdir(self._dir)
+        except OSError:
+            pass
+
+    def _LiveRefs(self, segment):
+        ''' Return the reference files of a segment, or of the session, held
+            by live processes, removing those of processes that died.
+        '''
+
+        prefix = os.path.basename(segment) + '.'
+        refs = []
+        try:
+            fNames = os.listdir(self._dir)
+        except OSError:
+            return refs
+
+        for fName in fNames:
+            if not fName.startswith(prefix):
+                continue
+
+            pid = fName[len(prefix):]
+            if not pid.isdigit():
+                continue
+
+            if not _IsAlive(int(pid)):
+                try:
+                    os.remove(os.path.join(self._dir, fName))
+                except OSError:
+                    pass
+                continue
+
+            refs.append(fName)
+
+        return refs
+
+
+def _IsAlive(pid):
+    ''' Return false only if no process pid exists.'''
+
+    try:
+        os.kill(pid, 0)
+    except OSError as e:
+        if e.errno == errno.ESRCH:
+            return False
+    return True
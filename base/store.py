@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+"""
+store.py
+
+CAPy module for the ColumnStore class.
+
+Reading branches through root_numpy decompresses every basket and builds a
+new array on every call.  The ColumnStore converts each branch of each ROOT 
+file once into an uncompressed .npy column.  Later reads are memory mapped, 
+so a repeat load costs page cache lookups and every analysis process on a 
+node shares the same physical pages.
+
+Columns are converted per file, following the per file maps of FileInfo, so 
+sessions on different file lists share the conversion.  For a branch spread 
+over several files the per file columns are joined once into one contiguous 
+column, keyed by the names, sizes and mtimes of the files.  Every column is 
+returned as a memory mapped view without any copy.
+
+Classes:
+    ColumnStore - Directory of .npy columns with a manifest.
+
+Created on Sat Oct 17 11:02:45 2026
+
+@author: tdoughty1
+"""
+
+# Import Standard libraries
+import os
+import cPickle
+from hashlib import md5
+
+# Import Numerical libraries
+import numpy as np
+
+# Import file readers, ROOT is loaded on first read
+from rootio import Read
+
+# Version of the store manifest format
+_STORE_VERSION = 1
+
+class ColumnStore(object):
+    ''' Directory of uncompressed per file columns with a manifest.
+    
+        Called:
+            m = ColumnStore(name, detnum, files)
+            
+            Inputs:
+                name: (str) - Name of data or cut branch.
+                detnum: (int) - Detector number (1 = general).
+                files: (list) - Files to read the branch from, as returned by
+                    FileInfo.
+            
+            Outputs:
+                m: (np.memmap) - Single branch record array, as returned by 
+                    rootio.Read, or None if a file isn't in the store.
+
+        Constructed:
+            ColumnStore(storeDir)
+            
+            Parameters:
+                storeDir: (str) - Directory holding the store, created if it
+                    doesn't exist.
+
+        Methods:
+            Convert: Write the columns of the session files into the store.
+            Has: Checks if every file of a branch is in the store.
+        
+        Hidden Methods:
+            _ReadManifest: Load manifest, dropping files changed since written.
+            _WriteManifest: Save manifest to the store directory.
+            _ConvertFile: Write the columns of a single file.
+            _Join: Write the column of a branch over several files.
+            
+        Attributes:
+            _storeDir: (str) - Directory holding the store, per file columns
+                in a directory per file and joined columns in 'joined'.
+            _files: (dict) - Manifest entry for every stored file keyed by 
+                file name, holding the size and mtime of the ROOT file and 
+                the column file of each (branch, detnum).
+    '''
+    
+    def __init__(self, storeDir):
+        ''' Constructs a column store in storeDir.
+        
+            Parameters:
+                storeDir: (str) - Directory holding the store.
+        '''
+        
+        if not os.path.isdir(storeDir):
+            os.makedirs(storeDir)
+        
+        self._storeDir = storeDir
+        self._files = {}
+        
+        self._ReadManifest()
+    
+    def __call__(self, name, detnum, files):
+        ''' Return single branch record array for name/detnum over files.
+        
+            Parameters:
+                name: (str) - Name of data or cut branch.
+                detnum: (int) - Detector number (1 = general).
+                files: (list) - Files to read the branch from.
+        '''
+        
+        if not self.Has(name, detnum, files):
+            return None
+        
+        if len(files) == 1:
+            path = self._files[files[0]]['Columns'][(name, detnum)]
+        else:
+            path = self._Join(name, detnum, files)
+        
+        column = np.load(path, mmap_mode='r')
+        return column.view([(name, column.dtype)])
+
+    def Has(self, name, detnum, files):
+        ''' Return true if name/detnum is stored for every file in files.'''
+        
+        for fName in files:
+            if fName not in self._files or \
+               (name, detnum) not in self._files[fName]['Columns']:
+                return False
+        return True
+
+    def Convert(self, fileInfo, names=None):
+        ''' Write the columns of the session files into the store.
+        
+            Each tree of each file is read once for all requested branches not
+            already stored, then branches over several files are joined into 
+            one column for the session file set.  Branches holding arrays per
+            event can't be stored as flat columns and are skipped.
+            
+            Parameters:
+                fileInfo: (FileInfo) - Session file information.
+                names: (list) - Branches to convert, default all. (optional)
+        '''
+        
+        if names is not None:
+            names = set(names)
+        
+        try:
+            for fName in fileInfo.GetDataFiles() + fileInfo.GetCutFiles():
+                self._ConvertFile(fName, fileInfo.GetFileMap(fName), names)
+        finally:
+            self._WriteManifest()
+        
+        for name in fileInfo.GetDataNames() + fileInfo.GetCutNames():
+            if names is not None and name not in names:
+                continue
+            for detnum in fileInfo.GetBranchDetnums(name):
+                files = fileInfo(name, detnum)[0]
+                if len(files) > 1 and self.Has(name, detnum, files):
+                    self._Join(name, detnum, files)
+
+    def _ConvertFile(self, fName, fileMap, names):
+        ''' Write the requested columns of a single file.
+        
+            Parameters:
+                fName: (str) - Name of ROOT file.
+                fileMap: (dict) - File map entry from FileInfo.GetFileMap.
+                names: (set) - Branches to convert, None for all.
+        '''
+        
+        entry = self._files.get(fName)
+        if entry is None or entry['Size'] != fileMap['Size'] or \
+           entry['MTime'] != fileMap['MTime']:
+            entry = {'Size': fileMap['Size'],
+                     'MTime': fileMap['MTime'],
+                     'Columns': {}}
+        
+        # Group missing branches by tree so each tree is read once
+        trees = {}
+        for branchName, detMap in fileMap['Map']['Branches'].iteritems():
+            if names is not None and branchName not in names:
+                continue
+            for detnum, tree in detMap.iteritems():
+                if (branchName, detnum) not in entry['Columns']:
+                    trees.setdefault(tree, []).append((branchName, detnum))
+        
+        if not trees:
+            self._files[fName] = entry
+            return
+        
+        fileDir = os.path.join(self._storeDir, md5(fName).hexdigest())
+        if not os.path.isdir(fileDir):
+            os.makedirs(fileDir)
+        
+        for (dirName, treeName), branches in sorted(trees.iteritems()):
+            
+            m = Read(fName, dirName + '/' + treeName, 
+                     [branchName for branchName, detnum in branches])
+            
+            for branchName, detnum in branches:
+                column = np.ascontiguousarray(m[branchName])
+                
+                # Variable length branches have no flat layout
+                if column.dtype.hasobject:
+                    continue
+                
+                path = os.path.join(fileDir, dirName + '.' + treeName + '.' +
+                                    branchName + '.npy')
+                np.save(path, column)
+                entry['Columns'][(branchName, detnum)] = path
+        
+        self._files[fName] = entry
+
+    def _Join(self, name, detnum, files):
+        ''' Return the path of the column of name/detnum over files, writing
+            it from the per file columns if not already joined.
+        
+            The path is keyed by the size and mtime of each file as converted,
+            so a changed file set or file gets a new column.
+            
+            Parameters:
+                name: (str) - Name of data or cut branch.
+                detnum: (int) - Detector number (1 = general).
+                files: (list) - Files of the branch, all in the store.
+        '''
+        
+        stamps = [(fName, self._files[fName]['Size'], 
+                   self._files[fName]['MTime']) for fName in files]
+        key = md5(repr((name, detnum, stamps))).hexdigest()
+        
+        joinDir = os.path.join(self._storeDir, 'joined')
+        path = os.path.join(joinDir, key + '.npy')
+        if os.path.isfile(path):
+            return path
+        
+        if not os.path.isdir(joinDir):
+            os.makedirs(joinDir)
+        
+        columns = [np.load(self._files[fName]['Columns'][(name, detnum)],
+                           mmap_mode='r') for fName in files]
+        
+        # Written under a process unique name, so concurrent joins don't mix
+        tmpFile = path[:-len('.npy')] + '.tmp' + str(os.getpid()) + '.npy'
+        out = np.lib.format.open_memmap(
+            tmpFile, mode='w+', dtype=np.result_type(*columns), 
+            shape=(sum(len(column) for column in columns),))
+        
+        offset = 0
+        for column in columns:
+            out[offset:offset + len(column)] = column
+            offset += len(column)
+        
+        out.flush()
+        del out
+        os.rename(tmpFile, path)
+        
+        return path
+
+    def _ReadManifest(self):
+        ''' Load the manifest, dropping files changed since conversion. '''
+        
+        manifest = os.path.join(self._storeDir, 'manifest.pkl')
+        if not os.path.isfile(manifest):
+            return
+        
+        with open(manifest, 'rb') as f:
+            stored = cPickle.load(f)
+        
+        if stored.get('Version') != _STORE_VERSION:
+            print "WARNING in ColumnStore:"
+            print "Store " + self._storeDir + " is out of date, ignoring!"
+            return
+        
+        for fName, entry in stored['Files'].iteritems():
+            try:
+                stat = os.stat(fName)
+            except OSError:
+                continue
+            if stat.st_size == entry['Size'] and \
+               stat.st_mtime == entry['MTime']:
+                self._files[fName] = entry
+
+    def _WriteManifest(self):
+        ''' Save the manifest, merging entries written by other processes. '''
+        
+        manifest = os.path.join(self._storeDir, 'manifest.pkl')
+        
+        files = {}
+        if os.path.isfile(manifest):
+            with open(manifest, 'rb') as f:
+                stored = cPickle.load(f)
+            if stored.get('Version') == _STORE_VERSION:
+                files.update(stored['Files'])
+        files.update(self._files)
+        
+        tmpFile = manifest + '.tmp' + str(os.getpid())
+        with open(tmpFile, 'wb') as f:
+            cPickle.dump({'Version': _STORE_VERSION, 'Files': files}, f,
+                         cPickle.HIGHEST_PROTOCOL)
+        os.rename(tmpFile, manifest)
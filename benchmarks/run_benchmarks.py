@@ -0,0 +1,331 @@
+# -*- coding: utf-8 -*-
+"""
+run_benchmarks.py
+
+Benchmark suite of CAPy session startup, file mapping and data reads.
+
+Generates a synthetic dataset (see synthetic.py), or uses a given file list,
+and times each step a number of times, recording the best and median time.
+Each step runs in a process forked from the session, so its memory 
+high-water mark starts at the session size and isn't hidden by an earlier, 
+larger step.  The size at the start of the step, the peak and the growth are
+recorded, with the peak of any worker processes of the step.  Results are 
+written as JSON so runs before and after a change can be compared:
+
+    python run_benchmarks.py --output before.json
+    python run_benchmarks.py --output after.json --compare before.json
+
+Benchmarks:
+    MapCold - FileInfo mapping every file.
+    MapCached - FileInfo mapping from a warm map cache.
+    StartSession - Start_Session including namespace population.
+    LoadSingle - One data function call, nothing cached.
+    LoadCached - The same call from the session array cache.
+    LoadBatched - Load of several branches of one tree.
+    LoadUnbatched - The same branches one data function call each.
+    LoadAllDetectors - One branch for every detector.
+    CutApply - Cut built from a loaded array and applied to another.
+    CutLazy - Lazy cut expression evaluated chunk by chunk.
+    IterateChunks - Iterate over two branches in chunks.
+
+Functions:
+    RunBenchmarks - Run the suite and return the results.
+    Compare - Print the time ratio of every benchmark to an earlier run.
+
+Created on Sat Oct 17 21:38:02 2026
+
+@author: tdoughty1
+"""
+
+# Import Standard libraries
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import resource
+import tempfile
+import traceback
+
+# Import Numerical libraries
+import numpy as np
+
+# Run from a checkout without installing
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import CAPy modules
+import CAPy
+from base.fileinfo import FileInfo
+from base.datatypes import Data_Function
+import base.CAPy_globals as CAPy_globals
+
+# Import benchmark modules
+from synthetic import Generate
+
+# Version of the results format
+_RESULTS_VERSION = 2
+
+def RunBenchmarks(fileList, repeats=3, nWorkers=1):
+    ''' Time every benchmark on the files in fileList.
+
+        Parameters:
+            fileList: (str) - Text file with one data file name per line.
+            repeats: (int) - Number of times each benchmark is run.
+                (optional)
+            nWorkers: (int) - Processes mapping and reading files. (optional)
+
+        Returns: results
+            results: (list) - Dict per benchmark with 'Name', 'Best' and
+                'Median' seconds, 'Times', and 'BaseRSS', 'MaxRSS', 
+                'DeltaRSS' and 'ChildMaxRSS' in kB, see _RunStep.
+    '''
+
+    fNames = [line.strip() for line in open(fileList) if line.strip()]
+    results = []
+
+    def Record(name, func, setup=None, warm=None):
+        result = _RunStep(func, setup, warm, repeats)
+        result['Name'] = name
+        results.append(result)
+        print '%-18s %10.4f s %10d kB' % (name, result['Best'], 
+                                          result['DeltaRSS'])
+
+    # File mapping, with and without the map cache
+    cacheDir = tempfile.mkdtemp(prefix='CAPybench')
+    cacheFile = os.path.join(cacheDir, 'maps.pkl')
+    try:
+        Record('MapCold',
+               lambda: FileInfo(fNames, nWorkers=nWorkers))
+        with _Quiet():
+            FileInfo(fNames, cacheFile=cacheFile, nWorkers=nWorkers)
+        Record('MapCached',
+               lambda: FileInfo(fNames, cacheFile=cacheFile,
+                                nWorkers=nWorkers))
+    finally:
+        shutil.rmtree(cacheDir)
+
+    # Timed in a child process, so the session is started again here
+    Record('StartSession',
+           lambda: CAPy.Start_Session(fileList, nWorkers=nWorkers))
+    with _Quiet():
+        CAPy.Start_Session(fileList, nWorkers=nWorkers)
+
+    # Branches of the first zip tree, read in the load benchmarks
+    fileInfo = CAPy_globals._FileInfo
+    detnums = [detnum for detnum in fileInfo.GetDetnums() if detnum != 1]
+    detnum = detnums[0]
+    names = sorted(name for name in fileInfo.GetDataNames()
+                   if detnum in fileInfo.GetBranchDetnums(name) and
+                   fileInfo(name, detnum)[2] == 'zip' + str(detnum - 1100))
+    energy = 'PRecoilT' if 'PRecoilT' in names else names[0]
+    chisq = 'PTNFchisq' if 'PTNFchisq' in names else names[-1]
+    batch = names[:10]
+
+    Energy = Data_Function(energy)
+    Chisq = Data_Function(chisq)
+
+    Record('LoadSingle', lambda: Energy(detnum, None),
+           setup=CAPy_globals.ClearCache)
+    Record('LoadCached', lambda: Energy(detnum, None),
+           warm=lambda: Energy(detnum, None))
+    Record('LoadBatched', lambda: CAPy.Load(batch, detnum),
+           setup=CAPy_globals.ClearCache)
+    Record('LoadUnbatched',
+           lambda: [Data_Function(name)(detnum, None) for name in batch],
+           setup=CAPy_globals.ClearCache)
+    Record('LoadAllDetectors', lambda: Energy('all', None),
+           setup=CAPy_globals.ClearCache)
+
+    # Cuts, from loaded arrays and lazily
+    chisqValues = Chisq(detnum, None)[chisq]
+    threshold = float(np.median(chisqValues))
+    Record('CutApply',
+           lambda: Energy(detnum, CAPy.Cut(Chisq(detnum, None)[chisq] <
+                                           threshold)),
+           setup=CAPy_globals.ClearCache)
+    Record('CutLazy',
+           lambda: (Chisq.Lazy(detnum) < threshold).Evaluate())
+    Record('IterateChunks',
+           lambda: [None for chunk in CAPy.Iterate([energy, chisq], detnum,
+                                                   None, 10000)])
+
+    return results
+
+
+def Compare(results, oldFile):
+    ''' Print the best time of every benchmark relative to an earlier run.
+
+        Parameters:
+            results: (list) - Results of RunBenchmarks.
+            oldFile: (str) - JSON output of an earlier run.
+    '''
+
+    with open(oldFile) as f:
+        old = dict((result['Name'], result)
+                   for result in json.load(f)['Results'])
+
+    print '\n%-18s %10s %10s %8s' % ('Benchmark', 'Before', 'After', 'Ratio')
+    for result in results:
+        if result['Name'] not in old:
+            continue
+        before = old[result['Name']]['Best']
+        after = result['Best']
+        print '%-18s %10.4f %10.4f %8.2f' % (result['Name'], before, after,
+                                             after / before if before else 0)
+
+
+def _RunStep(func, setup, warm, repeats):
+    ''' Time func in a process forked from the session and return its times
+        and memory.
+        
+        A forked process starts with the memory high-water mark at the 
+        session size, so the growth is that of the step alone.  Changes the
+        step makes to the session, like cached arrays, are dropped with the
+        process.
+        
+        Parameters:
+            func: (callable) - Step to time.
+            setup: (callable) - Run before every repeat, not timed.
+            warm: (callable) - Run once before the baseline is taken, for 
+                steps timed on a warm session.
+            repeats: (int) - Number of times func is run.
+        
+        Returns: result
+            result: (dict) - 'Best' and 'Median' seconds, 'Times', 'BaseRSS'
+                the high-water mark at the start of the step, 'MaxRSS' at 
+                the end, 'DeltaRSS' the growth and 'ChildMaxRSS' the largest
+                worker process of the step, all in kB.
+        
+        Raises:
+            RuntimeError: If the step fails in the child process.
+    '''
+    
+    readFd, writeFd = os.pipe()
+    pid = os.fork()
+    
+    if pid == 0:
+        os.close(readFd)
+        status = 0
+        try:
+            with _Quiet():
+                if warm is not None:
+                    warm()
+                baseRSS = _MaxRSS(resource.RUSAGE_SELF)
+                
+                times = []
+                for i in range(repeats):
+                    if setup is not None:
+                        setup()
+                    start = time.time()
+                    func()
+                    times.append(time.time() - start)
+                
+                # Workers are counted once they have been waited for
+                CAPy_globals.CloseReadPool()
+            
+            maxRSS = _MaxRSS(resource.RUSAGE_SELF)
+            output = json.dumps({'Best': min(times),
+                                 'Median': float(np.median(times)),
+                                 'Times': times,
+                                 'BaseRSS': baseRSS,
+                                 'MaxRSS': maxRSS,
+                                 'DeltaRSS': maxRSS - baseRSS,
+                                 'ChildMaxRSS': 
+                                     _MaxRSS(resource.RUSAGE_CHILDREN)})
+        except:
+            output = traceback.format_exc()
+            status = 1
+        
+        with os.fdopen(writeFd, 'w') as f:
+            f.write(output)
+        os._exit(status)
+    
+    os.close(writeFd)
+    with os.fdopen(readFd) as f:
+        output = f.read()
+    status = os.waitpid(pid, 0)[1]
+    
+    if status != 0:
+        raise RuntimeError('ERROR in RunBenchmarks:\n' +
+                           'Step failed in its process:\n' + output)
+    
+    return json.loads(output)
+
+
+def _MaxRSS(who):
+    ''' Return the memory high-water mark in kB.
+    
+        Parameters:
+            who: (int) - resource.RUSAGE_SELF for this process, 
+                RUSAGE_CHILDREN for the largest finished child process.
+    '''
+
+    maxRSS = resource.getrusage(who).ru_maxrss
+
+    # Reported in bytes on Mac OS X, kB elsewhere
+    if sys.platform == 'darwin':
+        maxRSS //= 1024
+    return maxRSS
+
+
+class _Quiet(object):
+    ''' Silence the progress prints of CAPy while timing.'''
+
+    def __enter__(self):
+        self._stdout = sys.stdout
+        sys.stdout = open(os.devnull, 'w')
+
+    def __exit__(self, *args):
+        sys.stdout.close()
+        sys.stdout = self._stdout
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Time CAPy session ' +
+                                     'startup, mapping and reads.')
+    parser.add_argument('--fileList',
+                        help='existing dataset, default generates one')
+    parser.add_argument('--dataDir', default=None,
+                        help='directory of the generated dataset')
+    parser.add_argument('--files', type=int, default=10)
+    parser.add_argument('--entries', type=int, default=10000)
+    parser.add_argument('--dets', type=int, default=5)
+    parser.add_argument('--branches', type=int, default=100)
+    parser.add_argument('--type', choices=['numpy', 'root'], default='numpy')
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--output', default='bench_output.json')
+    parser.add_argument('--compare', help='JSON output of an earlier run')
+    args = parser.parse_args()
+
+    config = vars(args)
+    dataDir = None
+    fileList = args.fileList
+    if fileList is None:
+        dataDir = args.dataDir or tempfile.mkdtemp(prefix='CAPydata')
+        fileList = Generate(dataDir, args.files, args.entries, args.dets,
+                            args.branches, args.type)
+
+    try:
+        results = RunBenchmarks(fileList, args.repeats, args.workers)
+    finally:
+        if dataDir is not None and args.dataDir is None:
+            shutil.rmtree(dataDir)
+
+    with open(args.output, 'w') as f:
+        json.dump({'Version': _RESULTS_VERSION,
+                   'Time': time.strftime('%Y-%m-%d %H:%M:%S'),
+                   'Machine': {'Platform': platform.platform(),
+                               'Python': platform.python_version(),
+                               'NumPy': np.__version__,
+                               'CPUs': os.sysconf('SC_NPROCESSORS_ONLN')},
+                   'Config': config,
+                   'Results': results}, f, indent=1, sort_keys=True)
+
+    print 'Wrote ' + args.output
+
+    if args.compare:
+        Compare(results, args.compare)
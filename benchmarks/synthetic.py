@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""
+synthetic.py
+
+Generator of synthetic datasets in the CDMS file layout for the benchmarks.
+
+Every file holds the directories and trees CAPy maps from real data:
+
+    rqDir/eventTree - General event quantities (SeriesNumber, EventNumber,
+        EventTime, ...).
+    rqDir/calibevent - Calibrated general quantities.
+    rqDir/zipN - Reduced quantities of detector N (detnum 1100 + N).
+    calibDir/calibzipN - Calibrated reduced quantities of detector N.
+    infoDir/seriesInfo - Ignored by FileInfo, skipped when mapping.
+
+Each zip tree holds the same branch names, a few with realistic names and
+the rest numbered, so thousands of branches are easy to reach.  Files are
+written as NumPy files, or as ROOT files if root_numpy is installed.
+
+    python synthetic.py outDir --files 10 --entries 10000 --dets 5
+
+Functions:
+    Generate - Write a synthetic dataset and its file list.
+
+Created on Sat Oct 17 21:05:13 2026
+
+@author: tdoughty1
+"""
+
+# Import Standard libraries
+import os
+import sys
+import argparse
+
+# Import Numerical libraries
+import numpy as np
+
+# Run from a checkout without installing
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import CAPy modules
+from base.rootio import WriteNumpyFile
+
+# Named branches of every zip and calibzip tree, the rest are numbered
+_ZIP_BRANCHES = ['PRecoilT', 'PTNFchisq', 'PTOFamps', 'QIMean', 'QOFchisq']
+_CALIB_BRANCHES = ['ptNF', 'qimean', 'qomean', 'precoilsum']
+
+def Generate(outDir, nFiles=10, nEntries=10000, nDets=5, nBranches=100,
+             fileType='numpy', seed=0):
+    ''' Write a synthetic dataset in the CDMS layout.
+
+        Parameters:
+            outDir: (str) - Directory of the dataset, created.
+            nFiles: (int) - Number of files (series). (optional)
+            nEntries: (int) - Events per file. (optional)
+            nDets: (int) - Number of zip trees, detnums 1101 and up.
+                (optional)
+            nBranches: (int) - Branches per zip tree, each calibzip tree
+                gets half as many. (optional)
+            fileType: (str) - 'numpy' or 'root'. (optional)
+            seed: (int) - Random seed, equal seeds give equal datasets.
+                (optional)
+
+        Returns: fileList
+            fileList: (str) - Text file listing the dataset files, for
+                Start_Session.
+
+        Raises:
+            ValueError: If fileType is unknown.
+    '''
+
+    if fileType not in ('numpy', 'root'):
+        raise ValueError('ERROR in Generate:\n' +
+                         'fileType must be numpy or root!')
+
+    if not os.path.isdir(outDir):
+        os.makedirs(outDir)
+
+    zipBranches = _Names(_ZIP_BRANCHES, nBranches, 'RQ')
+    calibBranches = _Names(_CALIB_BRANCHES, max(nBranches // 2, 1), 'RRQ')
+
+    rs = np.random.RandomState(seed)
+    fNames = []
+    for i in range(nFiles):
+
+        series = 1100000000 + i
+        events = np.arange(nEntries, dtype=np.int64) + 10000 * i
+
+        layout = {'rqDir': {}, 'calibDir': {}, 'infoDir': {}}
+        layout['rqDir']['eventTree'] = {
+            'SeriesNumber': np.full(nEntries, series, dtype=np.int64),
+            'EventNumber': events,
+            'EventTime': np.sort(rs.uniform(0, 3600, nEntries)),
+            'EventCategory': rs.randint(0, 4, nEntries).astype(np.int32)}
+        layout['rqDir']['calibevent'] = {
+            'SeriesNumber': np.full(nEntries, series, dtype=np.int64),
+            'EventNumber': events,
+            'LiveTime': rs.uniform(0, 1, nEntries)}
+        layout['infoDir']['seriesInfo'] = {
+            'SeriesNumber': np.array([series], dtype=np.int64)}
+
+        for det in range(1, nDets + 1):
+            layout['rqDir']['zip' + str(det)] = \
+                dict((name, _Column(rs, name, nEntries))
+                     for name in zipBranches)
+            layout['calibDir']['calibzip' + str(det)] = \
+                dict((name, _Column(rs, name, nEntries))
+                     for name in calibBranches)
+
+        if fileType == 'numpy':
+            fName = os.path.join(outDir, 'series' + str(i) + '.npf')
+            WriteNumpyFile(fName, layout)
+        else:
+            fName = os.path.join(outDir, 'series' + str(i) + '.root')
+            _WriteRoot(fName, layout)
+
+        fNames.append(os.path.abspath(fName))
+
+    fileList = os.path.join(outDir, 'files.txt')
+    with open(fileList, 'w') as f:
+        f.write('\n'.join(fNames) + '\n')
+
+    return fileList
+
+
+def _Names(named, nBranches, prefix):
+    ''' Return nBranches names, the named ones first then numbered ones.'''
+
+    names = named[:nBranches]
+    names += [prefix + '%04d' % i for i in range(nBranches - len(names))]
+    return names
+
+
+def _Column(rs, name, nEntries):
+    ''' Return random values for a branch, energies are exponential and
+        chi-squares are near 1, the rest are normal.
+    '''
+
+    if name == 'PRecoilT':
+        return rs.exponential(20., nEntries)
+    if 'chisq' in name:
+        return rs.gamma(5., 0.2, nEntries)
+    return rs.normal(0., 1., nEntries)
+
+
+def _WriteRoot(fName, layout):
+    ''' Write the layout to a ROOT file with rootpy and root_numpy.'''
+
+    from rootpy.io import root_open
+    from root_numpy import array2tree
+
+    with root_open(fName, 'recreate') as rootFile:
+        for dirName, trees in sorted(layout.iteritems()):
+            rootDir = rootFile.mkdir(dirName)
+            rootDir.cd()
+
+            for treeName, columns in sorted(trees.iteritems()):
+                names = sorted(columns)
+                m = np.empty(len(columns[names[0]]),
+                             dtype=[(name, columns[name].dtype)
+                                    for name in names])
+                for name in names:
+                    m[name] = columns[name]
+
+                tree = array2tree(m, name=treeName)
+                tree.Write()
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Write a synthetic CDMS ' +
+                                     'dataset for the CAPy benchmarks.')
+    parser.add_argument('outDir', help='directory of the dataset')
+    parser.add_argument('--files', type=int, default=10)
+    parser.add_argument('--entries', type=int, default=10000)
+    parser.add_argument('--dets', type=int, default=5)
+    parser.add_argument('--branches', type=int, default=100)
+    parser.add_argument('--type', choices=['numpy', 'root'], default='numpy')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    print Generate(args.outDir, args.files, args.entries, args.dets,
+                   args.branches, args.type, args.seed)
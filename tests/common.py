@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+common.py
+
+Synthetic datasets and session helpers shared by the CAPy tests.
+
+Datasets are written as NumPy files with benchmarks/synthetic.py, so the 
+tests need neither ROOT nor real data.  Run the tests from the checkout:
+
+    python -m unittest discover tests
+
+Classes:
+    SessionTest - Test case with a synthetic dataset and a session on it.
+
+Functions:
+    MakeDataset - Write a small synthetic dataset.
+    Quiet - Silence the progress prints of CAPy.
+
+Created on Sun Oct 18 10:12:31 2026
+
+@author: tdoughty1
+"""
+
+# Import Standard libraries
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from contextlib import contextmanager
+
+# Run from a checkout without installing
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, _ROOT)
+sys.path.insert(0, os.path.join(_ROOT, 'benchmarks'))
+
+# Import CAPy modules
+import CAPy
+import base.CAPy_globals as CAPy_globals
+
+# Import benchmark modules
+from synthetic import Generate
+
+# Detector of the branches read in the tests
+DETNUM = 1101
+
+def MakeDataset(outDir, nFiles=3, nEntries=500, seed=0):
+    ''' Write a small synthetic dataset with two detectors.
+
+        Parameters:
+            outDir: (str) - Directory of the dataset.
+            nFiles: (int) - Number of files. (optional)
+            nEntries: (int) - Events per file. (optional)
+            seed: (int) - Random seed. (optional)
+
+        Returns: fileList
+            fileList: (str) - Text file listing the dataset files.
+    '''
+
+    return Generate(outDir, nFiles, nEntries, nDets=2, nBranches=6, 
+                    seed=seed)
+
+
+@contextmanager
+def Quiet():
+    ''' Silence the progress prints of CAPy.'''
+
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        yield
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+
+class SessionTest(unittest.TestCase):
+    ''' Test case with a synthetic dataset, written once per class, and a 
+        session started on it before every test.
+        
+        Attributes:
+            dataDir: (str) - Directory of the dataset.
+            fileList: (str) - File list of the dataset.
+            fNames: (list) - Files of the dataset.
+            namespace: (dict) - Data functions of the session.
+    '''
+
+    # Keyword arguments of Start_Session
+    session = {}
+
+    @classmethod
+    def setUpClass(cls):
+        cls.dataDir = tempfile.mkdtemp(prefix='CAPytest')
+        cls.fileList = MakeDataset(cls.dataDir)
+        cls.fNames = [line.strip() for line in open(cls.fileList) 
+                      if line.strip()]
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.dataDir)
+
+    def setUp(self):
+        self.namespace = {}
+        with Quiet():
+            CAPy.Start_Session(self.fileList, namespace=self.namespace,
+                               **self.session)
+
+    def tearDown(self):
+        CAPy_globals.CloseReadPool()
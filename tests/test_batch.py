@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+test_batch.py
+
+Tests of the batch runner: shard outputs reduced into one result, finished
+shards kept between runs and failed shards reported.
+
+Created on Mon Oct 19 16:21:33 2026
+
+@author: tdoughty1
+"""
+
+# Import Standard libraries
+import os
+import cPickle
+import unittest
+
+# Import Numerical libraries
+import numpy as np
+
+# Import test helpers, puts the checkout on the path
+import common
+
+# Import CAPy modules
+import CAPy_batch
+import base.CAPy_globals as CAPy_globals
+from base.rootio import Read
+
+# Analysis run on every shard, the data functions are its globals
+_ANALYSIS = '''
+import numpy as np
+
+def Analyze(files):
+    if FAIL in files:
+        raise RuntimeError('Failing on purpose')
+    energy = PRecoilT(1101, None)['PRecoilT']
+    return {'Energy': energy,
+            'Files': len(files),
+            'Hist': np.histogram(energy, 10, (0, 100)),
+            'Per': {'Sum': energy.sum()}}
+'''
+
+class ReduceTest(unittest.TestCase):
+
+    def testReduce(self):
+        edges = np.arange(4.)
+        outputs = [{'a': np.arange(3), 'n': 1, 'l': [1],
+                    'h': (np.array([1, 0, 2]), edges), 'd': {'x': 1.5}},
+                   {'a': np.arange(2), 'n': 2, 'l': [2, 3],
+                    'h': (np.array([0, 1, 1]), edges), 'd': {'x': 1.}},
+                   {'n': 3, 'd': {'y': 2}}]
+        result = CAPy_batch.Reduce(outputs)
+
+        self.assertTrue(np.array_equal(result['a'], [0, 1, 2, 0, 1]))
+        self.assertEqual(result['n'], 6)
+        self.assertEqual(result['l'], [1, 2, 3])
+        self.assertTrue(np.array_equal(result['h'][0], [1, 1, 3]))
+        self.assertTrue(result['h'][1] is edges)
+        self.assertEqual(result['d'], {'x': 2.5, 'y': 2})
+
+    def testErrors(self):
+        self.assertRaises(TypeError, CAPy_batch.Reduce,
+                          [{'h': (np.ones(2), np.arange(3.))},
+                           {'h': (np.ones(2), np.arange(1, 4.))}])
+        self.assertRaises(TypeError, CAPy_batch.Reduce,
+                          [{'s': 'text'}, {'s': 'more'}])
+
+    def testShards(self):
+        fNames = ['f' + str(i) for i in range(10)]
+        shards = CAPy_batch._Shards(fNames, 4)
+        self.assertEqual(sum(shards, []), fNames)
+        self.assertEqual(sorted(len(shard) for shard in shards), 
+                         [2, 2, 3, 3])
+        self.assertEqual(CAPy_batch._Shards(fNames[:2], 4),
+                         [['f0'], ['f1']])
+
+
+class BatchTest(common.SessionTest):
+
+    def _Analysis(self, fail=None):
+        fName = os.path.join(self.dataDir, 
+                             'analysis' + ('Fail' if fail else '') + '.py')
+        with open(fName, 'w') as f:
+            f.write('FAIL = ' + repr(fail) + '\n' + _ANALYSIS)
+        return fName
+
+    def _Run(self, analysis, workDir, **kwargs):
+        output = os.path.join(self.dataDir, 'result.pkl')
+        with common.Quiet():
+            result = CAPy_batch.Run_Batch(self.fileList, analysis, output,
+                                          workDir, nWorkers=2, nShards=3,
+                                          **kwargs)
+        with open(output, 'rb') as f:
+            self.assertEqual(cPickle.load(f).keys(), result.keys())
+        return result
+
+    def _Stamps(self, workDir):
+        return [os.path.getmtime(CAPy_batch._ShardFile(workDir, i))
+                for i in range(3)]
+
+    def testRun(self):
+        workDir = os.path.join(self.dataDir, 'runShards')
+        result = self._Run(self._Analysis(), workDir)
+
+        files, dirName, treeName = CAPy_globals._FileInfo('PRecoilT',
+                                                         common.DETNUM)
+        energy = Read(files, dirName + '/' + treeName,
+                      ['PRecoilT'])['PRecoilT']
+        self.assertTrue(np.array_equal(result['Energy'], energy))
+        self.assertEqual(result['Files'], 3)
+        self.assertTrue(np.array_equal(result['Hist'][0],
+                                       np.histogram(energy, 10, (0, 100))[0]))
+        self.assertTrue(np.allclose(result['Per']['Sum'], energy.sum()))
+
+        # Finished shards are kept, a changed file runs its shard again
+        stamps = self._Stamps(workDir)
+        self._Run(self._Analysis(), workDir)
+        self.assertEqual(self._Stamps(workDir), stamps)
+
+        stat = os.stat(self.fNames[1])
+        os.utime(self.fNames[1], (stat.st_atime, stat.st_mtime + 10))
+        try:
+            rerun = self._Run(self._Analysis(), workDir)
+        finally:
+            os.utime(self.fNames[1], (stat.st_atime, stat.st_mtime))
+        newStamps = self._Stamps(workDir)
+        self.assertEqual([newStamps[0], newStamps[2]],
+                         [stamps[0], stamps[2]])
+        self.assertNotEqual(newStamps[1], stamps[1])
+        self.assertTrue(np.array_equal(rerun['Energy'], energy))
+
+    def testFailed(self):
+        workDir = os.path.join(self.dataDir, 'failShards')
+        analysis = self._Analysis(self.fNames[1])
+        self.assertRaises(RuntimeError, self._Run, analysis, workDir,
+                          retries=1)
+
+        # The other shards finished and the failure is in the log
+        self.assertTrue(os.path.isfile(CAPy_batch._ShardFile(workDir, 0)))
+        self.assertFalse(os.path.isfile(CAPy_batch._ShardFile(workDir, 1)))
+        with open(os.path.join(workDir, 'shard0001.log')) as f:
+            self.assertTrue('Failing on purpose' in f.read())
+
+    def testNoAnalyze(self):
+        fName = os.path.join(self.dataDir, 'empty.py')
+        with open(fName, 'w') as f:
+            f.write('x = 1\n')
+        self.assertRaises(ValueError, self._Run, fName,
+                          os.path.join(self.dataDir, 'emptyShards'))
+
+
+if __name__ == '__main__':
+    unittest.main()
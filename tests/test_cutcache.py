@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+test_cutcache.py
+
+Tests of the CutCache and of lazy cuts kept in it between sessions.
+
+Created on Sun Oct 18 12:20:09 2026
+
+@author: tdoughty1
+"""
+
+# Import Standard libraries
+import os
+import shutil
+import tempfile
+import unittest
+
+# Import Numerical libraries
+import numpy as np
+
+# Import test helpers, puts the checkout on the path
+import common
+
+# Import CAPy modules
+import CAPy
+import base.CAPy_globals as CAPy_globals
+from base.cuts import Cut
+from base.cutcache import CutCache
+from base.datatypes import Data_Function
+from base.rootio import WriteNumpyFile
+
+class CutCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cacheDir = tempfile.mkdtemp(prefix='CAPytest')
+        self.cache = CutCache(self.cacheDir)
+        self.stamps = [('a.npf', 100, 1.0), ('b.npf', 200, 2.0)]
+        self.cut = Cut(np.arange(77) % 3 == 0)
+
+    def tearDown(self):
+        shutil.rmtree(self.cacheDir)
+
+    def testHit(self):
+        key = self.cache.Key('X(1101) < 2', self.stamps)
+        self.assertEqual(self.cache(key), None)
+        
+        self.cache.Put(key, self.cut)
+        self.assertEqual(self.cache(key), self.cut)
+        
+        stats = self.cache.GetStats()
+        self.assertEqual((stats['Hits'], stats['Misses'], stats['Cuts']),
+                         (1, 1, 1))
+
+    def testInvalidation(self):
+        key = self.cache.Key('X(1101) < 2', self.stamps)
+        self.cache.Put(key, self.cut)
+        
+        # Another definition, a changed file or another file set misses
+        changed = [self.stamps[0], ('b.npf', 200, 3.0)]
+        for other in [self.cache.Key('X(1101) < 3', self.stamps),
+                      self.cache.Key('X(1101) < 2', changed),
+                      self.cache.Key('X(1101) < 2', self.stamps[:1])]:
+            self.assertNotEqual(other, key)
+            self.assertEqual(self.cache(other), None)
+        
+        self.cache.Clear()
+        self.assertEqual(self.cache(key), None)
+
+    def testCorrupt(self):
+        key = self.cache.Key('X(1101) < 2', self.stamps)
+        path = os.path.join(self.cacheDir, key + '.npz')
+        
+        self.cache.Put(key, self.cut)
+        with open(path, 'rb') as f:
+            data = f.read()
+        
+        # Truncated, not a cut file at all, and missing the event count
+        for broken in [data[:len(data) // 2], 'not a cut']:
+            with open(path, 'wb') as f:
+                f.write(broken)
+            self.assertEqual(self.cache(key), None)
+            self.assertFalse(os.path.exists(path))
+        
+        np.savez(path, bits=self.cut._bits)
+        self.assertEqual(self.cache(key), None)
+        self.assertFalse(os.path.exists(path))
+        
+        self.assertEqual(self.cache.GetStats()['Misses'], 3)
+
+    def testBudget(self):
+        cache = CutCache(self.cacheDir, maxBytes=0)
+        key = cache.Key('X(1101) < 2', self.stamps)
+        cache.Put(key, self.cut)
+        self.assertEqual(cache(key), None)
+
+
+class LazyCutTest(common.SessionTest):
+
+    def setUp(self):
+        self.cacheDir = tempfile.mkdtemp(prefix='CAPytest')
+        self.session = {'cutCacheDir': self.cacheDir}
+        common.SessionTest.setUp(self)
+
+    def tearDown(self):
+        common.SessionTest.tearDown(self)
+        shutil.rmtree(self.cacheDir)
+
+    def _Evaluate(self):
+        energy = self.namespace['PRecoilT'].Lazy(common.DETNUM)
+        return (energy < 20).Evaluate()
+
+    def testCutFiles(self):
+        # Cut file holding a stored cut branch of detector 1
+        values = CAPy.Load('PRecoilT', common.DETNUM)['PRecoilT']
+        cutFile = os.path.join(self.cacheDir, 'cuts.npf')
+        WriteNumpyFile(cutFile, {'cutDir': {'cutzip1': {'cLow': values < 20}}})
+        
+        def LoadCut():
+            with common.Quiet():
+                CAPy_globals._FileInfo.AddCutFiles(cutFile)
+            return Data_Function('cLow')(common.DETNUM)
+        
+        cut = LoadCut()
+        self.assertEqual(cut, Cut(values < 20))
+        stats = CAPy_globals._CutCache.GetStats()
+        self.assertEqual((stats['Hits'], stats['Cuts']), (0, 1))
+        
+        # Packed mask found by the next session, without reading
+        common.SessionTest.setUp(self)
+        self.assertEqual(LoadCut(), cut)
+        self.assertEqual(CAPy_globals._CutCache.GetStats()['Hits'], 1)
+
+    def testSessions(self):
+        cut = self._Evaluate()
+        values = CAPy.Load('PRecoilT', common.DETNUM)['PRecoilT']
+        self.assertEqual(cut, Cut(values < 20))
+        self.assertEqual(CAPy_globals._CutCache.GetStats()['Misses'], 1)
+        
+        # Found by the next session on the same files
+        common.SessionTest.setUp(self)
+        self.assertEqual(self._Evaluate(), cut)
+        self.assertEqual(CAPy_globals._CutCache.GetStats()['Hits'], 1)
+        
+        # Evaluated again once a file changes
+        stat = os.stat(self.fNames[-1])
+        os.utime(self.fNames[-1], (stat.st_atime, stat.st_mtime + 10))
+        try:
+            common.SessionTest.setUp(self)
+            self.assertEqual(self._Evaluate(), cut)
+            stats = CAPy_globals._CutCache.GetStats()
+            self.assertEqual((stats['Hits'], stats['Misses']), (0, 1))
+        finally:
+            os.utime(self.fNames[-1], (stat.st_atime, stat.st_mtime))
+
+
+if __name__ == '__main__':
+    unittest.main()
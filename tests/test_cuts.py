@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+test_cuts.py
+
+Tests of the packed Cut class and PackChunks.
+
+Created on Sun Oct 18 10:31:06 2026
+
+@author: tdoughty1
+"""
+
+# Import Standard libraries
+import unittest
+
+# Import Numerical libraries
+import numpy as np
+
+# Import test helpers, puts the checkout on the path
+import common
+
+# Import CAPy modules
+from base.cuts import Cut, PackChunks
+
+class CutTest(unittest.TestCase):
+
+    def setUp(self):
+        # Not a multiple of 8, so the last byte is partly used
+        rs = np.random.RandomState(1)
+        self.maskA = rs.uniform(size=1003) < 0.3
+        self.maskB = rs.uniform(size=1003) < 0.6
+        self.cutA = Cut(self.maskA)
+        self.cutB = Cut(self.maskB)
+
+    def testRoundTrip(self):
+        self.assertEqual(len(self.cutA), 1003)
+        self.assertTrue(np.array_equal(self.cutA.GetMask(), self.maskA))
+        self.assertEqual(self.cutA.Passed(), self.maskA.sum())
+
+    def testGetMaskRange(self):
+        for start, stop in [(0, 8), (3, 17), (995, 1003), (500, 500)]:
+            self.assertTrue(np.array_equal(self.cutA.GetMask(start, stop),
+                                           self.maskA[start:stop]))
+
+    def testOperators(self):
+        self.assertTrue(np.array_equal((self.cutA & self.cutB).GetMask(),
+                                       self.maskA & self.maskB))
+        self.assertTrue(np.array_equal((self.cutA | self.cutB).GetMask(),
+                                       self.maskA | self.maskB))
+        self.assertTrue(np.array_equal((self.cutA ^ self.cutB).GetMask(),
+                                       self.maskA ^ self.maskB))
+
+    def testInvert(self):
+        inverted = ~self.cutA
+        self.assertTrue(np.array_equal(inverted.GetMask(), ~self.maskA))
+        
+        # Unused bits stay clear, so counts and comparisons are exact
+        self.assertEqual(inverted.Passed(), (~self.maskA).sum())
+        self.assertEqual(~inverted, self.cutA)
+
+    def testApplyAndSlice(self):
+        values = np.arange(1003)
+        self.assertTrue(np.array_equal(self.cutA.Apply(values),
+                                       values[self.maskA]))
+        self.assertEqual(self.cutA.Slice(100, 300), Cut(self.maskA[100:300]))
+
+    def testMismatch(self):
+        self.assertRaises(ValueError, self.cutA.__and__, Cut(self.maskA[:-1]))
+        self.assertRaises(TypeError, self.cutA.__or__, self.maskB)
+        self.assertRaises(ValueError, self.cutA.Apply, np.arange(10))
+        self.assertRaises(ValueError, Cut, np.zeros((2, 2)))
+
+    def testPackChunks(self):
+        chunks = [self.maskA[:5], self.maskA[5:5], self.maskA[5:400],
+                  self.maskA[400:]]
+        self.assertEqual(PackChunks(chunks), self.cutA)
+        self.assertEqual(len(PackChunks([])), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+test_detectors.py
+
+Tests of loading a branch for several detectors as one detector by event 
+array.
+
+Created on Sun Oct 18 15:11:38 2026
+
+@author: tdoughty1
+"""
+
+# Import Standard libraries
+import unittest
+
+# Import Numerical libraries
+import numpy as np
+
+# Import test helpers, puts the checkout on the path
+import common
+
+# Import CAPy modules
+import base.CAPy_globals as CAPy_globals
+from base.cuts import Cut
+from base.rootio import Read
+
+class DetectorsTest(common.SessionTest):
+
+    def setUp(self):
+        common.SessionTest.setUp(self)
+        self.energy = self.namespace['PRecoilT']
+        
+        fileInfo = CAPy_globals._FileInfo
+        self.rows = []
+        for detnum in [1101, 1102]:
+            files, dirName, treeName = fileInfo('PRecoilT', detnum)
+            self.rows.append(Read(files, dirName + '/' + treeName,
+                                  ['PRecoilT'])['PRecoilT'])
+
+    def testLoad(self):
+        m = self.energy([1101, 1102], None)
+        self.assertEqual(m.shape, (2, 1500))
+        self.assertTrue(np.array_equal(m, np.vstack(self.rows)))
+        self.assertTrue(np.array_equal(self.energy('all', None), m))
+        
+        # Order follows the detnums given
+        self.assertTrue(np.array_equal(self.energy([1102, 1101], None),
+                                       m[::-1]))
+
+    def testCut(self):
+        mask = self.rows[0] > 20
+        m = self.energy([1101, 1102], Cut(mask))
+        self.assertTrue(np.array_equal(m, np.vstack(self.rows)[:, mask]))
+
+    def testCache(self):
+        # One row cached beforehand, the other read
+        self.energy(1102, None)
+        m = self.energy([1101, 1102], None)
+        self.assertTrue(np.array_equal(m, np.vstack(self.rows)))
+        
+        # Cached rows hold their own memory, charged in full
+        cache = CAPy_globals._ArrayCache
+        files = tuple(self.fNames)
+        row = cache(('PRecoilT', 1101, files))
+        self.assertTrue(np.array_equal(row['PRecoilT'], self.rows[0]))
+        self.assertFalse(np.may_share_memory(row, m))
+        self.assertTrue(row.base is None or row.base.nbytes == row.nbytes)
+        
+        # Read from the cache now
+        self.assertTrue(np.array_equal(self.energy([1101, 1102], None), m))
+
+    def testNoDetnums(self):
+        self.assertRaises(ValueError, self.energy, [], None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+test_eventindex.py
+
+Tests of event lookups and joins with EventIndex.
+
+Created on Sun Oct 18 11:58:23 2026
+
+@author: tdoughty1
+"""
+
+# Import Standard libraries
+import os
+import unittest
+
+# Import Numerical libraries
+import numpy as np
+
+# Import test helpers, puts the checkout on the path
+import common
+
+# Import CAPy modules
+import CAPy
+import base.CAPy_globals as CAPy_globals
+from base.eventindex import EventIndex
+from base.fileinfo import FileInfo
+
+class EventIndexTest(common.SessionTest):
+
+    def setUp(self):
+        common.SessionTest.setUp(self)
+        self.index = EventIndex(CAPy_globals._FileInfo)
+        m = CAPy.Load(['SeriesNumber', 'EventNumber'], 1)
+        self.series = m['SeriesNumber']
+        self.events = m['EventNumber']
+
+    def testLookup(self):
+        self.assertEqual(len(self.index), len(self.events))
+        
+        # Entries count from 0 in every file
+        self.assertEqual(self.index(self.series[0], self.events[0]),
+                         (self.fNames[0], 0))
+        self.assertEqual(self.index(self.series[-1], self.events[-1]),
+                         (self.fNames[-1], 499))
+        self.assertEqual(self.index(self.series[0], -1), (None, None))
+        
+        self.assertEqual(self.index.Position(self.series[700], 
+                                             self.events[700]), 700)
+        self.assertEqual(self.index.Position(0, 0), None)
+
+    def testLookupMany(self):
+        positions = np.array([1499, 0, 612, 3])
+        found = self.index.LookupMany(self.series[positions], 
+                                      self.events[positions])
+        self.assertTrue(np.array_equal(found, positions))
+        
+        missing = self.index.LookupMany([self.series[0]], [123456789])
+        self.assertTrue(np.array_equal(missing, [-1]))
+
+    def testJoin(self):
+        positions, otherPositions = self.index.Join(self.index)
+        self.assertTrue(np.array_equal(np.sort(positions), 
+                                       np.arange(len(self.events))))
+        self.assertTrue(np.array_equal(positions, otherPositions))
+        
+        # Index of the last two files only
+        with common.Quiet():
+            other = EventIndex(FileInfo(self.fNames[1:]))
+        positions, otherPositions = self.index.Join(other)
+        order = np.argsort(positions)
+        self.assertTrue(np.array_equal(positions[order], 
+                                       np.arange(500, 1500)))
+        self.assertTrue(np.array_equal(otherPositions[order], 
+                                       np.arange(1000)))
+        
+        positions, otherPositions = other.Join(self.index)
+        self.assertTrue(np.array_equal(otherPositions - positions, 
+                                       np.full(1000, 500)))
+
+    def testBranchFiles(self):
+        # Arrays of a branch held by the last two files only
+        files = self.fNames[1:]
+        positions = np.array([0, 499, 500, 1499])
+        found = self.index.LookupMany(self.series[positions], 
+                                      self.events[positions], files)
+        self.assertTrue(np.array_equal(found, [-1, -1, 0, 999]))
+        self.assertEqual(self.index.Position(self.series[600], 
+                                             self.events[600], files), 100)
+        
+        positions, otherPositions = self.index.Join(self.index, 
+                                                    otherFiles=files)
+        self.assertTrue(np.array_equal(positions - otherPositions, 
+                                       np.full(1000, 500)))
+        
+        self.assertRaises(ValueError, self.index.LookupMany, [0], [0], 
+                          ['missing.npf'])
+
+    def testSave(self):
+        indexFile = os.path.join(self.dataDir, 'index.npz')
+        EventIndex(CAPy_globals._FileInfo, indexFile=indexFile)
+        self.assertTrue(os.path.isfile(indexFile))
+        
+        loaded = EventIndex(CAPy_globals._FileInfo, indexFile=indexFile)
+        self.assertEqual(loaded.GetFiles(), self.fNames)
+        self.assertTrue(np.array_equal(loaded.Join(self.index)[0],
+                                       self.index.Join(self.index)[0]))
+        os.remove(indexFile)
+
+    def testFileType(self):
+        self.assertRaises(ValueError, EventIndex, CAPy_globals._FileInfo, 
+                          'Other')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+test_expression.py
+
+Tests that lazy expressions evaluate to the same values and cuts as NumPy on
+the loaded arrays.
+
+Created on Mon Oct 19 14:37:19 2026
+
+@author: tdoughty1
+"""
+
+# Import Standard libraries
+import unittest
+
+# Import Numerical libraries
+import numpy as np
+
+# Import test helpers, puts the checkout on the path
+import common
+
+# Import CAPy modules
+import CAPy
+from base.cuts import Cut
+from base.expression import Expr, Branch
+
+class ExpressionTest(common.SessionTest):
+
+    def setUp(self):
+        common.SessionTest.setUp(self)
+        self.energy = self.namespace['PRecoilT'].Lazy(common.DETNUM)
+        self.chisq = self.namespace['PTNFchisq'].Lazy(common.DETNUM)
+        self.energyValues = self.namespace['PRecoilT'](common.DETNUM,
+                                                       None)['PRecoilT']
+        self.chisqValues = self.namespace['PTNFchisq'](common.DETNUM,
+                                                       None)['PTNFchisq']
+
+    def _CheckEqual(self, expr, expected, cut=None):
+        values = expr.Evaluate(cut, chunkSize=128)
+        self.assertEqual(len(values), len(expected))
+        self.assertTrue(np.allclose(values, expected))
+
+    def testArithmetic(self):
+        energy, chisq = self.energy, self.chisq
+        e, c = self.energyValues, self.chisqValues
+
+        self._CheckEqual(chisq / energy, c / e)
+        self._CheckEqual(2 * energy - chisq**2 + 1, 2 * e - c**2 + 1)
+        self._CheckEqual(abs(-energy) / 3 + 1 / chisq, abs(-e) / 3 + 1 / c)
+        self._CheckEqual(CAPy.Func(np.sqrt, energy) * chisq, np.sqrt(e) * c)
+        self.assertEqual(energy.GetBranches(), [('PRecoilT', common.DETNUM)])
+        self.assertEqual((chisq / energy + chisq).GetBranches(),
+                         [('PTNFchisq', common.DETNUM),
+                          ('PRecoilT', common.DETNUM)])
+
+    def testCut(self):
+        mask = self.energyValues > 20
+        self._CheckEqual(self.chisq / self.energy,
+                         (self.chisqValues / self.energyValues)[mask],
+                         Cut(mask))
+
+    def testComparisons(self):
+        energy, chisq = self.energy, self.chisq
+        e, c = self.energyValues, self.chisqValues
+
+        for expr, expected in [(energy < 20, e < 20),
+                               (5 <= energy, 5 <= e),
+                               ((energy > 10) & (chisq < 1),
+                                (e > 10) & (c < 1)),
+                               ((energy > 50) | ~(chisq < 1.5),
+                                (e > 50) | ~(c < 1.5)),
+                               ((energy > 10) ^ (chisq > 1),
+                                (e > 10) ^ (c > 1)),
+                               (chisq / energy != 0.1, c / e != 0.1)]:
+            self.assertTrue(expr.IsBool())
+            cut = expr.Evaluate(chunkSize=100)
+            self.assertTrue(isinstance(cut, Cut))
+            self.assertTrue(np.array_equal(cut.GetMask(), expected))
+
+        # Boolean results are and'ed with a given cut
+        mask = c < 1
+        cut = (energy < 20).Evaluate(Cut(mask))
+        self.assertTrue(np.array_equal(cut.GetMask(), (e < 20) & mask))
+
+    def testErrors(self):
+        self.assertFalse(self.energy.IsBool())
+        self.assertRaises(TypeError, bool, self.energy < 20)
+        self.assertRaises(ValueError, (Expr() + 1).Evaluate)
+
+        # General and detector branches come from different trees but the
+        # same files, a branch missing from the files can't be read
+        events = self.namespace['EventNumber'].Lazy()
+        self._CheckEqual(self.energy + 0 * events, self.energyValues)
+        self.assertRaises(ValueError,
+                          (self.energy + Branch('NoRQ', 1)).Evaluate)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+test_fileinfo.py
+
+Tests of adding and merging file maps in FileInfo, the map cache and the 
+rollback of files with a conflicting layout.
+
+Created on Sun Oct 18 11:05:17 2026
+
+@author: tdoughty1
+"""
+
+# Import Standard libraries
+import os
+import shutil
+import tempfile
+import unittest
+
+# Import Numerical libraries
+import numpy as np
+
+# Import test helpers, puts the checkout on the path
+import common
+
+# Import CAPy modules
+from base import fileinfo
+from base.fileinfo import FileInfo
+from base.rootio import WriteNumpyFile
+
+class FileInfoTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.dataDir = tempfile.mkdtemp(prefix='CAPytest')
+        fileList = common.MakeDataset(cls.dataDir)
+        cls.fNames = [line.strip() for line in open(fileList) 
+                      if line.strip()]
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.dataDir)
+
+    def setUp(self):
+        # FileInfo prints every file it maps
+        self._quiet = common.Quiet()
+        self._quiet.__enter__()
+
+    def tearDown(self):
+        self._quiet.__exit__(None, None, None)
+
+    def _Layout(self, fileInfo):
+        ''' Return the files, directory and tree of every branch/detnum.'''
+        
+        layout = {}
+        for name in fileInfo.GetDataNames():
+            for detnum in fileInfo.GetBranchDetnums(name):
+                layout[(name, detnum)] = fileInfo(name, detnum)
+        return layout
+
+    def testAdd(self):
+        whole = FileInfo(self.fNames)
+        parts = FileInfo(self.fNames[:1])
+        parts.AddDataFiles(self.fNames[1:])
+        
+        self.assertEqual(parts.GetDataFiles(), self.fNames)
+        self.assertEqual(parts.GetDetnums(), whole.GetDetnums())
+        self.assertEqual(self._Layout(parts), self._Layout(whole))
+        
+        files, dirName, treeName = whole('PRecoilT', common.DETNUM)
+        self.assertEqual(files, self.fNames)
+        self.assertEqual((dirName, treeName), ('rqDir', 'zip1'))
+        self.assertEqual(whole.GetEntries(files[0], dirName, treeName), 500)
+
+    def testMerge(self):
+        values = np.arange(5.)
+        extra = os.path.join(self.dataDir, 'extra.npf')
+        WriteNumpyFile(extra, {'rqDir': {'zip1': {'PRecoilT': values,
+                                                  'NewRQ': values}}})
+        
+        fileInfo = FileInfo(self.fNames)
+        fileInfo.AddDataFiles(extra)
+        
+        # Shared branches span both layouts, new branches only their file
+        self.assertEqual(fileInfo('PRecoilT', common.DETNUM)[0], 
+                         self.fNames + [extra])
+        self.assertEqual(fileInfo('NewRQ', common.DETNUM)[0], [extra])
+        self.assertEqual(fileInfo('PTNFchisq', common.DETNUM)[0], 
+                         self.fNames)
+
+    def testCache(self):
+        cacheFile = os.path.join(self.dataDir, 'maps.pkl')
+        scanned = FileInfo(self.fNames, cacheFile=cacheFile)
+        self.assertTrue(os.path.isfile(cacheFile))
+        
+        # Unchanged files are never scanned again
+        scanFile = fileinfo._ScanFile
+        def NoScan(*args, **kwargs):
+            raise AssertionError('File scanned despite cache!')
+        fileinfo._ScanFile = NoScan
+        try:
+            cached = FileInfo(self.fNames, cacheFile=cacheFile)
+        finally:
+            fileinfo._ScanFile = scanFile
+        
+        self.assertEqual(self._Layout(cached), self._Layout(scanned))
+        for fName in self.fNames:
+            self.assertEqual(cached.GetFileMap(fName), 
+                             scanned.GetFileMap(fName))
+        
+        # A changed file is scanned
+        stat = os.stat(self.fNames[0])
+        os.utime(self.fNames[0], (stat.st_atime, stat.st_mtime + 10))
+        fileinfo._ScanFile = NoScan
+        try:
+            self.assertRaises(AssertionError, FileInfo, self.fNames, 
+                              cacheFile=cacheFile)
+        finally:
+            fileinfo._ScanFile = scanFile
+            os.utime(self.fNames[0], (stat.st_atime, stat.st_mtime))
+
+    def testCacheUnchanged(self):
+        cacheFile = os.path.join(self.dataDir, 'unchanged.pkl')
+        fileInfo = FileInfo(self.fNames[:1], cacheFile=cacheFile)
+        
+        # Nothing new to store once every map came from the cache
+        saveCache = FileInfo.SaveCache
+        def NoSave(*args, **kwargs):
+            raise AssertionError('Cache written without new maps!')
+        FileInfo.SaveCache = NoSave
+        try:
+            fileInfo.AddDataFiles(self.fNames[:1])
+            FileInfo(self.fNames[:1], cacheFile=cacheFile)
+            self.assertRaises(AssertionError, fileInfo.AddDataFiles, 
+                              self.fNames)
+        finally:
+            FileInfo.SaveCache = saveCache
+        
+        # Files repeated in and across calls are added once
+        fileInfo = FileInfo(self.fNames[:1] * 2)
+        fileInfo.AddDataFiles(self.fNames + self.fNames[1:])
+        self.assertEqual(fileInfo.GetDataFiles(), self.fNames)
+
+    def testLayoutRollback(self):
+        values = np.arange(5.)
+        
+        # PRecoilT of detector 1 in another tree than the dataset
+        bad = os.path.join(self.dataDir, 'bad.npf')
+        WriteNumpyFile(bad, {'rqDir': {'zip1': {'BadRQ': values}},
+                             'calibDir': {'zip1': {'PRecoilT': values}}})
+        
+        fileInfo = FileInfo(self.fNames)
+        before = self._Layout(fileInfo)
+        names = fileInfo.GetDataNames()
+        
+        self.assertRaises(ValueError, fileInfo.AddDataFiles, bad)
+        
+        self.assertEqual(fileInfo.GetDataFiles(), self.fNames)
+        self.assertEqual(fileInfo.GetDataNames(), names)
+        self.assertEqual(self._Layout(fileInfo), before)
+        
+        # Still accepts good files after the failure
+        good = os.path.join(self.dataDir, 'good.npf')
+        WriteNumpyFile(good, {'rqDir': {'zip1': {'PRecoilT': values}}})
+        fileInfo.AddDataFiles(good)
+        self.assertEqual(fileInfo('PRecoilT', common.DETNUM)[0], 
+                         self.fNames + [good])
+
+
+if __name__ == '__main__':
+    unittest.main()
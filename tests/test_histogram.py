@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+test_histogram.py
+
+Tests that Hist and Hist2D match NumPy histograms of the loaded arrays,
+filled in the session process or by the session read workers.
+
+Created on Mon Oct 19 11:08:52 2026
+
+@author: tdoughty1
+"""
+
+# Import Standard libraries
+import unittest
+
+# Import Numerical libraries
+import numpy as np
+
+# Import test helpers, puts the checkout on the path
+import common
+
+# Import CAPy modules
+import CAPy
+import base.CAPy_globals as CAPy_globals
+from base.cuts import Cut
+
+class HistTest(common.SessionTest):
+
+    def setUp(self):
+        common.SessionTest.setUp(self)
+        self.energy = self.namespace['PRecoilT']
+        self.chisq = self.namespace['PTNFchisq']
+        self.energyValues = self.energy(common.DETNUM, None)['PRecoilT']
+        self.chisqValues = self.chisq(common.DETNUM, None)['PTNFchisq']
+
+        rs = np.random.RandomState(3)
+        self.mask = rs.uniform(size=len(self.energyValues)) < 0.5
+
+    def _CheckHist(self, nWorkers=None):
+        counts, edges = CAPy.Hist(self.energy, common.DETNUM, bins=20,
+                                  range=(0, 100), chunkSize=128,
+                                  nWorkers=nWorkers)
+        expected = np.histogram(self.energyValues, 20, (0, 100))
+        self.assertTrue(np.array_equal(counts, expected[0]))
+        self.assertTrue(np.allclose(edges, expected[1]))
+
+        # Cut split between the files
+        counts, edges = CAPy.Hist(self.energy, common.DETNUM, Cut(self.mask),
+                                  bins=20, range=(0, 100), chunkSize=128,
+                                  nWorkers=nWorkers)
+        expected = np.histogram(self.energyValues[self.mask], 20, (0, 100))
+        self.assertTrue(np.array_equal(counts, expected[0]))
+
+        # Expression with the range found from the data
+        ratio = self.chisq.Lazy(common.DETNUM) / \
+            self.energy.Lazy(common.DETNUM)
+        counts, edges = CAPy.Hist(ratio, bins=15, chunkSize=128,
+                                  nWorkers=nWorkers)
+        expected = np.histogram(self.chisqValues / self.energyValues, 15)
+        self.assertTrue(np.array_equal(counts, expected[0]))
+        self.assertTrue(np.allclose(edges, expected[1]))
+
+        counts, xedges, yedges = CAPy.Hist2D(
+            self.energy, self.chisq, common.DETNUM, bins=(10, 5),
+            range=[(0, 100), (0, 3)], chunkSize=128, nWorkers=nWorkers)
+        expected = np.histogram2d(self.energyValues, self.chisqValues,
+                                  (10, 5), [(0, 100), (0, 3)])
+        self.assertTrue(np.array_equal(counts, expected[0]))
+
+    def testSerial(self):
+        self._CheckHist(1)
+        self.assertEqual(CAPy_globals._ReadPool, None)
+
+    def testParallel(self):
+        CAPy_globals.SetReadWorkers(2)
+        self._CheckHist()
+
+        # Every fill ran on the one session pool
+        pool = CAPy_globals._ReadPool
+        self.assertNotEqual(pool, None)
+        self._CheckHist()
+        self.assertTrue(CAPy_globals._ReadPool is pool)
+
+        # Python functions can't reach the workers, filled here instead
+        square = CAPy.Func(lambda x: x * x, self.energy.Lazy(common.DETNUM))
+        counts, edges = CAPy.Hist(square, bins=10, range=(0, 1000))
+        expected = np.histogram(self.energyValues**2, 10, (0, 1000))
+        self.assertTrue(np.array_equal(counts, expected[0]))
+
+
+if __name__ == '__main__':
+    unittest.main()
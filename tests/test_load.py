@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+test_load.py
+
+Tests that data functions, Load and Iterate return the same arrays, read in
+the session process or by read workers.
+
+Created on Sun Oct 18 11:36:40 2026
+
+@author: tdoughty1
+"""
+
+# Import Standard libraries
+import tempfile
+import unittest
+
+# Import Numerical libraries
+import numpy as np
+
+# Import test helpers, puts the checkout on the path
+import common
+
+# Import CAPy modules
+import CAPy
+import base.CAPy_globals as CAPy_globals
+from base import datatypes
+from base.cuts import Cut
+from base import rootio
+from base.rootio import Read
+
+# Branches of one zip tree and a general branch
+_NAMES = ['PRecoilT', 'PTNFchisq', 'QIMean', 'EventTime']
+
+class LoadTest(common.SessionTest):
+
+    def setUp(self):
+        common.SessionTest.setUp(self)
+        
+        # Expected values straight from the files
+        self.expected = {}
+        for name in _NAMES:
+            files, dirName, treeName = CAPy_globals._FileInfo(
+                name, 1 if CAPy_globals.IsGeneral(name) else common.DETNUM)
+            self.expected[name] = Read(files, dirName + '/' + treeName, 
+                                       [name])[name]
+        
+        rs = np.random.RandomState(5)
+        self.mask = rs.uniform(size=len(self.expected['PRecoilT'])) < 0.4
+
+    def _CheckLoad(self):
+        m = CAPy.Load(_NAMES, common.DETNUM)
+        for name in _NAMES:
+            self.assertTrue(np.array_equal(m[name], self.expected[name]))
+        
+        CAPy_globals.ClearCache()
+        m = CAPy.Load(_NAMES, common.DETNUM, Cut(self.mask))
+        for name in _NAMES:
+            self.assertTrue(np.array_equal(m[name], 
+                                           self.expected[name][self.mask]))
+        
+        CAPy_globals.ClearCache()
+        m = self.namespace['PRecoilT'](common.DETNUM, None)
+        self.assertTrue(np.array_equal(m['PRecoilT'], 
+                                       self.expected['PRecoilT']))
+
+    def _CheckIterate(self):
+        for cut, mask in [(None, slice(None)), (Cut(self.mask), self.mask)]:
+            chunks = list(CAPy.Iterate(_NAMES, common.DETNUM, cut, 
+                                       chunkSize=128))
+            for name in _NAMES:
+                self.assertTrue(np.array_equal(
+                    np.concatenate([chunk[name] for chunk in chunks]),
+                    self.expected[name][mask]))
+
+    def testSerial(self):
+        self._CheckLoad()
+        self._CheckIterate()
+
+    def testParallel(self):
+        CAPy_globals.SetReadWorkers(2)
+        CAPy_globals.ClearCache()
+        
+        # Small enough for the read workers
+        minEntries = datatypes._MIN_PARALLEL_ENTRIES
+        datatypes._MIN_PARALLEL_ENTRIES = 0
+        try:
+            self._CheckLoad()
+            self.assertNotEqual(CAPy_globals._ReadPool, None)
+            self._CheckIterate()
+        finally:
+            datatypes._MIN_PARALLEL_ENTRIES = minEntries
+
+    def testParallelDirs(self):
+        CAPy_globals.SetReadWorkers(2)
+        
+        minEntries = datatypes._MIN_PARALLEL_ENTRIES
+        readDirs = datatypes._READ_DIRS
+        datatypes._MIN_PARALLEL_ENTRIES = 0
+        try:
+            # No room anywhere reads in the session process
+            datatypes._READ_DIRS = []
+            CAPy_globals.ClearCache()
+            self._CheckLoad()
+            self.assertEqual(CAPy_globals._ReadPool, None)
+            
+            # Output on disk stays mapped
+            datatypes._READ_DIRS = [tempfile.gettempdir()]
+            CAPy_globals.ClearCache()
+            self._CheckLoad()
+            self.assertNotEqual(CAPy_globals._ReadPool, None)
+        finally:
+            datatypes._MIN_PARALLEL_ENTRIES = minEntries
+            datatypes._READ_DIRS = readDirs
+
+    def testIterateOpens(self):
+        
+        # Count the columns mapped, once per file and branch
+        column = rootio._Column
+        opened = []
+        def CountColumn(treePath, branch):
+            opened.append((treePath, branch))
+            return column(treePath, branch)
+        rootio._Column = CountColumn
+        try:
+            self._CheckIterate()
+        finally:
+            rootio._Column = column
+        self.assertEqual(len(opened), 2 * len(self.fNames) * len(_NAMES))
+        self.assertEqual(len(set(opened)), len(self.fNames) * len(_NAMES))
+        
+        # Chunks of one file from a single mapping
+        chunks = list(rootio.ReadChunks(self.fNames[0], 'rqDir/zip1', 
+                                        ['PRecoilT'], 200))
+        self.assertEqual([len(chunk) for chunk in chunks], [200, 200, 100])
+        self.assertTrue(np.array_equal(np.concatenate(chunks)['PRecoilT'],
+                                       self.expected['PRecoilT'][:500]))
+        
+        # Stopping early closes the trees
+        chunks = CAPy.Iterate(_NAMES, common.DETNUM, chunkSize=128)
+        self.assertEqual(len(chunks.next()['PRecoilT']), 128)
+        chunks.close()
+
+    def testIterateCutLength(self):
+        chunks = CAPy.Iterate(_NAMES, common.DETNUM, Cut(self.mask[:-1]))
+        self.assertRaises(ValueError, list, chunks)
+
+
+if __name__ == '__main__':
+    unittest.main()
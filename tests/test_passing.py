@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+test_passing.py
+
+Tests of reading only the entries passing a cut, against applying the cut to
+the full arrays.
+
+Created on Sun Oct 18 10:48:52 2026
+
+@author: tdoughty1
+"""
+
+# Import Standard libraries
+import unittest
+
+# Import Numerical libraries
+import numpy as np
+
+# Import test helpers, puts the checkout on the path
+import common
+
+# Import CAPy modules
+import CAPy
+import base.CAPy_globals as CAPy_globals
+from base import rootio
+from base.cuts import Cut
+from base.datatypes import _ReadPassing
+
+class RangesTest(unittest.TestCase):
+
+    def testRanges(self):
+        rs = np.random.RandomState(2)
+        index = np.sort(rs.choice(10000, 300, replace=False))
+        
+        for gap in [1, 16, 100]:
+            ranges = rootio._Ranges(index, gap)
+            
+            # Every entry in exactly one range, ranges split at large gaps
+            covered = np.concatenate([index[(index >= start) & 
+                                            (index < stop)]
+                                      for start, stop in ranges])
+            self.assertTrue(np.array_equal(covered, index))
+            for (start, stop), (nextStart, nextStop) in zip(ranges, 
+                                                            ranges[1:]):
+                self.assertTrue(nextStart - (stop - 1) > gap)
+
+    def testReadRanges(self):
+        values = np.arange(5000) * 3
+        reads = []
+        
+        def Read(start, stop):
+            reads.append((start, stop))
+            return values[start:stop]
+        
+        rs = np.random.RandomState(3)
+        for nChosen in [0, 5, 50, 3000]:
+            index = np.sort(rs.choice(5000, nChosen, replace=False))
+            del reads[:]
+            m = rootio._ReadRanges(Read, index, 100)
+            self.assertTrue(np.array_equal(m, values[index]))
+            
+            # Dense selections are read at once
+            if nChosen == 3000:
+                self.assertEqual(len(reads), 1)
+
+
+class ReadPassingTest(common.SessionTest):
+
+    def setUp(self):
+        common.SessionTest.setUp(self)
+        fileInfo = CAPy_globals._FileInfo
+        self.files, self.dirName, self.treeName = \
+            fileInfo('PRecoilT', common.DETNUM)
+        self.branches = ['PRecoilT', 'PTNFchisq']
+        self.full = CAPy.Load(self.branches, common.DETNUM)
+
+    def _Check(self, mask):
+        m = _ReadPassing(self.files, self.dirName, self.treeName, 
+                         self.branches, Cut(mask))
+        for name in self.branches:
+            self.assertTrue(np.array_equal(m[name], self.full[name][mask]))
+
+    def testSparse(self):
+        mask = np.zeros(len(self.full['PRecoilT']), dtype=bool)
+        mask[[0, 7, 499, 500, 1200, 1499]] = True
+        self._Check(mask)
+
+    def testDense(self):
+        rs = np.random.RandomState(4)
+        self._Check(rs.uniform(size=len(self.full['PRecoilT'])) < 0.5)
+
+    def testNonePassing(self):
+        self._Check(np.zeros(len(self.full['PRecoilT']), dtype=bool))
+
+    def testWrongLength(self):
+        self.assertRaises(ValueError, _ReadPassing, self.files, self.dirName,
+                          self.treeName, self.branches, Cut(np.ones(10)))
+
+    def testLoad(self):
+        mask = np.zeros(len(self.full['PRecoilT']), dtype=bool)
+        mask[3::400] = True
+        CAPy_globals.ClearCache()
+        m = CAPy.Load(self.branches, common.DETNUM, Cut(mask))
+        for name in self.branches:
+            self.assertTrue(np.array_equal(m[name], self.full[name][mask]))
+
+
+if __name__ == '__main__':
+    unittest.main()
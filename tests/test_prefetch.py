@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+test_prefetch.py
+
+Tests of the background prefetcher and its pauses around session reads.
+
+Created on Mon Oct 19 13:26:05 2026
+
+@author: tdoughty1
+"""
+
+# Import Standard libraries
+import time
+import unittest
+
+# Import Numerical libraries
+import numpy as np
+
+# Import test helpers, puts the checkout on the path
+import common
+
+# Import CAPy modules
+import base.CAPy_globals as CAPy_globals
+from base.rootio import Read
+
+# Seconds to wait for the background thread
+_TIMEOUT = 10.
+
+class PrefetchTest(common.SessionTest):
+
+    session = {'prefetch': 0.5}
+
+    def setUp(self):
+        common.SessionTest.setUp(self)
+        self.prefetcher = CAPy_globals._Prefetcher
+        self.cache = CAPy_globals._ArrayCache
+
+    def tearDown(self):
+        CAPy_globals.SetPrefetch(0)
+        common.SessionTest.tearDown(self)
+
+    def _Key(self, name, detnum):
+        return (name, detnum, tuple(CAPy_globals._FileInfo(name, detnum)[0]))
+
+    def _WaitFor(self, key):
+        end = time.time() + _TIMEOUT
+        while key not in self.cache and time.time() < end:
+            time.sleep(0.01)
+        return key in self.cache
+
+    def testNextDetector(self):
+        energy = self.namespace['PRecoilT']
+        energy(1101, None)
+
+        # Same branch for the next detector is read in the background
+        key = self._Key('PRecoilT', 1102)
+        self.assertTrue(self._WaitFor(key))
+        self.assertTrue(self.cache.GetPrefetchedBytes() > 0)
+
+        files, dirName, treeName = CAPy_globals._FileInfo('PRecoilT', 1102)
+        expected = Read(files, dirName + '/' + treeName, ['PRecoilT'])
+        self.assertTrue(np.array_equal(energy(1102, None), expected))
+
+    def testSiblings(self):
+        self.namespace['PTNFchisq'](1101, None)
+        self.namespace['PRecoilT'](1101, None)
+
+        # Recently used branch of the same tree for the next detector
+        self.assertTrue(self._WaitFor(self._Key('PTNFchisq', 1102)))
+
+    def testPaused(self):
+        prefetcher = self.prefetcher
+
+        # Nested pauses hold reads back until the last resume
+        with CAPy_globals.Foreground():
+            with CAPy_globals.Foreground():
+                self.assertEqual(prefetcher._pauses, 2)
+            self.assertEqual(prefetcher._pauses, 1)
+            self.namespace['PRecoilT'](1101, None)
+            self.assertEqual(prefetcher._pauses, 1)
+            time.sleep(0.05)
+            self.assertFalse(self._Key('PRecoilT', 1102) in self.cache)
+        self.assertEqual(prefetcher._pauses, 0)
+        self.assertTrue(self._WaitFor(self._Key('PRecoilT', 1102)))
+
+        # Pauses of forked processes leave the session thread alone
+        pid = prefetcher._pid
+        prefetcher._pid = -1
+        try:
+            prefetcher.Pause()
+            self.assertEqual(prefetcher._pauses, 0)
+        finally:
+            prefetcher._pid = pid
+
+    def testStop(self):
+        self.namespace['PRecoilT'](1101, None)
+        thread = self.prefetcher._thread
+        self.assertNotEqual(thread, None)
+
+        CAPy_globals.SetPrefetch(0)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(CAPy_globals._Prefetcher, None)
+
+        # Reads go on without a prefetcher
+        with CAPy_globals.Foreground():
+            self.namespace['PRecoilT'](1102, None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+test_profiler.py
+
+Tests that a session profiler records the reads of data functions, Iterate,
+histograms and expressions, and hands every record to its hooks.
+
+Created on Mon Oct 19 15:48:51 2026
+
+@author: tdoughty1
+"""
+
+# Import Standard libraries
+import os
+import json
+import unittest
+
+# Import test helpers, puts the checkout on the path
+import common
+
+# Import CAPy modules
+import CAPy
+import base.CAPy_globals as CAPy_globals
+from base.profiler import Profiler
+
+class ProfilerTest(common.SessionTest):
+
+    def setUp(self):
+        common.SessionTest.setUp(self)
+        self.records = []
+        CAPy.Start_Profile(self.records.append)
+
+    def tearDown(self):
+        CAPy.Stop_Profile()
+        common.SessionTest.tearDown(self)
+
+    def _Stat(self, name, detnum):
+        for stat in CAPy_globals._Profiler.GetStats():
+            if (stat['Name'], stat['Detnum']) == (name, detnum):
+                return stat
+        return None
+
+    def testLoad(self):
+        energy = self.namespace['PRecoilT']
+        energy(common.DETNUM, None)
+        energy(common.DETNUM, None)
+
+        # Read once, then from the cache
+        stat = self._Stat('PRecoilT', common.DETNUM)
+        self.assertEqual(stat['Calls'], 2)
+        self.assertEqual(stat['Sources'], {'Read': 1, 'Cache': 1})
+        self.assertEqual(stat['Hits'], 1)
+        self.assertEqual(stat['Entries'], 1500)
+        self.assertEqual(stat['Bytes'], 1500 * 8)
+        self.assertEqual(stat['Files'], 3)
+        self.assertTrue(stat['Seconds'] >= stat['ReadSeconds'] > 0)
+
+        # Hooks get every call
+        self.assertEqual(len(self.records), 2)
+        for record in self.records:
+            self.assertEqual((record['Name'], record['Detnum']),
+                             ('PRecoilT', common.DETNUM))
+            self.assertTrue('Time' in record and 'Seconds' in record)
+
+    def testPaths(self):
+        list(CAPy.Iterate(['PTNFchisq'], common.DETNUM,
+                          chunkSize=128))
+        stat = self._Stat('PTNFchisq', common.DETNUM)
+        self.assertEqual(stat['Entries'], 1500)
+        self.assertEqual(stat['Files'], 3)
+        self.assertEqual(stat['Sources'], {'Read': 1})
+
+        CAPy.Hist(self.namespace['QIMean'], common.DETNUM, bins=10,
+                  range=(-3, 3))
+        self.assertEqual(self._Stat('QIMean', common.DETNUM)['Entries'],
+                         1500)
+        self.assertEqual(self._Stat('Fill Hist', None)['Calls'], 1)
+
+        lazy = self.namespace['QOFchisq'].Lazy(common.DETNUM)
+        (lazy < 1).Evaluate()
+        self.assertEqual(self._Stat('Evaluate Cut', None)['Calls'], 1)
+
+        names = set(record['Name'] for record in self.records)
+        self.assertTrue(set(['PTNFchisq', 'QIMean', 'Fill Hist',
+                             'QOFchisq', 'Evaluate Cut']).issubset(names))
+
+    def testReport(self):
+        self.namespace['PRecoilT'](common.DETNUM, None)
+
+        report = CAPy_globals._Profiler.Report()
+        self.assertTrue('Top by time' in report and 'Top by bytes' in report)
+        self.assertTrue('PRecoilT' in report)
+
+        fName = os.path.join(self.dataDir, 'profile.json')
+        with common.Quiet():
+            CAPy.Profile_Report(fileName=fName)
+        with open(fName) as f:
+            exported = json.load(f)
+        self.assertEqual([stat['Name'] for stat in exported['Stats']],
+                         ['PRecoilT'])
+        os.remove(fName)
+
+        # Reset drops counts and keeps hooks
+        profiler = CAPy_globals._Profiler
+        profiler.Reset()
+        self.assertEqual(profiler.GetStats(), [])
+        profiler.Record('Step', None, Seconds=1.)
+        self.assertEqual(self.records[-1]['Name'], 'Step')
+
+    def testHooks(self):
+        profiler = Profiler()
+        records = []
+        profiler.AddHook(records.append)
+        profiler.Record('Map Data', None, Seconds=0.5, Files=2)
+        profiler.RemoveHook(records.append)
+        profiler.Record('Map Data', None, Seconds=0.5, Files=2)
+
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0]['Files'], 2)
+        stat = profiler.GetStats()[0]
+        self.assertEqual((stat['Calls'], stat['Seconds'], stat['Files']),
+                         (2, 1., 4))
+
+
+if __name__ == '__main__':
+    unittest.main()
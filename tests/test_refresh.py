@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+test_refresh.py
+
+Tests of Refresh_Session adding files appended to the session file list.
+
+Created on Mon Oct 19 14:02:44 2026
+
+@author: tdoughty1
+"""
+
+# Import Standard libraries
+import os
+import unittest
+
+# Import Numerical libraries
+import numpy as np
+
+# Import test helpers, puts the checkout on the path
+import common
+
+# Import CAPy modules
+import CAPy
+import base.CAPy_globals as CAPy_globals
+from base.rootio import Read, WriteNumpyFile
+
+class RefreshTest(common.SessionTest):
+
+    def setUp(self):
+        # Session starts on the first two files, the third is appended
+        self.fileList = os.path.join(self.dataDir, 'refresh.txt')
+        self._WriteList(self.fNames[:2])
+        common.SessionTest.setUp(self)
+
+    def _WriteList(self, fNames):
+        with open(self.fileList, 'w') as f:
+            f.write('\n'.join(fNames) + '\n')
+
+    def _Refresh(self):
+        with common.Quiet():
+            CAPy.Refresh_Session()
+
+    def _Expected(self, name, fNames):
+        files, dirName, treeName = CAPy_globals._FileInfo(name,
+                                                         common.DETNUM)
+        self.assertEqual(files, fNames)
+        return Read(files, dirName + '/' + treeName, [name])[name]
+
+    def testAppend(self):
+        energy = self.namespace['PRecoilT']
+        before = energy(common.DETNUM, None)
+        self.assertEqual(len(before), 1000)
+
+        self._WriteList(self.fNames)
+        self._Refresh()
+        self.assertEqual(CAPy_globals._FileInfo.GetDataFiles(), self.fNames)
+
+        # Cached array extended with the new file, not read again
+        key = ('PRecoilT', common.DETNUM, tuple(self.fNames))
+        self.assertTrue(key in CAPy_globals._ArrayCache)
+        self.assertTrue(np.array_equal(energy(common.DETNUM,
+                                              None)['PRecoilT'],
+                                       self._Expected('PRecoilT',
+                                                      self.fNames)))
+
+        # Nothing new the second time
+        self._Refresh()
+        self.assertEqual(CAPy_globals._FileInfo.GetDataFiles(), self.fNames)
+
+    def testNewBranch(self):
+        extra = os.path.join(self.dataDir, 'refreshnew.npf')
+        WriteNumpyFile(extra, {'rqDir': {'zip1': {'NewRQ': np.arange(5.)}}})
+
+        self.assertFalse('NewRQ' in self.namespace)
+        self._WriteList(self.fNames[:2] + [extra])
+        self._Refresh()
+
+        self.assertTrue('NewRQ' in self.namespace)
+        self.assertTrue(np.array_equal(
+            self.namespace['NewRQ'](common.DETNUM, None)['NewRQ'],
+            np.arange(5.)))
+        self.assertEqual(CAPy_globals._FileInfo('PRecoilT',
+                                                common.DETNUM)[0],
+                         self.fNames[:2])
+
+    def testFailed(self):
+        energy = self.namespace['PRecoilT']
+        before = energy(common.DETNUM, None)
+
+        # PRecoilT of detector 1 in another tree than the session files
+        bad = os.path.join(self.dataDir, 'refreshbad.npf')
+        WriteNumpyFile(bad, {'rqDir': {'zip1': {'BadRQ': np.arange(5.)}},
+                             'calibDir': {'zip1': {'PRecoilT':
+                                                   np.arange(5.)}}})
+        missing = os.path.join(self.dataDir, 'missing.npf')
+
+        for fNames in [self.fNames + [bad], self.fNames + [missing]]:
+            self._WriteList(fNames)
+            self._Refresh()
+
+            # Session unchanged, not even the good file is added
+            self.assertEqual(CAPy_globals._FileInfo.GetDataFiles(),
+                             self.fNames[:2])
+            self.assertFalse('BadRQ' in self.namespace)
+            self.assertTrue(np.array_equal(energy(common.DETNUM, None),
+                                           before))
+
+    def testNoSession(self):
+        fileList = CAPy_globals._FileList
+        CAPy_globals._FileList = None
+        try:
+            with common.Quiet():
+                self.assertEqual(CAPy.Refresh_Session(), None)
+        finally:
+            CAPy_globals._FileList = fileList
+
+
+if __name__ == '__main__':
+    unittest.main()
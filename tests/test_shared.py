@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+test_shared.py
+
+Tests of arrays and cuts shared between the processes of a session.
+
+Created on Sun Oct 18 14:02:45 2026
+
+@author: tdoughty1
+"""
+
+# Import Standard libraries
+import os
+import shutil
+import tempfile
+import unittest
+
+# Import Numerical libraries
+import numpy as np
+
+# Import test helpers, puts the checkout on the path
+import common
+
+# Import CAPy modules
+import CAPy
+import base.CAPy_globals as CAPy_globals
+from base.cuts import Cut
+from base.rootio import WriteNumpyFile
+from base.shared import SharedArrays
+
+def _InChild(func):
+    ''' Run func in a forked process, return its exit status.'''
+
+    pid = os.fork()
+    if pid == 0:
+        status = 1
+        try:
+            func()
+            status = 0
+        finally:
+            os._exit(status)
+    return os.waitpid(pid, 0)[1]
+
+
+class SharedArraysTest(unittest.TestCase):
+
+    def setUp(self):
+        self.shmDir = tempfile.mkdtemp(prefix='CAPytest')
+        self.shared = SharedArrays('test', self.shmDir)
+        self.key = ('PRecoilT', 1101, ('a.npf',))
+        self.values = np.arange(100.)
+
+    def tearDown(self):
+        self.shared.Close()
+        shutil.rmtree(self.shmDir)
+
+    def testPublish(self):
+        view = self.shared.Publish(self.key, self.values)
+        self.assertTrue(isinstance(view, np.memmap))
+        self.assertTrue(np.array_equal(view, self.values))
+        self.assertTrue(np.array_equal(self.shared(self.key), self.values))
+
+    def testOtherProcess(self):
+        self.shared.Publish(self.key, self.values)
+        
+        def Check():
+            other = SharedArrays('test', self.shmDir)
+            assert np.array_equal(other(self.key), self.values)
+            other.Close()
+        self.assertEqual(_InChild(Check), 0)
+        
+        # Still mapped here after the other process closed
+        self.assertTrue(np.array_equal(self.shared(self.key), self.values))
+
+    def testCut(self):
+        cut = Cut(self.values % 3 == 0)
+        self.assertEqual(self.shared.PublishCut('third', cut), cut)
+        self.assertEqual(self.shared.AttachCut('third'), cut)
+        self.assertEqual(self.shared.AttachCut('other'), None)
+
+    def testObjects(self):
+        values = np.empty(3, dtype=object)
+        values[:] = [np.arange(2), np.arange(5), np.arange(1)]
+        self.assertTrue(self.shared.Publish(self.key, values) is values)
+        self.assertEqual(self.shared(self.key), None)
+
+    def testRemovedBeforeMapped(self):
+        # Another process releases the segment between write and mapping
+        self.shared._Attach = lambda segment: None
+        self.assertTrue(self.shared.Publish(self.key, self.values) is 
+                        self.values)
+        cut = Cut(self.values > 50)
+        self.assertTrue(self.shared.PublishCut('half', cut) is cut)
+
+    def testClose(self):
+        self.shared.Publish(self.key, self.values)
+        sessionDir = os.path.join(self.shmDir, 'CAPy-test')
+        
+        # Segments of a process that died without closing are removed too
+        def Die():
+            other = SharedArrays('test', self.shmDir)
+            other.Publish(('EventTime', 1, ()), self.values)
+        self.assertEqual(_InChild(Die), 0)
+        
+        self.shared.Close()
+        self.assertFalse(os.path.exists(sessionDir))
+
+
+class SharedSessionTest(common.SessionTest):
+
+    @classmethod
+    def setUpClass(cls):
+        super(SharedSessionTest, cls).setUpClass()
+        
+        # Variable length branch next to a flat one
+        traces = np.empty(50, dtype=object)
+        traces[:] = [np.arange(i % 4) for i in range(50)]
+        extra = os.path.join(cls.dataDir, 'traces.npf')
+        WriteNumpyFile(extra, {'rqDir': {'zip9': {'Traces': traces, 
+                                                  'Energy': np.arange(50.)}}})
+        cls.fileList = os.path.join(cls.dataDir, 'traces.txt')
+        with open(cls.fileList, 'w') as f:
+            f.write(extra + '\n')
+        cls.session = {'sharedSession': 'CAPytest' + str(os.getpid())}
+
+    def tearDown(self):
+        CAPy_globals._SharedArrays.Close()
+        common.SessionTest.tearDown(self)
+
+    def testLoad(self):
+        energy = self.namespace['Energy'](1109, None)
+        self.assertTrue(isinstance(energy, np.memmap))
+        self.assertTrue(np.array_equal(energy['Energy'], np.arange(50.)))
+        
+        traces = self.namespace['Traces'](1109, None)
+        self.assertTrue(isinstance(traces, np.ndarray))
+        self.assertEqual(len(traces), 50)
+        self.assertTrue(np.array_equal(traces['Traces'][7], np.arange(3)))
+        
+        # Not shared, so kept in the private cache
+        self.assertTrue(self.namespace['Traces'](1109, None) is not None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+test_store.py
+
+Tests that the column store returns the same arrays as the files and keeps
+its manifest in step with them.
+
+Created on Mon Oct 19 15:10:26 2026
+
+@author: tdoughty1
+"""
+
+# Import Standard libraries
+import os
+import shutil
+import tempfile
+import unittest
+
+# Import Numerical libraries
+import numpy as np
+
+# Import test helpers, puts the checkout on the path
+import common
+
+# Import CAPy modules
+import CAPy
+import base.CAPy_globals as CAPy_globals
+from base.cuts import Cut
+from base.rootio import Read
+from base.store import ColumnStore
+
+# Stored branches, one per tree
+_NAMES = ['PRecoilT', 'EventNumber']
+
+class StoreTest(common.SessionTest):
+
+    def setUp(self):
+        common.SessionTest.setUp(self)
+        self.storeDir = tempfile.mkdtemp(prefix='CAPystore')
+        with common.Quiet():
+            CAPy.Build_Store(self.storeDir, _NAMES)
+        self.store = CAPy_globals._ColumnStore
+
+    def tearDown(self):
+        common.SessionTest.tearDown(self)
+        shutil.rmtree(self.storeDir)
+
+    def _Expected(self, name, detnum):
+        files, dirName, treeName = CAPy_globals._FileInfo(name, detnum)
+        return Read(files, dirName + '/' + treeName, [name])
+
+    def testLoad(self):
+        self.assertTrue(self.store.Has('PRecoilT', common.DETNUM, self.fNames))
+        self.assertTrue(self.store.Has('PRecoilT', 1102, self.fNames))
+        self.assertTrue(self.store.Has('EventNumber', 1, self.fNames))
+        self.assertFalse(self.store.Has('PTNFchisq', common.DETNUM,
+                                        self.fNames))
+
+        # Memory mapped from one joined column over the files
+        m = self.namespace['PRecoilT'](common.DETNUM, None)
+        self.assertTrue(isinstance(m, np.memmap))
+        self.assertTrue(np.array_equal(m, self._Expected('PRecoilT',
+                                                         common.DETNUM)))
+        self.assertEqual(len(os.listdir(os.path.join(self.storeDir,
+                                                     'joined'))), 3)
+
+        # With a cut, and branches left in the files
+        expected = self._Expected('PRecoilT', common.DETNUM)['PRecoilT']
+        mask = expected > 20
+        m = self.namespace['PRecoilT'](common.DETNUM, Cut(mask))
+        self.assertTrue(np.array_equal(m['PRecoilT'], expected[mask]))
+        self.assertTrue(np.array_equal(
+            self.namespace['PTNFchisq'](common.DETNUM, None),
+            self._Expected('PTNFchisq', common.DETNUM)))
+
+    def testIterate(self):
+        chunks = list(CAPy.Iterate(_NAMES + ['PTNFchisq'], common.DETNUM,
+                                   chunkSize=128))
+        for name in _NAMES + ['PTNFchisq']:
+            detnum = 1 if CAPy_globals.IsGeneral(name) else common.DETNUM
+            self.assertTrue(np.array_equal(
+                np.concatenate([chunk[name] for chunk in chunks]),
+                self._Expected(name, detnum)[name]))
+
+    def testManifest(self):
+        store = ColumnStore(self.storeDir)
+        self.assertTrue(store.Has('PRecoilT', common.DETNUM, self.fNames))
+        self.assertTrue(np.array_equal(
+            store('PRecoilT', common.DETNUM, self.fNames),
+            self._Expected('PRecoilT', common.DETNUM)))
+
+        # A changed file is dropped from the store
+        stat = os.stat(self.fNames[0])
+        os.utime(self.fNames[0], (stat.st_atime, stat.st_mtime + 10))
+        try:
+            store = ColumnStore(self.storeDir)
+            self.assertFalse(store.Has('PRecoilT', common.DETNUM,
+                                       self.fNames))
+            self.assertTrue(store.Has('PRecoilT', common.DETNUM,
+                                      self.fNames[1:]))
+            self.assertEqual(store('PRecoilT', common.DETNUM, self.fNames),
+                             None)
+        finally:
+            os.utime(self.fNames[0], (stat.st_atime, stat.st_mtime))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+test_zonemaps.py
+
+Tests of the per file branch statistics and the files they let boolean
+expressions skip.
+
+Created on Mon Oct 19 09:42:17 2026
+
+@author: tdoughty1
+"""
+
+# Import Standard libraries
+import os
+import operator
+import unittest
+
+# Import Numerical libraries
+import numpy as np
+
+# Import test helpers, puts the checkout on the path
+import common
+
+# Import CAPy modules
+import base.CAPy_globals as CAPy_globals
+from base.fileinfo import _Zone
+from base.expression import _Compare
+from base.rootio import WriteNumpyFile
+
+# Integers above 2**53 aren't exact as floats
+_BIG = 2**53
+
+class ZoneTest(unittest.TestCase):
+
+    def testInteger(self):
+        zone = _Zone(np.array([_BIG + 1, _BIG + 3], dtype=np.int64))
+        self.assertEqual(zone, (2, _BIG + 1, _BIG + 3, 0, 0, 0))
+        self.assertEqual(_Compare(operator.eq, zone, _BIG), False)
+        self.assertEqual(_Compare(operator.gt, zone, _BIG), True)
+
+    def testNonFinite(self):
+        column = np.array([1., np.nan, np.inf, 3., -np.inf, np.inf])
+        self.assertEqual(_Zone(column), (6, 1., 3., 1, 1, 2))
+        
+        # No finite values, min and max are NaN
+        zone = _Zone(np.array([np.inf, -np.inf]))
+        self.assertTrue(np.isnan(zone[1]) and np.isnan(zone[2]))
+        self.assertEqual(zone[3:], (0, 1, 1))
+        
+        self.assertEqual(_Zone(np.empty(0, dtype=object)), None)
+
+    def testCompare(self):
+        # Finite values 1 to 3 and one +inf
+        zone = (4, 1., 3., 0, 0, 1)
+        self.assertEqual(_Compare(operator.lt, zone, 5.), None)
+        self.assertEqual(_Compare(operator.gt, zone, 5.), None)
+        self.assertEqual(_Compare(operator.gt, zone, 0.), True)
+        self.assertEqual(_Compare(operator.lt, zone, 0.), False)
+        self.assertEqual(_Compare(operator.eq, zone, 5.), False)
+
+        # Only non-finite values
+        zone = (3, float('nan'), float('nan'), 1, 2, 0)
+        self.assertEqual(_Compare(operator.lt, zone, 0.), None)
+        self.assertEqual(_Compare(operator.gt, zone, 0.), False)
+        self.assertEqual(_Compare(operator.lt, (2, 0., 0., 0, 2, 0), 0.),
+                         True)
+        self.assertEqual(_Compare(operator.lt, (0, 0., 0., 0, 0, 0), 0.),
+                         False)
+
+
+class ZoneSessionTest(common.SessionTest):
+
+    session = {'zoneMaps': True}
+
+    @classmethod
+    def setUpClass(cls):
+        super(ZoneSessionTest, cls).setUpClass()
+
+        # Large integers one apart and a float branch with inf
+        extra = []
+        for i, (big, energy) in enumerate([(_BIG, [1., 2., np.inf]),
+                                           (_BIG + 1, [1., 2., 3.])]):
+            fName = os.path.join(cls.dataDir, 'big' + str(i) + '.npf')
+            WriteNumpyFile(fName, {'rqDir': {'zip9': {
+                'Big': np.full(3, big, dtype=np.int64),
+                'Energy': np.array(energy)}}})
+            extra.append(fName)
+        cls.bigList = os.path.join(cls.dataDir, 'big.txt')
+        with open(cls.bigList, 'w') as f:
+            f.write('\n'.join(extra) + '\n')
+
+    def _Decisions(self, expr):
+        fileInfo = CAPy_globals._FileInfo
+        files = fileInfo(*expr.GetBranches()[0])[0]
+        return [expr._Decide(fileInfo, fName) for fName in files]
+
+    def testSkip(self):
+        events = self.namespace['EventNumber'].Lazy()
+        expr = events < 10000
+        self.assertEqual(self._Decisions(expr), [True, False, False])
+        self.assertEqual(self._Decisions((events >= 10000) & (events < 500)),
+                         [False, False, False])
+        self.assertEqual(self._Decisions(events < 10200),
+                         [True, None, False])
+
+        values = events.Evaluate()
+        self.assertTrue(np.array_equal(expr.Evaluate().GetMask(),
+                                       values < 10000))
+        self.assertTrue(np.array_equal((events < 10200).Evaluate().GetMask(),
+                                       values < 10200))
+
+    def testExact(self):
+        namespace = {}
+        with common.Quiet():
+            common.CAPy.Start_Session(self.bigList, namespace=namespace,
+                                      zoneMaps=True)
+
+        big = namespace['Big'].Lazy(1109)
+        self.assertEqual(self._Decisions(big == _BIG + 1), [False, True])
+        self.assertTrue(np.array_equal((big == _BIG + 1).Evaluate().GetMask(),
+                                       [False] * 3 + [True] * 3))
+
+        energy = namespace['Energy'].Lazy(1109)
+        self.assertEqual(self._Decisions(energy < 5), [None, True])
+        self.assertTrue(np.array_equal((energy < 5).Evaluate().GetMask(),
+                                       [True, True, False] + [True] * 3))
+
+
+if __name__ == '__main__':
+    unittest.main()